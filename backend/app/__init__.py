@@ -57,7 +57,21 @@ def create_app():
             'timestamp': datetime.utcnow().isoformat(),
             'version': '1.0.0'
         })
-    
+
+    # Upstream and cache statistics
+    @app.route('/stats')
+    def service_stats():
+        from app.services.http_client import upstream_client
+        from app.services.cache import cache_stats
+        from app.services.mirror_selector import mirror_stats
+
+        return jsonify({
+            'upstreams': upstream_client.stats(),
+            'caches': cache_stats(),
+            'mirrors': mirror_stats(),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
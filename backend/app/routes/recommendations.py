@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify
 import logging
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List
 from ..services.ai_recommendations import ai_engine
+from ..services.data_store import data_store
 from ..services.overpass_api import overpass_service
 from ..services.openroute_service import openroute_service
 
@@ -79,6 +80,9 @@ def get_user_profile(user_id):
         user_profile = ai_engine._load_user_profile(user_id)
         user_interactions = ai_engine._load_user_interactions(user_id)
         
+        # log_seq is interaction-log bookkeeping, not part of the profile
+        user_history = {key: value for key, value in user_profile.items() if key != 'log_seq'}
+        
         # Calculate some interesting stats
         profile_stats = {
             'user_id': user_id,
@@ -370,29 +374,11 @@ def learn_from_selections():
 def _store_user_interactions(user_id: str, learning_data: Dict):
     """Store user interaction data for analysis"""
     try:
-        import json
-        import os
-        
-        # Create interactions file path
-        interactions_file = os.path.join('data', 'users', f'{user_id}_interactions.json')
-        os.makedirs(os.path.dirname(interactions_file), exist_ok=True)
-        
-        # Load existing interactions
-        interactions = []
-        if os.path.exists(interactions_file):
-            with open(interactions_file, 'r') as f:
-                interactions = json.load(f)
-        
-        # Add new interaction data
-        interactions.append(learning_data)
-        
-        # Keep only last 100 interactions to prevent file bloat
-        if len(interactions) > 100:
-            interactions = interactions[-100:]
+        def add(interactions: List[Dict]) -> List[Dict]:
+            # Keep only last 100 interactions to prevent file bloat
+            return (interactions + [learning_data])[-100:]
         
-        # Save updated interactions
-        with open(interactions_file, 'w') as f:
-            json.dump(interactions, f, indent=2)
+        data_store.update(f'users/{user_id}_interactions.json', add, default=[])
         
         logger.info(f"Stored interaction data for user {user_id}")
         
@@ -21,7 +21,8 @@ def search_restaurants_along_route():
         "user_id": "user123",
         "dietary_restrictions": ["vegetarian", "gluten-free"],
         "preferred_cuisines": ["italian", "mexican"],
-        "meal_type": "lunch"
+        "meal_type": "lunch",
+        "route_geometry": {"type": "LineString", "coordinates": [[lon, lat], ...]} (optional)
     }
     """
     try:
@@ -41,6 +42,7 @@ def search_restaurants_along_route():
         dietary_restrictions = data.get('dietary_restrictions', [])
         preferred_cuisines = data.get('preferred_cuisines', [])
         meal_type = data.get('meal_type', 'lunch')
+        route_geometry = data.get('route_geometry')
         
         # Validate coordinates
         if not (isinstance(start_coords, tuple) and len(start_coords) == 2):
@@ -57,7 +59,8 @@ def search_restaurants_along_route():
             start_coords=start_coords,
             end_coords=end_coords,
             radius_miles=radius_miles,
-            cuisine_types=preferred_cuisines
+            cuisine_types=preferred_cuisines,
+            route_geometry=route_geometry
         )
         
         if not restaurants:
@@ -89,7 +92,7 @@ def search_restaurants_along_route():
         # Format response
         response = {
             'total_found': len(restaurants),
-            'restaurants': recommended_restaurants[:20],  # Limit to top 20
+            'restaurants': [restaurant.to_dict() for restaurant in recommended_restaurants[:20]],  # Limit to top 20
             'search_params': {
                 'start_coords': start_coords,
                 'end_coords': end_coords,
@@ -218,7 +221,7 @@ def search_nearby_restaurants():
         
         response = {
             'total_found': len(restaurants),
-            'restaurants': restaurants,
+            'restaurants': [restaurant.to_dict() for restaurant in restaurants],
             'search_params': {
                 'location': location,
                 'radius_miles': radius_miles,
@@ -1,19 +1,25 @@
-from flask import Blueprint, request, jsonify
-import json
+from flask import Blueprint, Response, request, jsonify
 import os
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import logging
 from geopy.distance import geodesic
 import uuid
 
+from ..services.data_store import data_store
 from ..services.openroute_service import openroute_service
 from ..services.overpass_api import overpass_service
+from ..services.opening_hours import is_open_at
+from ..services.plan_cache import plan_cache
 
 logger = logging.getLogger(__name__)
 
 trips_bp = Blueprint('trips', __name__)
-data_dir = 'data'
+
+# Each meal is searched only where the route is within this many minutes of its preferred time
+MEAL_SEARCH_WINDOW_MINUTES = float(os.getenv('MEAL_SEARCH_WINDOW_MINUTES', 90))
+# Distance between restaurant search points along a planned route
+ROUTE_SEARCH_SPACING_MILES = 25.0
 
 @trips_bp.route('/create', methods=['POST'])
 def create_trip():
@@ -95,11 +101,7 @@ def create_trip():
         }
         
         # Save trip to file
-        trip_file = os.path.join(data_dir, 'trips', f'{trip_id}.json')
-        os.makedirs(os.path.dirname(trip_file), exist_ok=True)
-        
-        with open(trip_file, 'w') as f:
-            json.dump(trip, f, indent=2)
+        data_store.write(f'trips/{trip_id}.json', trip)
         
         # Add to user's trip list
         _add_trip_to_user_list(data['user_id'], trip_id)
@@ -118,14 +120,11 @@ def create_trip():
 def get_trip(trip_id):
     """Get trip details by ID"""
     try:
-        trip_file = os.path.join(data_dir, 'trips', f'{trip_id}.json')
+        trip = data_store.read(f'trips/{trip_id}.json')
         
-        if not os.path.exists(trip_file):
+        if trip is None:
             return jsonify({'error': 'Trip not found'}), 404
         
-        with open(trip_file, 'r') as f:
-            trip = json.load(f)
-        
         return jsonify(trip)
         
     except Exception as e:
@@ -140,23 +139,22 @@ def update_trip(trip_id):
     Expected JSON body can include any trip fields to update
     """
     try:
-        trip_file = os.path.join(data_dir, 'trips', f'{trip_id}.json')
-        
-        if not os.path.exists(trip_file):
-            return jsonify({'error': 'Trip not found'}), 404
-        
-        # Load existing trip
-        with open(trip_file, 'r') as f:
-            trip = json.load(f)
-        
-        # Update with new data
+        trip_key = f'trips/{trip_id}.json'
         update_data = request.get_json()
-        trip.update(update_data)
-        trip['updated_at'] = datetime.utcnow().isoformat()
         
-        # Save updated trip
-        with open(trip_file, 'w') as f:
-            json.dump(trip, f, indent=2)
+        with data_store.locked(trip_key):
+            # Load existing trip
+            trip = data_store.read(trip_key)
+            
+            if trip is None:
+                return jsonify({'error': 'Trip not found'}), 404
+            
+            # Update with new data
+            trip.update(update_data)
+            trip['updated_at'] = datetime.utcnow().isoformat()
+            
+            # Save updated trip
+            data_store.write(trip_key, trip)
         
         return jsonify({
             'message': 'Trip updated successfully',
@@ -181,28 +179,26 @@ def add_restaurants_to_trip(trip_id, meal_type):
         if meal_type not in ['breakfast', 'lunch', 'dinner']:
             return jsonify({'error': 'Invalid meal_type. Must be breakfast, lunch, or dinner'}), 400
         
-        trip_file = os.path.join(data_dir, 'trips', f'{trip_id}.json')
-        
-        if not os.path.exists(trip_file):
-            return jsonify({'error': 'Trip not found'}), 404
-        
-        # Load existing trip
-        with open(trip_file, 'r') as f:
-            trip = json.load(f)
-        
-        # Add restaurants
+        trip_key = f'trips/{trip_id}.json'
         data = request.get_json()
         restaurants = data.get('restaurants', [])
         
-        if meal_type not in trip['restaurants']:
-            trip['restaurants'][meal_type] = []
-        
-        trip['restaurants'][meal_type].extend(restaurants)
-        trip['updated_at'] = datetime.utcnow().isoformat()
-        
-        # Save updated trip
-        with open(trip_file, 'w') as f:
-            json.dump(trip, f, indent=2)
+        with data_store.locked(trip_key):
+            # Load existing trip
+            trip = data_store.read(trip_key)
+            
+            if trip is None:
+                return jsonify({'error': 'Trip not found'}), 404
+            
+            # Add restaurants
+            if meal_type not in trip['restaurants']:
+                trip['restaurants'][meal_type] = []
+            
+            trip['restaurants'][meal_type].extend(restaurants)
+            trip['updated_at'] = datetime.utcnow().isoformat()
+            
+            # Save updated trip
+            data_store.write(trip_key, trip)
         
         return jsonify({
             'message': f'Added {len(restaurants)} restaurants to {meal_type}',
@@ -233,29 +229,28 @@ def select_restaurant_for_trip(trip_id):
             if field not in data:
                 return jsonify({'error': f'Missing required field: {field}'}), 400
         
-        trip_file = os.path.join(data_dir, 'trips', f'{trip_id}.json')
-        
-        if not os.path.exists(trip_file):
-            return jsonify({'error': 'Trip not found'}), 404
-        
-        # Load existing trip
-        with open(trip_file, 'r') as f:
-            trip = json.load(f)
-        
-        # Add selected restaurant
-        selected_restaurant = {
-            'restaurant': data['restaurant'],
-            'meal_type': data['meal_type'],
-            'selected_at': datetime.utcnow().isoformat(),
-            'user_id': data['user_id']
-        }
-        
-        trip['selected_restaurants'].append(selected_restaurant)
-        trip['updated_at'] = datetime.utcnow().isoformat()
+        trip_key = f'trips/{trip_id}.json'
         
-        # Save updated trip
-        with open(trip_file, 'w') as f:
-            json.dump(trip, f, indent=2)
+        with data_store.locked(trip_key):
+            # Load existing trip
+            trip = data_store.read(trip_key)
+            
+            if trip is None:
+                return jsonify({'error': 'Trip not found'}), 404
+            
+            # Add selected restaurant
+            selected_restaurant = {
+                'restaurant': data['restaurant'],
+                'meal_type': data['meal_type'],
+                'selected_at': datetime.utcnow().isoformat(),
+                'user_id': data['user_id']
+            }
+            
+            trip['selected_restaurants'].append(selected_restaurant)
+            trip['updated_at'] = datetime.utcnow().isoformat()
+            
+            # Save updated trip
+            data_store.write(trip_key, trip)
         
         # Record interaction for AI learning (import here to avoid circular imports)
         from app.services.ai_recommendations import ai_engine
@@ -287,22 +282,17 @@ def select_restaurant_for_trip(trip_id):
 def get_user_trips(user_id):
     """Get all trips for a specific user"""
     try:
-        user_trips_file = os.path.join(data_dir, 'users', f'{user_id}_trips.json')
+        trip_ids = data_store.read(f'users/{user_id}_trips.json')
         
-        if not os.path.exists(user_trips_file):
+        if trip_ids is None:
             return jsonify({'trips': []})
         
-        with open(user_trips_file, 'r') as f:
-            trip_ids = json.load(f)
-        
         # Load trip details
         trips = []
         for trip_id in trip_ids:
-            trip_file = os.path.join(data_dir, 'trips', f'{trip_id}.json')
-            if os.path.exists(trip_file):
-                with open(trip_file, 'r') as f:
-                    trip = json.load(f)
-                    trips.append(trip)
+            trip = data_store.read(f'trips/{trip_id}.json')
+            if trip is not None:
+                trips.append(trip)
         
         # Sort by created_at (newest first)
         trips.sort(key=lambda x: x.get('created_at', ''), reverse=True)
@@ -317,23 +307,22 @@ def get_user_trips(user_id):
 def complete_trip(trip_id):
     """Mark a trip as completed"""
     try:
-        trip_file = os.path.join(data_dir, 'trips', f'{trip_id}.json')
+        trip_key = f'trips/{trip_id}.json'
         
-        if not os.path.exists(trip_file):
-            return jsonify({'error': 'Trip not found'}), 404
-        
-        # Load existing trip
-        with open(trip_file, 'r') as f:
-            trip = json.load(f)
-        
-        # Mark as completed
-        trip['status'] = 'completed'
-        trip['completed_at'] = datetime.utcnow().isoformat()
-        trip['updated_at'] = datetime.utcnow().isoformat()
-        
-        # Save updated trip
-        with open(trip_file, 'w') as f:
-            json.dump(trip, f, indent=2)
+        with data_store.locked(trip_key):
+            # Load existing trip
+            trip = data_store.read(trip_key)
+            
+            if trip is None:
+                return jsonify({'error': 'Trip not found'}), 404
+            
+            # Mark as completed
+            trip['status'] = 'completed'
+            trip['completed_at'] = datetime.utcnow().isoformat()
+            trip['updated_at'] = datetime.utcnow().isoformat()
+            
+            # Save updated trip
+            data_store.write(trip_key, trip)
         
         return jsonify({
             'message': 'Trip marked as completed',
@@ -347,22 +336,13 @@ def complete_trip(trip_id):
 def _add_trip_to_user_list(user_id: str, trip_id: str):
     """Add trip ID to user's trip list"""
     try:
-        user_trips_file = os.path.join(data_dir, 'users', f'{user_id}_trips.json')
-        os.makedirs(os.path.dirname(user_trips_file), exist_ok=True)
-        
-        # Load existing trip list
-        trip_ids = []
-        if os.path.exists(user_trips_file):
-            with open(user_trips_file, 'r') as f:
-                trip_ids = json.load(f)
-        
-        # Add new trip ID
-        if trip_id not in trip_ids:
-            trip_ids.append(trip_id)
-        
-        # Save updated list
-        with open(user_trips_file, 'w') as f:
-            json.dump(trip_ids, f, indent=2)
+        def add(trip_ids: List[str]) -> Optional[List[str]]:
+            # Returning None leaves the list untouched
+            if trip_id in trip_ids:
+                return None
+            return trip_ids + [trip_id]
+        
+        data_store.update(f'users/{user_id}_trips.json', add, default=[])
     
     except Exception as e:
         logger.error(f"Error adding trip to user list: {e}")
@@ -419,6 +399,14 @@ def plan_route():
             if field not in data:
                 return jsonify({'error': f'Missing required field: {field}'}), 400
         
+        # Identical plans are served from the already-serialized response
+        cache_key = plan_cache.key(data)
+        if cache_key:
+            body = plan_cache.get(cache_key)
+            if body is not None:
+                logger.info("Serving plan-route response from cache")
+                return Response(body, mimetype='application/json')
+        
         # Extract coordinates
         start_coords = (data['start_location']['lat'], data['start_location']['lng'])
         end_coords = (data['end_location']['lat'], data['end_location']['lng'])
@@ -434,7 +422,7 @@ def plan_route():
         # Extract route points for restaurant searching
         route_points = openroute_service.get_route_points_with_spacing(
             route_data['geometry'], 
-            spacing_miles=25.0  # Search every 25 miles along route for longer trips
+            spacing_miles=ROUTE_SEARCH_SPACING_MILES  # Search every 25 miles along route for longer trips
         )
         
         logger.info(f"Generated {len(route_points)} search points along route")
@@ -444,34 +432,95 @@ def plan_route():
         dietary_restrictions = data.get('dietary_restrictions', [])
         preferred_cuisines = data.get('preferred_cuisines', [])
         daily_budget = data.get('daily_budget')
+        try:
+            departure_datetime = _departure_datetime(data.get('departure_time', '09:00 AM'))
+        except ValueError:
+            departure_datetime = None
+        
+        enabled_meals = {
+            meal_type: meal_preferences.get(meal_type, {})
+            for meal_type in ['breakfast', 'lunch', 'dinner']
+            if meal_preferences.get(meal_type, {}).get('enabled', False)
+        }
         
-        # Find restaurants for each enabled meal
+        # Each meal's time windows along the route, as the search points they cover
+        route_index = openroute_service.get_route_index(route_data['geometry'])
+        point_miles = [min(i * ROUTE_SEARCH_SPACING_MILES, route_index.total_miles)
+                       for i in range(len(route_points))]
+        meal_points = {}
+        stretches = []
+        for meal_type, meal_pref in enabled_meals.items():
+            meal_points[meal_type] = {}
+            for meal_eta, start_miles, end_miles in _meal_windows(
+                    route_index, route_data['duration_seconds'], departure_datetime, meal_pref):
+                points = _points_between(point_miles, start_miles, end_miles)
+                if not points:
+                    continue
+                for point in points:
+                    meal_points[meal_type][point] = meal_eta
+                stretches.append((min(start_miles, point_miles[points[0]]),
+                                  max(end_miles, point_miles[points[-1]])))
+        
+        # Overlapping windows merge into one stretch
+        merged = []
+        for start_miles, end_miles in sorted(stretches):
+            if merged and start_miles <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end_miles))
+            else:
+                merged.append((start_miles, end_miles))
+        
+        # One search over every meal's stretches at the widest enabled radius; each
+        # result carries its exact distance from the route, so narrower meals are a filter
+        candidates = []
+        if merged:
+            search_radius = max(pref.get('radius_miles', 10.0) for pref in enabled_meals.values())
+            
+            logger.info(f"Searching {sum(end - start for start, end in merged):.0f} of "
+                        f"{route_index.total_miles:.0f} route miles in {len(merged)} stretch(es) "
+                        f"within {search_radius} miles of route")
+            
+            candidates = overpass_service.find_restaurants_along_route(
+                route_points=route_points,
+                radius_miles=search_radius,
+                cuisine_types=preferred_cuisines,
+                dietary_restrictions=dietary_restrictions,
+                max_budget=daily_budget,
+                route_geometry=route_data['geometry'],
+                route_stretches=merged
+            )
+        
+        # Partition the shared results per meal
         restaurants_by_meal = {}
         
-        for meal_type in ['breakfast', 'lunch', 'dinner']:
-            meal_pref = meal_preferences.get(meal_type, {})
+        for meal_type, meal_pref in enabled_meals.items():
+            radius_miles = meal_pref.get('radius_miles', 10.0)
+            windows = meal_points[meal_type]
+            restaurants = [
+                restaurant for restaurant in candidates
+                if restaurant.route_point_index in windows
+                and (restaurant.distance_from_route_miles is None
+                     or restaurant.distance_from_route_miles <= radius_miles)
+            ]
             
-            if meal_pref.get('enabled', False):
-                radius_miles = meal_pref.get('radius_miles', 10.0)
-                
-                logger.info(f"Searching for {meal_type} restaurants within {radius_miles} miles of route")
-                
-                restaurants = overpass_service.find_restaurants_along_route(
-                    route_points=route_points,
-                    radius_miles=radius_miles,
-                    cuisine_types=preferred_cuisines,
-                    dietary_restrictions=dietary_restrictions,
-                    max_budget=daily_budget
-                )
-                
-                # Add meal type and timing info
-                for restaurant in restaurants:
-                    restaurant['meal_type'] = meal_type
-                    restaurant['meal_time'] = meal_pref.get('time', '')
-                    restaurant['preferred_time'] = meal_pref.get('preferred_time', {})
-                
-                restaurants_by_meal[meal_type] = restaurants[:20]  # Limit to top 20 per meal
-                logger.info(f"Found {len(restaurants)} {meal_type} restaurants")
+            # Drop places that will be closed when we get there; unknown hours are kept
+            found = len(restaurants)
+            restaurants = [
+                restaurant for restaurant in restaurants
+                if windows[restaurant.route_point_index] is None
+                or is_open_at(restaurant.opening_hours, windows[restaurant.route_point_index]) is not False
+            ]
+            if found > len(restaurants):
+                logger.info(f"Pruned {found - len(restaurants)} {meal_type} restaurants closed at meal time")
+            
+            # Build response dicts for the top 20 per meal, with meal type and timing info
+            meal_restaurants = [restaurant.to_dict() for restaurant in restaurants[:20]]
+            for restaurant in meal_restaurants:
+                restaurant['meal_type'] = meal_type
+                restaurant['meal_time'] = meal_pref.get('time', '')
+                restaurant['preferred_time'] = meal_pref.get('preferred_time', {})
+            
+            restaurants_by_meal[meal_type] = meal_restaurants
+            logger.info(f"Found {len(restaurants)} {meal_type} restaurants")
         
         # Calculate timing estimates
         departure_time = data.get('departure_time', '09:00 AM')
@@ -501,7 +550,11 @@ def plan_route():
             }
         }
         
-        return jsonify(response)
+        result = jsonify(response)
+        # Empty searches aren't cached so an upstream outage isn't remembered
+        if cache_key and (response['search_metadata']['total_restaurants_found'] or not enabled_meals):
+            plan_cache.set(cache_key, result.get_data())
+        return result
         
     except Exception as e:
         logger.error(f"Error planning route: {e}")
@@ -510,21 +563,7 @@ def plan_route():
 def _calculate_meal_timing(duration_seconds: float, departure_time: str, meal_preferences: Dict) -> Dict:
     """Calculate estimated timing for meals along the route"""
     try:
-        # Parse departure time
-        departure_hour, departure_minute, departure_period = _parse_time_string(departure_time)
-        
-        # Convert to 24-hour format
-        if departure_period.upper() == 'PM' and departure_hour != 12:
-            departure_hour += 12
-        elif departure_period.upper() == 'AM' and departure_hour == 12:
-            departure_hour = 0
-        
-        departure_datetime = datetime.now().replace(
-            hour=departure_hour, 
-            minute=departure_minute, 
-            second=0, 
-            microsecond=0
-        )
+        departure_datetime = _departure_datetime(departure_time)
         
         # Calculate arrival time
         arrival_datetime = departure_datetime + timedelta(seconds=duration_seconds)
@@ -540,27 +579,8 @@ def _calculate_meal_timing(duration_seconds: float, departure_time: str, meal_pr
         # Suggest meal times based on travel duration and preferences
         for meal_type, meal_pref in meal_preferences.items():
             if meal_pref.get('enabled', False):
-                preferred_time = meal_pref.get('preferred_time', {})
-                if preferred_time:
-                    # Calculate when user should have this meal during travel
-                    meal_hour = preferred_time.get('hour', 12)
-                    meal_minute = preferred_time.get('minute', 0)
-                    meal_period = preferred_time.get('period', 'PM')
-                    
-                    if meal_period.upper() == 'PM' and meal_hour != 12:
-                        meal_hour += 12
-                    elif meal_period.upper() == 'AM' and meal_hour == 12:
-                        meal_hour = 0
-                    
-                    meal_datetime = departure_datetime.replace(
-                        hour=meal_hour, 
-                        minute=meal_minute
-                    )
-                    
-                    # Adjust to next day if meal time has passed
-                    if meal_datetime < departure_datetime:
-                        meal_datetime += timedelta(days=1)
-                    
+                meal_datetime = _meal_datetime(departure_datetime, meal_pref)
+                if meal_datetime is not None:
                     timing_estimates['suggested_meal_times'][meal_type] = {
                         'suggested_time': meal_datetime.strftime('%I:%M %p'),
                         'hours_from_departure': round((meal_datetime - departure_datetime).seconds / 3600, 1)
@@ -572,6 +592,88 @@ def _calculate_meal_timing(duration_seconds: float, departure_time: str, meal_pr
         logger.error(f"Error calculating meal timing: {e}")
         return {}
 
+def _meal_windows(route_index, duration_seconds: float,
+                  departure_datetime: Optional[datetime],
+                  meal_pref: Dict) -> List[Tuple[Optional[datetime], float, float]]:
+    """
+    Stretches of the route where a meal falls, as (meal time, start miles, end miles)
+    
+    Every occurrence of the preferred time during the trip, plus or minus
+    MEAL_SEARCH_WINDOW_MINUTES, maps to miles in proportion to elapsed driving
+    time. Without a preferred time, or when no occurrence falls within the
+    trip, the whole route is searched.
+    """
+    total_miles = route_index.total_miles
+    try:
+        meal_eta = _meal_datetime(departure_datetime, meal_pref) if departure_datetime else None
+    except ValueError:
+        meal_eta = None
+    if meal_eta is None or duration_seconds <= 0:
+        return [(meal_eta, 0.0, total_miles)]
+    
+    window_seconds = MEAL_SEARCH_WINDOW_MINUTES * 60
+    windows = []
+    eta = meal_eta
+    while (eta - departure_datetime).total_seconds() - window_seconds <= duration_seconds:
+        elapsed = (eta - departure_datetime).total_seconds()
+        start_miles = max(0.0, (elapsed - window_seconds) / duration_seconds) * total_miles
+        end_miles = min(1.0, (elapsed + window_seconds) / duration_seconds) * total_miles
+        windows.append((eta, start_miles, end_miles))
+        eta += timedelta(days=1)
+    
+    return windows or [(meal_eta, 0.0, total_miles)]
+
+def _points_between(point_miles: List[float], start_miles: float, end_miles: float) -> List[int]:
+    """Indexes of search points within a stretch, or the one nearest its middle"""
+    inside = [i for i, miles in enumerate(point_miles) if start_miles <= miles <= end_miles]
+    if inside or not point_miles:
+        return inside
+    middle = (start_miles + end_miles) / 2
+    return [min(range(len(point_miles)), key=lambda i: abs(point_miles[i] - middle))]
+
+def _departure_datetime(departure_time: str) -> datetime:
+    """Today's departure as a datetime from a time string like '09:00 AM'"""
+    departure_hour, departure_minute, departure_period = _parse_time_string(departure_time)
+    
+    # Convert to 24-hour format
+    if departure_period.upper() == 'PM' and departure_hour != 12:
+        departure_hour += 12
+    elif departure_period.upper() == 'AM' and departure_hour == 12:
+        departure_hour = 0
+    
+    return datetime.now().replace(
+        hour=departure_hour, 
+        minute=departure_minute, 
+        second=0, 
+        microsecond=0
+    )
+
+def _meal_datetime(departure_datetime: datetime, meal_pref: Dict) -> Optional[datetime]:
+    """When the user should have a meal during travel (None without a preferred_time)"""
+    preferred_time = meal_pref.get('preferred_time', {})
+    if not preferred_time:
+        return None
+    
+    meal_hour = preferred_time.get('hour', 12)
+    meal_minute = preferred_time.get('minute', 0)
+    meal_period = preferred_time.get('period', 'PM')
+    
+    if meal_period.upper() == 'PM' and meal_hour != 12:
+        meal_hour += 12
+    elif meal_period.upper() == 'AM' and meal_hour == 12:
+        meal_hour = 0
+    
+    meal_datetime = departure_datetime.replace(
+        hour=meal_hour, 
+        minute=meal_minute
+    )
+    
+    # Adjust to next day if meal time has passed
+    if meal_datetime < departure_datetime:
+        meal_datetime += timedelta(days=1)
+    
+    return meal_datetime
+
 def _parse_time_string(time_str: str) -> Tuple[int, int, str]:
     """Parse time string like '09:00 AM' into components"""
     try:
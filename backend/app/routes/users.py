@@ -1,14 +1,14 @@
 from flask import Blueprint, request, jsonify
-import json
 import os
 from datetime import datetime
 import uuid
 import logging
 
+from ..services.data_store import data_store
+
 logger = logging.getLogger(__name__)
 
 users_bp = Blueprint('users', __name__)
-data_dir = 'data'
 
 @users_bp.route('/create', methods=['POST'])
 def create_user():
@@ -64,11 +64,7 @@ def create_user():
         }
         
         # Save user profile
-        user_file = os.path.join(data_dir, 'users', f'{user_id}.json')
-        os.makedirs(os.path.dirname(user_file), exist_ok=True)
-        
-        with open(user_file, 'w') as f:
-            json.dump(user, f, indent=2)
+        data_store.write(f'users/{user_id}.json', user)
         
         return jsonify({
             'message': 'User created successfully',
@@ -84,14 +80,11 @@ def create_user():
 def get_user(user_id):
     """Get user profile by ID"""
     try:
-        user_file = os.path.join(data_dir, 'users', f'{user_id}.json')
+        user = data_store.read(f'users/{user_id}.json')
         
-        if not os.path.exists(user_file):
+        if user is None:
             return jsonify({'error': 'User not found'}), 404
         
-        with open(user_file, 'r') as f:
-            user = json.load(f)
-        
         return jsonify(user)
         
     except Exception as e:
@@ -106,23 +99,22 @@ def update_user(user_id):
     Expected JSON body can include any user fields to update
     """
     try:
-        user_file = os.path.join(data_dir, 'users', f'{user_id}.json')
-        
-        if not os.path.exists(user_file):
-            return jsonify({'error': 'User not found'}), 404
-        
-        # Load existing user
-        with open(user_file, 'r') as f:
-            user = json.load(f)
-        
-        # Update with new data
+        user_key = f'users/{user_id}.json'
         update_data = request.get_json()
-        user.update(update_data)
-        user['updated_at'] = datetime.utcnow().isoformat()
         
-        # Save updated user
-        with open(user_file, 'w') as f:
-            json.dump(user, f, indent=2)
+        with data_store.locked(user_key):
+            # Load existing user
+            user = data_store.read(user_key)
+            
+            if user is None:
+                return jsonify({'error': 'User not found'}), 404
+            
+            # Update with new data
+            user.update(update_data)
+            user['updated_at'] = datetime.utcnow().isoformat()
+            
+            # Save updated user
+            data_store.write(user_key, user)
         
         return jsonify({
             'message': 'User updated successfully',
@@ -137,14 +129,11 @@ def update_user(user_id):
 def get_user_preferences(user_id):
     """Get user's meal and dietary preferences"""
     try:
-        user_file = os.path.join(data_dir, 'users', f'{user_id}.json')
+        user = data_store.read(f'users/{user_id}.json')
         
-        if not os.path.exists(user_file):
+        if user is None:
             return jsonify({'error': 'User not found'}), 404
         
-        with open(user_file, 'r') as f:
-            user = json.load(f)
-        
         preferences = {
             'dietary_restrictions': user.get('dietary_restrictions', []),
             'preferred_cuisines': user.get('preferred_cuisines', []),
@@ -178,32 +167,30 @@ def update_user_preferences(user_id):
     }
     """
     try:
-        user_file = os.path.join(data_dir, 'users', f'{user_id}.json')
-        
-        if not os.path.exists(user_file):
-            return jsonify({'error': 'User not found'}), 404
-        
-        # Load existing user
-        with open(user_file, 'r') as f:
-            user = json.load(f)
-        
-        # Update preferences
+        user_key = f'users/{user_id}.json'
         update_data = request.get_json()
         
-        if 'dietary_restrictions' in update_data:
-            user['dietary_restrictions'] = update_data['dietary_restrictions']
-        
-        if 'preferred_cuisines' in update_data:
-            user['preferred_cuisines'] = update_data['preferred_cuisines']
-        
-        if 'meal_preferences' in update_data:
-            user['meal_preferences'] = update_data['meal_preferences']
-        
-        user['updated_at'] = datetime.utcnow().isoformat()
-        
-        # Save updated user
-        with open(user_file, 'w') as f:
-            json.dump(user, f, indent=2)
+        with data_store.locked(user_key):
+            # Load existing user
+            user = data_store.read(user_key)
+            
+            if user is None:
+                return jsonify({'error': 'User not found'}), 404
+            
+            # Update preferences
+            if 'dietary_restrictions' in update_data:
+                user['dietary_restrictions'] = update_data['dietary_restrictions']
+            
+            if 'preferred_cuisines' in update_data:
+                user['preferred_cuisines'] = update_data['preferred_cuisines']
+            
+            if 'meal_preferences' in update_data:
+                user['meal_preferences'] = update_data['meal_preferences']
+            
+            user['updated_at'] = datetime.utcnow().isoformat()
+            
+            # Save updated user
+            data_store.write(user_key, user)
         
         return jsonify({
             'message': 'Preferences updated successfully',
@@ -223,10 +210,6 @@ def get_user_learning_data(user_id):
     """Get user's AI learning data and statistics"""
     try:
         # Load learning profile
-        profile_file = os.path.join(data_dir, 'users', f'{user_id}_profile.json')
-        interactions_file = os.path.join(data_dir, 'users', f'{user_id}_interactions.json')
-        trips_file = os.path.join(data_dir, 'users', f'{user_id}_trips.json')
-        
         learning_data = {
             'user_id': user_id,
             'profile': {},
@@ -236,22 +219,13 @@ def get_user_learning_data(user_id):
         }
         
         # Load profile if exists
-        if os.path.exists(profile_file):
-            with open(profile_file, 'r') as f:
-                learning_data['profile'] = json.load(f)
+        learning_data['profile'] = data_store.read(f'users/{user_id}_profile.json', {})
         
-        # Load recent interactions
-        if os.path.exists(interactions_file):
-            with open(interactions_file, 'r') as f:
-                interactions = json.load(f)
-                # Get last 10 interactions
-                learning_data['recent_interactions'] = interactions[-10:]
+        # Load recent interactions (last 10)
+        learning_data['recent_interactions'] = data_store.read(f'users/{user_id}_interactions.json', [])[-10:]
         
         # Load trip IDs
-        if os.path.exists(trips_file):
-            with open(trips_file, 'r') as f:
-                trip_ids = json.load(f)
-                learning_data['trip_history'] = trip_ids[-5:]  # Last 5 trips
+        learning_data['trip_history'] = data_store.read(f'users/{user_id}_trips.json', [])[-5:]  # Last 5 trips
         
         # Calculate statistics
         learning_data['statistics'] = {
@@ -272,16 +246,16 @@ def get_user_learning_data(user_id):
 def reset_user_learning_data(user_id):
     """Reset user's AI learning data (for testing or user request)"""
     try:
-        files_to_remove = [
-            os.path.join(data_dir, 'users', f'{user_id}_profile.json'),
-            os.path.join(data_dir, 'users', f'{user_id}_interactions.json')
+        keys_to_remove = [
+            f'users/{user_id}_profile.json',
+            f'users/{user_id}_interactions.json'
         ]
         
         removed_files = []
-        for file_path in files_to_remove:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                removed_files.append(os.path.basename(file_path))
+        with data_store.locked(*keys_to_remove):
+            for key in keys_to_remove:
+                if data_store.delete(key):
+                    removed_files.append(os.path.basename(key))
         
         return jsonify({
             'message': 'Learning data reset successfully',
@@ -2,11 +2,21 @@
 Simple AI-powered restaurant recommendation service
 Learns from user preferences and behavior over multiple road trips
 """
+import atexit
 import json
 import os
 import random
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Union
+
+import numpy as np
+
+from .interaction_log import InteractionLog, PeriodicTask
+from .profile_store import create_store
+from .restaurant_record import PlaceRecord, cuisines
 
 class AIRecommendationEngine:
     """
@@ -19,70 +29,176 @@ class AIRecommendationEngine:
     
     def __init__(self, data_dir='data'):
         self.data_dir = data_dir
-        self.user_profiles_file = os.path.join(data_dir, 'user_profiles.json')
-        self.interactions_file = os.path.join(data_dir, 'user_interactions.json')
         
-        # Ensure data directory exists
-        os.makedirs(data_dir, exist_ok=True)
-        
-        # Initialize files if they don't exist
-        self._initialize_data_files()
-    
-    def _initialize_data_files(self):
-        """Initialize data files if they don't exist"""
-        if not os.path.exists(self.user_profiles_file):
-            with open(self.user_profiles_file, 'w') as f:
-                json.dump({}, f)
-        
-        if not os.path.exists(self.interactions_file):
-            with open(self.interactions_file, 'w') as f:
-                json.dump({}, f)
+        # Profiles and interactions live in JSON files or SQLite (AI_STORAGE_BACKEND)
+        self.store = create_store(data_dir)
+        
+        # New interactions are appended to a log and folded into the store in the background
+        self.log = InteractionLog(
+            os.getenv('AI_INTERACTION_LOG_DIR', os.path.join(data_dir, 'interaction_log')),
+            segment_max_bytes=int(os.getenv('AI_LOG_SEGMENT_MAX_BYTES', 4 * 1024 * 1024))
+        )
+        self.compactor = PeriodicTask(
+            self.compact, float(os.getenv('AI_LOG_COMPACT_INTERVAL_SECONDS', 30)), 'interaction-compactor'
+        )
+        if self.log.pending_count():
+            self.compactor.start()
+        
+        # Hot profiles stay in memory (LRU, re-read after the TTL to pick up other
+        # workers' changes); interactions are buffered and written behind
+        self.profile_cache_max_entries = int(os.getenv('AI_PROFILE_CACHE_MAX_ENTRIES', 1000))
+        self.profile_cache_ttl_seconds = float(os.getenv('AI_PROFILE_CACHE_TTL_SECONDS', 300))
+        self.flush_max_dirty = int(os.getenv('AI_FLUSH_MAX_DIRTY', 100))
+        self._profiles: OrderedDict = OrderedDict()  # user_id -> (loaded_at, profile)
+        self._unflushed: List[Dict] = []
+        self._flushes = 0
+        self._cache_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.flusher = PeriodicTask(self.flush, float(os.getenv('AI_FLUSH_INTERVAL_SECONDS', 5)), 'interaction-flush')
+        atexit.register(self.flush)
     
     def get_recommendations(self, 
                           user_id: str,
-                          restaurants: List[Dict],
+                          restaurants: List[Union[PlaceRecord, Dict]],
                           trip_id: Optional[str] = None,
-                          dietary_restrictions: Optional[List[str]] = None) -> List[Dict]:
+                          dietary_restrictions: Optional[List[str]] = None) -> List[Union[PlaceRecord, Dict]]:
         """
         Get AI-powered restaurant recommendations based on learned preferences
         
         Args:
             user_id: User identifier
-            restaurants: List of candidate restaurants
+            restaurants: Candidate restaurants (Places records or restaurant dicts)
             trip_id: Current trip ID for context
             dietary_restrictions: User's dietary restrictions
             
         Returns:
-            Ranked list of restaurants with recommendation scores
+            The same restaurants ranked, with ai_score and recommendation_reason set
         """
         if not restaurants:
             return []
         
-        # Load user profile and interaction history
-        user_profile = self._load_user_profile(user_id)
-        user_interactions = self._load_user_interactions(user_id)
+        # Load user profile (scoring only needs the profile, not the interaction history)
+        user_profile = self._profile_snapshot(user_id)
         
-        # Calculate recommendation scores for each restaurant
-        scored_restaurants = []
-        for restaurant in restaurants:
-            score = self._calculate_recommendation_score(
-                restaurant, user_profile, user_interactions, dietary_restrictions
-            )
+        # Score every candidate at once
+        scores = self._score_batch(restaurants, user_profile, dietary_restrictions)
+        for restaurant, score in zip(restaurants, scores.tolist()):
             restaurant['ai_score'] = score
             restaurant['recommendation_reason'] = self._generate_recommendation_reason(
                 restaurant, user_profile, score
             )
-            scored_restaurants.append(restaurant)
         
-        # Sort by AI score (highest first) and return top recommendations
-        scored_restaurants.sort(key=lambda x: x['ai_score'], reverse=True)
+        # Sort by AI score (highest first; stable, so ties keep their input order)
+        order = np.argsort(-scores, kind='stable')
+        return [restaurants[i] for i in order.tolist()]
+    
+    def _score_batch(self,
+                     restaurants: List[Union[PlaceRecord, Dict]],
+                     user_profile: Dict,
+                     dietary_restrictions: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Vectorized _calculate_recommendation_score over a candidate list
+        
+        The profile is compiled into per-range, per-cuisine and per-price
+        lookups once; each factor is then an array operation, added in the
+        same order as the per-restaurant version so scores match it exactly.
+        """
+        n = len(restaurants)
+        rating = np.fromiter((r.get('rating', 3.0) for r in restaurants), dtype=np.float64, count=n)
+        distance = np.fromiter((r.get('distance_miles', 10.0) for r in restaurants), dtype=np.float64, count=n)
+        
+        # Cuisine id matrix, padded with -1 (Places records carry their ids already)
+        id_lists = [
+            r.cuisine_ids if isinstance(r, PlaceRecord)
+            else [cuisines.intern(cuisine.lower()) for cuisine in r.get('cuisine_types', [])]
+            for r in restaurants
+        ]
+        width = max((len(ids) for ids in id_lists), default=0)
+        cuisine_ids = np.full((n, width), -1, dtype=np.int32)
+        for row, ids in enumerate(id_lists):
+            cuisine_ids[row, :len(ids)] = ids
+        
+        score = np.zeros(n)
+        score += rating * 0.2  # 20% weight on base rating
+        score += self._score_distance_batch(distance, user_profile) * 0.3  # 30% weight on distance
+        score += self._score_cuisine_batch(cuisine_ids, user_profile) * 0.25  # 25% weight on cuisine
+        score += self._score_price_batch(restaurants, user_profile) * 0.15  # 15% weight on price
+        
+        if dietary_restrictions:
+            dietary = np.fromiter(
+                (self._score_dietary_compliance(r, dietary_restrictions) for r in restaurants),
+                dtype=np.float64, count=n
+            )
+            score += dietary * 0.1  # 10% weight on dietary compliance
+        
+        return np.minimum(5.0, np.maximum(0.0, score))  # Clamp between 0-5
+    
+    def _score_distance_batch(self, distance: np.ndarray, user_profile: Dict) -> np.ndarray:
+        """_score_distance_preference for an array of distances"""
+        distance_preferences = user_profile.get('distance_preferences', {})
+        
+        if not distance_preferences:
+            return np.maximum(0.0, 1.0 - (distance / 10.0))
+        
+        preferred_ranges = distance_preferences.get('preferred_ranges', [])
+        total_selections = distance_preferences.get('total_selections', 1)
         
-        return scored_restaurants
+        score = np.zeros(len(distance))
+        for range_data in preferred_ranges:
+            min_dist, max_dist = range_data['range']
+            weight = range_data['selections'] / total_selections
+            score += np.where((min_dist <= distance) & (distance <= max_dist), weight, 0.0)
+        
+        return score
+    
+    def _score_cuisine_batch(self, cuisine_ids: np.ndarray, user_profile: Dict) -> np.ndarray:
+        """_score_cuisine_preference for a padded matrix of interned cuisine ids"""
+        cuisine_preferences = user_profile.get('cuisine_preferences', {})
+        no_cuisines = (cuisine_ids < 0).all(axis=1)
+        
+        if not cuisine_preferences:
+            return np.full(len(cuisine_ids), 0.5)
+        
+        total_selections = cuisine_preferences.get('total_selections', 1)
+        
+        def term(selections: float, avg_rating: float) -> float:
+            # Same arithmetic as the per-restaurant version
+            return ((selections / total_selections) * 0.7) + (((avg_rating - 1) / 4) * 0.3)
+        
+        # One term per interned cuisine: unseen cuisines score as 0 selections at rating 3
+        lookup = np.full(len(cuisines) + 1, term(0, 3.0))
+        lookup[-1] = 0.0  # padding
+        for cuisine, cuisine_data in cuisine_preferences.items():
+            cuisine_id = cuisines.find(cuisine)
+            if cuisine_id is not None and isinstance(cuisine_data, dict):
+                lookup[cuisine_id] = term(cuisine_data.get('selections', 0), cuisine_data.get('avg_rating', 3.0))
+        
+        score = np.zeros(len(cuisine_ids))
+        for column in range(cuisine_ids.shape[1]):
+            score += lookup[cuisine_ids[:, column]]
+        
+        return np.where(no_cuisines, 0.5, np.minimum(1.0, score))
+    
+    def _score_price_batch(self, restaurants: List[Union[PlaceRecord, Dict]], user_profile: Dict) -> np.ndarray:
+        """_score_price_preference for every restaurant"""
+        price_preferences = user_profile.get('price_preferences', {})
+        total_selections = price_preferences.get('total_selections', 1)
+        
+        if not price_preferences or total_selections == 0:
+            return np.full(len(restaurants), 0.5)
+        
+        lookup = {
+            key: price_data.get('selections', 0) / total_selections
+            for key, price_data in price_preferences.items() if isinstance(price_data, dict)
+        }
+        return np.fromiter(
+            (lookup.get(str(r.get('price_level', 2)), 0.0) for r in restaurants),
+            dtype=np.float64, count=len(restaurants)
+        )
     
     def _calculate_recommendation_score(self, 
                                       restaurant: Dict,
                                       user_profile: Dict,
-                                      user_interactions: List[Dict],
                                       dietary_restrictions: Optional[List[str]] = None) -> float:
         """
         Calculate AI recommendation score for a restaurant
@@ -246,27 +362,53 @@ class AIRecommendationEngine:
             'user_rating': rating
         }
         
-        # Save interaction
-        interactions = self._load_all_interactions()
-        if user_id not in interactions:
-            interactions[user_id] = []
-        
-        interactions[user_id].append(interaction)
-        
-        with open(self.interactions_file, 'w') as f:
-            json.dump(interactions, f, indent=2)
-        
-        # Update user profile based on interaction
-        self._update_user_profile(user_id, interaction)
+        # Update the cached profile now; the log write happens on the next flush
+        with self._cache_lock:
+            self._unflushed.append(interaction)
+            dirty = len(self._unflushed)
+            cached = self._profiles.get(user_id)
+            if cached:
+                # Copy-on-write so concurrent readers keep a consistent snapshot
+                profile = self._apply_interaction(user_id, json.loads(json.dumps(cached[1])), interaction)
+                self._profiles[user_id] = (cached[0], profile)
+        
+        if self.flusher.interval_seconds <= 0:
+            self.flush()
+        elif dirty >= self.flush_max_dirty:
+            self.flusher.wake()
+        else:
+            self.flusher.start()
     
-    def _update_user_profile(self, user_id: str, interaction: Dict) -> None:
-        """Update user profile based on interaction"""
-        profiles = self._load_all_user_profiles()
-        
-        if user_id not in profiles:
-            profiles[user_id] = {
+    def flush(self) -> int:
+        """Append buffered interactions to the log; returns how many were written"""
+        with self._flush_lock:
+            with self._cache_lock:
+                batch, self._unflushed = self._unflushed, []
+                if not batch:
+                    return 0
+                # Counted when the batch leaves the buffer and again once it's in the log
+                self._flushes += 1
+            try:
+                self.log.append_many(batch)
+            except Exception:
+                with self._cache_lock:
+                    self._unflushed[:0] = batch
+                raise
+            with self._cache_lock:
+                self._flushes += 1
+        self.compactor.start()
+        return len(batch)
+    
+    def compact(self) -> int:
+        """Fold logged interactions into the profile store; returns how many were folded"""
+        return self.log.compact(lambda batches: self.store.apply_log(batches, self._apply_interaction))
+    
+    def _apply_interaction(self, user_id: str, profile: Dict, interaction: Dict) -> Dict:
+        """Fold one interaction into a user profile ({} for a new user)"""
+        if not profile:
+            profile = {
                 'user_id': user_id,
-                'created_at': datetime.now().isoformat(),
+                'created_at': interaction.get('timestamp') or datetime.now().isoformat(),
                 'distance_preferences': {'preferred_ranges': [], 'total_selections': 0},
                 'cuisine_preferences': {'total_selections': 0},
                 'price_preferences': {'total_selections': 0},
@@ -275,9 +417,8 @@ class AIRecommendationEngine:
                 'total_interactions': 0
             }
         
-        profile = profiles[user_id]
         profile['total_interactions'] += 1
-        profile['last_interaction'] = datetime.now().isoformat()
+        profile['last_interaction'] = interaction.get('timestamp') or datetime.now().isoformat()
         
         # Update based on interaction type
         if interaction['interaction_type'] in ['selected', 'visited']:
@@ -285,9 +426,7 @@ class AIRecommendationEngine:
             self._update_cuisine_preferences(profile, interaction['cuisine_types'], interaction.get('user_rating'))
             self._update_price_preferences(profile, interaction['price_level'])
         
-        # Save updated profile
-        with open(self.user_profiles_file, 'w') as f:
-            json.dump(profiles, f, indent=2)
+        return profile
     
     def _update_distance_preferences(self, profile: Dict, distance: float) -> None:
         """Update distance preferences based on selection"""
@@ -359,30 +498,69 @@ class AIRecommendationEngine:
         price_prefs['total_selections'] += 1
     
     def _load_user_profile(self, user_id: str) -> Dict:
-        """Load user profile from file"""
-        profiles = self._load_all_user_profiles()
-        return profiles.get(user_id, {})
+        """Load one user's profile, including interactions not yet compacted or flushed (a private copy)"""
+        return json.loads(json.dumps(self._profile_snapshot(user_id)))
+    
+    def _profile_snapshot(self, user_id: str) -> Dict:
+        """
+        Like _load_user_profile, but served from memory while cached
+        
+        The returned dict is shared with the cache and must not be modified.
+        """
+        now = time.monotonic()
+        with self._cache_lock:
+            cached = self._profiles.get(user_id)
+            if cached and now - cached[0] < self.profile_cache_ttl_seconds:
+                self._profiles.move_to_end(user_id)
+                return cached[1]
+            flushes = self._flushes
+        
+        # Log before store: records compacted in between are then in the stored
+        # profile and dropped from pending by its log_seq, rather than missed
+        logged = self.log.pending(user_id)
+        profile = self.store.get_profile(user_id)
+        pending = self._unapplied(logged, profile)
+        
+        with self._cache_lock:
+            pending += [interaction for interaction in self._unflushed if interaction['user_id'] == user_id]
+            if pending:
+                # Fold into a copy; the stored profile only changes on compaction
+                profile = json.loads(json.dumps(profile))
+                for interaction in pending:
+                    profile = self._apply_interaction(user_id, profile, interaction)
+            
+            # A flush during the read may have moved records past what we saw; don't cache that
+            if self.profile_cache_max_entries > 0 and flushes == self._flushes:
+                self._profiles[user_id] = (now, profile)
+                self._profiles.move_to_end(user_id)
+                while len(self._profiles) > self.profile_cache_max_entries:
+                    self._profiles.popitem(last=False)
+        return profile
     
     def _load_user_interactions(self, user_id: str) -> List[Dict]:
-        """Load user interactions from file"""
-        interactions = self._load_all_interactions()
-        return interactions.get(user_id, [])
+        """Load one user's interactions, including ones not yet compacted or flushed"""
+        self.flush()
+        logged = self.log.pending(user_id)
+        profile = self.store.get_profile(user_id)
+        return self.store.get_interactions(user_id) + self._unapplied(logged, profile)
+    
+    @staticmethod
+    def _unapplied(logged: List, profile: Dict) -> List[Dict]:
+        """Logged interactions the stored profile doesn't include yet"""
+        applied = tuple(profile.get('log_seq') or (-1, -1))
+        return [record for seq, record in logged if seq > applied]
     
     def _load_all_user_profiles(self) -> Dict:
-        """Load all user profiles from file"""
-        try:
-            with open(self.user_profiles_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+        """Load all user profiles from the store"""
+        self.flush()
+        self.compact()
+        return self.store.all_profiles()
     
     def _load_all_interactions(self) -> Dict:
-        """Load all user interactions from file"""
-        try:
-            with open(self.interactions_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+        """Load all user interactions from the store"""
+        self.flush()
+        self.compact()
+        return self.store.all_interactions()
 
 # Global instance
 ai_engine = AIRecommendationEngine()
\ No newline at end of file
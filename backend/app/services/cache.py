@@ -0,0 +1,235 @@
+"""
+Two-tier cache used by the upstream services
+In-memory LRU with TTL in front of an optional on-disk tier that survives restarts
+"""
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_EXPIRY_HEADER = struct.Struct('>d')
+
+
+def _json_encode(value: Any) -> bytes:
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def _json_decode(payload: bytes) -> Any:
+    return json.loads(payload.decode('utf-8'))
+
+
+class TieredCache:
+    """
+    LRU + TTL cache with an optional disk tier
+
+    Values are stored encoded (JSON by default) and decoded on every read, so
+    callers always get a fresh object and can never mutate a cached entry.
+    The memory tier is bounded by entry count and, optionally, total payload bytes.
+    Disk entries are one file per key holding an expiry timestamp and the payload.
+    """
+
+    def __init__(self, name: str,
+                 max_entries: int = 1024,
+                 ttl_seconds: float = 3600,
+                 disk_dir: Optional[str] = None,
+                 encode: Callable[[Any], bytes] = _json_encode,
+                 decode: Callable[[bytes], Any] = _json_decode,
+                 max_bytes: Optional[int] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir or None
+        self._encode = encode
+        self._decode = decode
+
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'writes': 0
+        }
+
+        _register_cache(self)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss"""
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, payload = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return self._decode(payload)
+                self._remove_memory(key)
+                self._stats['expirations'] += 1
+
+        disk_entry = self._read_disk(key, now)
+        if disk_entry is not None:
+            expires_at, payload = disk_entry
+            try:
+                value = self._decode(payload)
+            except Exception as e:
+                logger.warning(f"Cache {self.name}: discarding unreadable disk entry: {e}")
+                value = None
+
+            if value is not None:
+                with self._lock:
+                    self._stats['disk_hits'] += 1
+                    self._store_memory(key, expires_at, payload)
+                return value
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Store a value in memory and, if configured, on disk"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = time.time() + ttl
+        payload = self._encode(value)
+
+        with self._lock:
+            self._stats['writes'] += 1
+            self._store_memory(key, expires_at, payload)
+
+        self._write_disk(key, expires_at, payload)
+
+    def get_or_set(self, key: str, producer: Callable[[], Any]) -> Any:
+        """Return the cached value, computing and caching it on a miss (None results are not cached)"""
+        value = self.get(key)
+        if value is None:
+            value = producer()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+        if self.disk_dir and os.path.isdir(self.disk_dir):
+            for filename in os.listdir(self.disk_dir):
+                if filename.endswith('.cache'):
+                    try:
+                        os.remove(os.path.join(self.disk_dir, filename))
+                    except OSError:
+                        pass
+
+    def stats(self) -> Dict:
+        """Hit/miss/eviction statistics"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['disk_hits']) / lookups, 3) if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['max_bytes'] = self.max_bytes
+        stats['ttl_seconds'] = self.ttl_seconds
+        stats['disk_enabled'] = bool(self.disk_dir)
+        return stats
+
+    def _store_memory(self, key: str, expires_at: float, payload: bytes) -> None:
+        # Caller holds self._lock
+        if self.max_bytes is not None and len(payload) > self.max_bytes:
+            # Would evict everything else and still not fit; keep it on disk only
+            self._remove_memory(key)
+            return
+        self._remove_memory(key)
+        self._entries[key] = (expires_at, payload)
+        self._bytes += len(payload)
+        while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self._stats['evictions'] += 1
+
+    def _remove_memory(self, key: str) -> None:
+        # Caller holds self._lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def _disk_path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, f'{digest}.cache')
+
+    def _read_disk(self, key: str, now: float) -> Optional[tuple]:
+        if not self.disk_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Cache {self.name}: could not read {path}: {e}")
+            return None
+
+        if len(data) < _EXPIRY_HEADER.size:
+            return None
+
+        (expires_at,) = _EXPIRY_HEADER.unpack_from(data)
+        if expires_at <= now:
+            with self._lock:
+                self._stats['expirations'] += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        return expires_at, data[_EXPIRY_HEADER.size:]
+
+    def _write_disk(self, key: str, expires_at: float, payload: bytes) -> None:
+        if not self.disk_dir:
+            return
+
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            # Write to a temp file and rename so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_EXPIRY_HEADER.pack(expires_at))
+                f.write(payload)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as e:
+            logger.warning(f"Cache {self.name}: could not write disk entry: {e}")
+
+
+_caches: Dict[str, TieredCache] = {}
+_caches_lock = threading.Lock()
+
+
+def _register_cache(cache: TieredCache) -> None:
+    with _caches_lock:
+        _caches[cache.name] = cache
+
+
+def cache_stats() -> Dict[str, Dict]:
+    """Statistics for every cache created in this process"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.stats() for cache in caches}
@@ -0,0 +1,146 @@
+"""
+JSON document storage shared by several worker processes
+Documents are files under a data directory, addressed by relative key
+('trips/<id>.json'). Writes go to a temp file that is renamed over the
+document, so readers never see a partial write and don't need a lock.
+Read-modify-write sequences hold the key's lock: keys hash onto a fixed
+set of lock stripes, each an in-process lock plus an flock'd lock file,
+so updates to the same document are serialized across threads and
+processes while unrelated documents rarely contend.
+"""
+import json
+import os
+import tempfile
+import threading
+import zlib
+import logging
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only cover threads of one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_LOCK_DIR = '.locks'
+
+
+class DataStore:
+    """JSON documents under data_dir with striped per-key locks and atomic writes"""
+
+    def __init__(self, data_dir: str = 'data', stripes: Optional[int] = None):
+        self.data_dir = data_dir
+        self.stripes = max(1, stripes or int(os.getenv('DATA_STORE_LOCK_STRIPES', 64)))
+        self._thread_locks = [threading.Lock() for _ in range(self.stripes)]
+
+        if fcntl is None:
+            logger.warning("fcntl unavailable: data store locks only apply within this process")
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.data_dir, key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def read(self, key: str, default: Any = None) -> Any:
+        """The document at key, or default if there is none"""
+        try:
+            with open(self.path(key), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+        except json.JSONDecodeError as e:
+            logger.error(f"Corrupt document {key}: {e}")
+            return default
+
+    def write(self, key: str, value: Any) -> None:
+        """
+        Replace the document at key atomically
+
+        Callers that derived value from a read of the same key must hold
+        locked(key) around both.
+        """
+        path = self.path(key)
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(value, f, indent=2)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def delete(self, key: str) -> bool:
+        """Remove the document at key; False if there was none"""
+        try:
+            os.remove(self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def update(self, key: str, update: Callable[[Any], Any], default: Any = None) -> Any:
+        """
+        Read, update and write a document under its lock
+
+        update receives the current document (default if there is none) and
+        returns the new one; returning None leaves the document untouched.
+
+        Returns:
+            What update returned
+        """
+        with self.locked(key):
+            value = update(self.read(key, default))
+            if value is not None:
+                self.write(key, value)
+            return value
+
+    def stripe(self, key: str) -> int:
+        """Lock stripe guarding key"""
+        return zlib.crc32(key.encode('utf-8')) % self.stripes
+
+    @contextmanager
+    def locked(self, *keys: str) -> Iterator[None]:
+        """
+        Hold the locks of one or more keys
+
+        Taking all keys in one call is deadlock-free (stripes are acquired in
+        a fixed order); nesting locked() calls in one thread is not.
+        """
+        stripes = sorted({self.stripe(key) for key in keys})
+        held: List = []
+        try:
+            for stripe in stripes:
+                self._thread_locks[stripe].acquire()
+                held.append(self._thread_locks[stripe])
+                if fcntl is not None:
+                    held.append(self._lock_file(stripe))
+            yield
+        finally:
+            for lock in reversed(held):
+                if isinstance(lock, int):
+                    # Closing the descriptor releases the flock
+                    os.close(lock)
+                else:
+                    lock.release()
+
+    def _lock_file(self, stripe: int) -> int:
+        lock_dir = os.path.join(self.data_dir, _LOCK_DIR)
+        os.makedirs(lock_dir, exist_ok=True)
+        fd = os.open(os.path.join(lock_dir, f'{stripe:03d}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+
+# Global store for the app's data directory
+data_store = DataStore()
@@ -0,0 +1,221 @@
+"""
+Distance/duration matrix engine
+Splits large matrices into provider-sized chunks fetched concurrently and
+caches individual origin->destination cells so repeated pairs are free
+"""
+import math
+import os
+import logging
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .cache import TieredCache
+from .geo_utils import haversine_miles_matrix
+from .rate_limiter import get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+LatLon = Tuple[float, float]
+
+METERS_PER_MILE = 1609.34
+# Offline estimate assumes 1 mile per minute, matching the mock route
+SECONDS_PER_MILE = 60.0
+
+_CELL = struct.Struct('>dd')
+
+
+def _encode_cell(cell: Tuple[Optional[float], Optional[float]]) -> bytes:
+    distance, duration = cell
+    return _CELL.pack(
+        math.nan if distance is None else distance,
+        math.nan if duration is None else duration
+    )
+
+
+def _decode_cell(payload: bytes) -> Tuple[Optional[float], Optional[float]]:
+    distance, duration = _CELL.unpack(payload)
+    return (None if math.isnan(distance) else distance,
+            None if math.isnan(duration) else duration)
+
+
+def estimate_matrix(origins: Sequence[LatLon], destinations: Sequence[LatLon]) -> Dict:
+    """Straight-line distance/duration matrix in the provider's shape (meters and seconds)"""
+    if not origins or not destinations:
+        return {'distances': [[] for _ in origins], 'durations': [[] for _ in origins]}
+
+    miles = haversine_miles_matrix(origins, destinations)
+    return {
+        'distances': (miles * METERS_PER_MILE).tolist(),
+        'durations': (miles * SECONDS_PER_MILE).tolist()
+    }
+
+
+class DistanceMatrixEngine:
+    """Chunked, concurrent and cell-cached matrix requests against a routing provider"""
+
+    def __init__(self):
+        # OpenRouteService public API limits per matrix request
+        self.max_locations = int(os.getenv('ORS_MATRIX_MAX_LOCATIONS', 50))
+        self.max_elements = int(os.getenv('ORS_MATRIX_MAX_ELEMENTS', 3500))
+        self.max_workers = int(os.getenv('ORS_MATRIX_MAX_WORKERS', 4))
+        # 5 decimals snaps cell keys to roughly 1 m
+        self.snap_decimals = int(os.getenv('ORS_MATRIX_SNAP_DECIMALS', 5))
+
+        self.rate_limiter = get_rate_limiter(
+            'openroute_matrix',
+            rate=float(os.getenv('ORS_MATRIX_REQUESTS_PER_MINUTE', 40)) / 60.0,
+            capacity=self.max_workers
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='ors-matrix'
+        )
+        self.cache = TieredCache(
+            'matrix_cells',
+            max_entries=int(os.getenv('ORS_MATRIX_CACHE_MAX_ENTRIES', 100000)),
+            ttl_seconds=float(os.getenv('ORS_MATRIX_CACHE_TTL_SECONDS', 86400)),
+            encode=_encode_cell,
+            decode=_decode_cell
+        )
+
+    def chunk_shape(self, rows: int, cols: int) -> Tuple[int, int]:
+        """Largest (sources, destinations) block that fits the provider limits"""
+        if rows + cols <= self.max_locations and rows * cols <= self.max_elements:
+            return rows, cols
+
+        half = max(1, self.max_locations // 2)
+        if rows > half:
+            chunk_cols = min(cols, half)
+        else:
+            chunk_cols = min(cols, max(1, self.max_locations - rows))
+        chunk_rows = min(rows, max(1, self.max_locations - chunk_cols))
+        chunk_rows = max(1, min(chunk_rows, self.max_elements // chunk_cols))
+        return chunk_rows, chunk_cols
+
+    def compute(self, origins: List[LatLon],
+                destinations: List[LatLon],
+                profile: str,
+                fetch: Callable[[List[LatLon], List[LatLon]], Dict]) -> Dict:
+        """
+        Build the full matrix, fetching only cells that are not cached
+
+        Args:
+            origins: List of (latitude, longitude) origin points
+            destinations: List of (latitude, longitude) destination points
+            profile: Routing profile, part of the cell cache key
+            fetch: Called with one chunk of origins and destinations; returns a
+                dict with 'distances' and 'durations' rows, raises on failure
+
+        Returns:
+            Dict with 'distances' (meters) and 'durations' (seconds) rows, one per
+            origin; unroutable cells are None
+
+        Raises:
+            The first chunk's fetch error, after caching the chunks that succeeded,
+            so a matrix never mixes road and straight-line cells
+        """
+        if not origins or not destinations:
+            return estimate_matrix(origins, destinations)
+
+        origin_keys, origin_points, origin_map = self._unique(origins)
+        destination_keys, destination_points, destination_map = self._unique(destinations)
+
+        distances = np.full((len(origin_points), len(destination_points)), np.nan)
+        durations = np.full_like(distances, np.nan)
+        missing = np.zeros(distances.shape, dtype=bool)
+
+        for i, origin_key in enumerate(origin_keys):
+            for j, destination_key in enumerate(destination_keys):
+                cell = self.cache.get(f"{profile}:{origin_key}:{destination_key}")
+                if cell is None:
+                    missing[i, j] = True
+                else:
+                    distances[i, j] = np.nan if cell[0] is None else cell[0]
+                    durations[i, j] = np.nan if cell[1] is None else cell[1]
+
+        if missing.any():
+            rows = np.nonzero(missing.any(axis=1))[0]
+            cols = np.nonzero(missing[rows].any(axis=0))[0]
+            chunk_rows, chunk_cols = self.chunk_shape(len(rows), len(cols))
+
+            chunks = [
+                (rows[r:r + chunk_rows], cols[c:c + chunk_cols])
+                for r in range(0, len(rows), chunk_rows)
+                for c in range(0, len(cols), chunk_cols)
+            ]
+            logger.info(f"Matrix {len(origins)}x{len(destinations)}: "
+                        f"{int(missing.sum())} uncached cells in {len(chunks)} request(s)")
+
+            def run_chunk(chunk):
+                chunk_row_idx, chunk_col_idx = chunk
+                chunk_origins = [origin_points[i] for i in chunk_row_idx]
+                chunk_destinations = [destination_points[j] for j in chunk_col_idx]
+                self.rate_limiter.acquire()
+                return fetch(chunk_origins, chunk_destinations)
+
+            failure = None
+            futures = [self._executor.submit(run_chunk, chunk) for chunk in chunks]
+            for (chunk_row_idx, chunk_col_idx), future in zip(chunks, futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Matrix chunk failed: {e}")
+                    failure = failure or e
+                    continue
+
+                for a, i in enumerate(chunk_row_idx):
+                    for b, j in enumerate(chunk_col_idx):
+                        distance = result['distances'][a][b]
+                        duration = result['durations'][a][b]
+                        distances[i, j] = np.nan if distance is None else distance
+                        durations[i, j] = np.nan if duration is None else duration
+                        if missing[i, j]:
+                            self.cache.set(
+                                f"{profile}:{origin_keys[i]}:{destination_keys[j]}",
+                                (distance, duration)
+                            )
+
+            if failure is not None:
+                raise failure
+
+        return {
+            'distances': self._to_rows(distances[np.ix_(origin_map, destination_map)]),
+            'durations': self._to_rows(durations[np.ix_(origin_map, destination_map)])
+        }
+
+    def stats(self) -> Dict:
+        return self.cache.stats()
+
+    def _unique(self, points: List[LatLon]) -> Tuple[List[str], List[LatLon], np.ndarray]:
+        # Collapse points that snap to the same key so each pair is requested once
+        digits = self.snap_decimals
+        keys: List[str] = []
+        unique_points: List[LatLon] = []
+        positions: Dict[str, int] = {}
+        mapping = np.empty(len(points), dtype=int)
+
+        for n, (lat, lon) in enumerate(points):
+            key = f"{round(lat, digits)},{round(lon, digits)}"
+            position = positions.get(key)
+            if position is None:
+                position = len(keys)
+                positions[key] = position
+                keys.append(key)
+                unique_points.append((lat, lon))
+            mapping[n] = position
+
+        return keys, unique_points, mapping
+
+    @staticmethod
+    def _to_rows(values: np.ndarray) -> List[List[Optional[float]]]:
+        rows = values.tolist()
+        if np.isnan(values).any():
+            rows = [[None if math.isnan(v) else v for v in row] for row in rows]
+        return rows
+
+
+# Global engine instance
+matrix_engine = DistanceMatrixEngine()
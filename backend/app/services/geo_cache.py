@@ -0,0 +1,189 @@
+"""
+Geo-tiled cache for nearby-restaurant lookups
+Searches are snapped to a geohash cell and a radius bucket, so overlapping
+searches along popular corridors share one cached upstream result
+"""
+import math
+import os
+from typing import Any, Callable, List, Optional, Tuple
+
+from .cache import TieredCache
+from .geo_utils import haversine_miles
+
+_GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+_METERS_PER_DEGREE = 111320.0
+_METERS_PER_MILE = 1609.34
+
+# Upstream radii are rounded up to one of these (meters, ~0.5/1/2/5/10/15/20/30 miles)
+RADIUS_BUCKETS_METERS = [805, 1609, 3219, 8047, 16093, 24140, 32187, 48280]
+
+
+def geohash_encode(lat: float, lon: float, precision: int) -> str:
+    """Encode a coordinate as a geohash string of the given precision"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if lon >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def geohash_center(geohash: str) -> Tuple[float, float]:
+    """Decode a geohash to the (latitude, longitude) of its cell center"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = _GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def _cell_size_meters(precision: int, lat: float) -> Tuple[float, float]:
+    """(height, width) of a geohash cell in meters at the given latitude"""
+    total_bits = precision * 5
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    height = 180.0 / (2 ** lat_bits) * _METERS_PER_DEGREE
+    width = 360.0 / (2 ** lon_bits) * _METERS_PER_DEGREE * math.cos(math.radians(lat))
+    return height, width
+
+
+def tile_precision(radius_meters: float, lat: float = 0.0) -> int:
+    """Coarsest geohash precision whose cells are at most a quarter of the search radius"""
+    for precision in range(1, 10):
+        height, width = _cell_size_meters(precision, lat)
+        if max(height, width) <= radius_meters / 4:
+            return precision
+    return 9
+
+
+def radius_bucket(radius_meters: float) -> int:
+    """Round a search radius up to its cache bucket"""
+    for bucket in RADIUS_BUCKETS_METERS:
+        if radius_meters <= bucket:
+            return bucket
+    return int(math.ceil(radius_meters / 1000.0) * 1000)
+
+
+class GeoTileCache:
+    """
+    Cache of nearby-restaurant results keyed on provider, geohash tile,
+    radius bucket and cuisine filter
+
+    A search is answered for its tile center at the bucketed radius, so every
+    search that lands in the same tile gets the same (cacheable) result. That
+    result is then trimmed back to the caller's own location and radius.
+    """
+
+    def __init__(self):
+        disk_dir = os.getenv('GEO_CACHE_DISK_DIR', os.path.join('data', 'restaurants', 'tiles'))
+        self.cache = TieredCache(
+            'geo_tiles',
+            max_entries=int(os.getenv('GEO_CACHE_MAX_ENTRIES', 5000)),
+            ttl_seconds=float(os.getenv('GEO_CACHE_TTL_SECONDS', 86400)),
+            disk_dir=disk_dir
+        )
+
+    def tile_for(self, provider: str,
+                 location: Tuple[float, float],
+                 radius_meters: float,
+                 cuisine_types: Optional[List[str]] = None) -> Tuple[str, Tuple[float, float], int]:
+        """
+        Quantize a search to its cache tile
+
+        The fetch radius is the bucket widened by half the cell diagonal, so the
+        tile's search covers the full radius around any point in the cell.
+
+        Returns:
+            (cache key, tile center as (latitude, longitude), fetch radius in meters)
+        """
+        bucket = radius_bucket(radius_meters)
+        precision = tile_precision(bucket, location[0])
+        cell = geohash_encode(location[0], location[1], precision)
+        cuisine_filter = ','.join(sorted({c.strip().lower() for c in cuisine_types or [] if c}))
+        key = f"{provider}:{cell}:{bucket}:{cuisine_filter}"
+        center = geohash_center(cell)
+        height, width = _cell_size_meters(precision, center[0])
+        return key, center, int(math.ceil(bucket + math.hypot(height, width) / 2))
+
+    def get_or_fetch(self, provider: str,
+                     location: Tuple[float, float],
+                     radius_meters: float,
+                     cuisine_types: Optional[List[str]],
+                     fetch: Callable[[Tuple[float, float], int], Optional[List]],
+                     position: Callable[[Any], Tuple[float, float]],
+                     is_truncated: Optional[Callable[[List], bool]] = None) -> Optional[List]:
+        """
+        Return results within radius_meters of location, served from the search's
+        tile and calling fetch(center, radius) on a miss
+
+        fetch should return None on failure so errors are never cached.
+        position maps a cached item to its (latitude, longitude).
+        is_truncated tells whether a result hit the provider's result cap. A
+        capped tile result isn't cached, since the widened search may have
+        filled the cap with places outside the caller's radius; the caller's
+        own location and radius are searched instead.
+        """
+        key, center, fetch_radius = self.tile_for(provider, location, radius_meters, cuisine_types)
+        truncated = []
+
+        def fetch_tile():
+            items = fetch(center, fetch_radius)
+            if items is not None and is_truncated is not None and is_truncated(items):
+                truncated.append(True)
+                return None
+            return items
+
+        items = self.cache.get_or_set(key, fetch_tile)
+        if truncated:
+            items = fetch(location, int(math.ceil(radius_meters)))
+        if items is None:
+            return None
+
+        radius_miles = radius_meters / _METERS_PER_MILE
+        return [item for item in items if haversine_miles(location, position(item)) <= radius_miles]
+
+    def stats(self):
+        return self.cache.stats()
+
+
+# Global cache instance
+geo_cache = GeoTileCache()
@@ -0,0 +1,173 @@
+"""
+Geometry helpers shared by the routing and restaurant search services
+"""
+import math
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = 69.09
+
+LatLon = Tuple[float, float]
+
+
+def haversine_miles(a: LatLon, b: LatLon) -> float:
+    """Great-circle distance between two (latitude, longitude) points in miles"""
+    lat1, lon1 = math.radians(a[0]), math.radians(a[1])
+    lat2, lon2 = math.radians(b[0]), math.radians(b[1])
+    h = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(h)))
+
+
+def haversine_miles_array(origin: LatLon, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distances in miles from one point to arrays of latitudes/longitudes"""
+    lat1 = math.radians(origin[0])
+    lon1 = math.radians(origin[1])
+    lat2 = np.radians(lats)
+    lon2 = np.radians(lons)
+    h = (np.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.minimum(1.0, np.sqrt(h)))
+
+
+def haversine_miles_matrix(origins: Sequence[LatLon], destinations: Sequence[LatLon]) -> np.ndarray:
+    """Great-circle distances in miles between every origin and every destination, shape (origins, destinations)"""
+    origin_array = np.radians(np.asarray(origins, dtype=float).reshape(-1, 2))
+    destination_array = np.radians(np.asarray(destinations, dtype=float).reshape(-1, 2))
+    lat1 = origin_array[:, 0:1]
+    lon1 = origin_array[:, 1:2]
+    lat2 = destination_array[:, 0]
+    lon2 = destination_array[:, 1]
+    h = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.minimum(1.0, np.sqrt(h)))
+
+
+def local_distance_miles(a: LatLon, b: LatLon) -> float:
+    """Equirectangular distance in miles; accurate for the short hops between nearby points"""
+    mean_lat = math.radians((a[0] + b[0]) / 2)
+    dy = (b[0] - a[0]) * MILES_PER_DEGREE_LAT
+    dx = (b[1] - a[1]) * MILES_PER_DEGREE_LAT * math.cos(mean_lat)
+    return math.hypot(dx, dy)
+
+
+def polyline_to_points(route: Union[Dict, Sequence[Sequence[float]]]) -> List[LatLon]:
+    """
+    Normalize a route polyline to a list of (latitude, longitude) points
+
+    Accepts a GeoJSON LineString ([lon, lat] coordinates), as returned by
+    OpenRouteService.get_route, or a sequence of (latitude, longitude) pairs.
+    """
+    if isinstance(route, dict):
+        if route.get('type') != 'LineString':
+            return []
+        return [(float(lat), float(lon)) for lon, lat in route.get('coordinates', [])]
+
+    return [(float(point[0]), float(point[1])) for point in route]
+
+
+def densify_polyline(points: List[LatLon], step_miles: float) -> List[LatLon]:
+    """Insert interpolated points so consecutive points are at most step_miles apart"""
+    if len(points) < 2:
+        return list(points)
+
+    dense = [points[0]]
+    for prev, current in zip(points, points[1:]):
+        segment = local_distance_miles(prev, current)
+        steps = max(1, int(math.ceil(segment / step_miles)))
+        for k in range(1, steps + 1):
+            ratio = k / steps
+            dense.append((
+                prev[0] + (current[0] - prev[0]) * ratio,
+                prev[1] + (current[1] - prev[1]) * ratio
+            ))
+    return dense
+
+
+def simplify_polyline(points: List[LatLon], tolerance_miles: float) -> List[LatLon]:
+    """
+    Douglas-Peucker simplification; every dropped point lies within tolerance_miles of the result
+
+    Distances are measured on an equirectangular projection at the polyline's
+    mean latitude, which is accurate to well under a percent at the
+    tolerances used for corridor searches.
+    """
+    if len(points) < 3 or tolerance_miles <= 0:
+        return list(points)
+
+    array = np.asarray(points, dtype=float)
+    cos_lat = math.cos(math.radians(float(array[:, 0].mean())))
+    x = array[:, 1] * MILES_PER_DEGREE_LAT * cos_lat
+    y = array[:, 0] * MILES_PER_DEGREE_LAT
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        length_sq = dx * dx + dy * dy
+        if length_sq == 0:
+            distances = np.hypot(px, py)
+        else:
+            t = np.clip((px * dx + py * dy) / length_sq, 0.0, 1.0)
+            distances = np.hypot(px - t * dx, py - t * dy)
+
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_miles:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return [points[i] for i in np.nonzero(keep)[0]]
+
+
+def cover_polyline(points: List[LatLon], radius_miles: float) -> List[LatLon]:
+    """
+    Place the fewest search circles of radius_miles that cover the whole polyline
+
+    Greedy along the route: from the first uncovered point, slide the circle
+    center forward as far as it can go while still covering that point and
+    everything behind it, then continue from where the route leaves the
+    circle. Centers lie on the route, so curves are followed rather than cut.
+    """
+    if not points:
+        return []
+    if len(points) == 1 or radius_miles <= 0:
+        return list(points)
+
+    # Sample densely enough that coverage between samples is guaranteed
+    step = radius_miles / 10.0
+    samples = densify_polyline(points, step)
+    reach = radius_miles - step / 2
+
+    centers = []
+    start = 0
+    count = len(samples)
+
+    while start < count:
+        center = start
+        candidate = start + 1
+        while candidate < count:
+            if any(local_distance_miles(samples[candidate], samples[k]) > reach
+                   for k in range(start, candidate)):
+                break
+            center = candidate
+            candidate += 1
+
+        centers.append(samples[center])
+
+        # Continue from the first sample past the center that the circle misses
+        start = center + 1
+        while start < count and local_distance_miles(samples[center], samples[start]) <= reach:
+            start += 1
+
+    return centers
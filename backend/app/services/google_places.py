@@ -1,21 +1,54 @@
-import requests
 import os
+import time
 import logging
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
 from geopy.distance import geodesic
-import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from .geo_cache import geo_cache
+from .geo_utils import cover_polyline, haversine_miles, haversine_miles_array, polyline_to_points
+from .http_client import upstream_client
+from .rate_limiter import get_rate_limiter
+from .restaurant_record import PlaceRecord
 
 logger = logging.getLogger(__name__)
 
+# Nearby Search rejects larger radii
+PLACES_MAX_RADIUS_METERS = 50000
+
+# Nearby Search returns 20 results a page and at most 3 pages
+PLACES_MAX_PAGES = 3
+PLACES_MAX_RESULTS = 60
+
+# A next_page_token only becomes valid a short while after it is issued
+PLACES_PAGE_TOKEN_DELAY_SECONDS = 2.0
+
 class GooglePlacesService:
     def __init__(self):
         self.api_key = os.getenv('GOOGLE_PLACES_API_KEY', 'YOUR_GOOGLE_PLACES_API_KEY_HERE')
         self.base_url = 'https://maps.googleapis.com/maps/api/place'
         
+        # Concurrency and pacing for route searches
+        self.max_workers = int(os.getenv('GOOGLE_PLACES_MAX_WORKERS', 8))
+        self.rate_limiter = get_rate_limiter(
+            'google_places',
+            rate=float(os.getenv('GOOGLE_PLACES_QPS', 10)),
+            capacity=float(os.getenv('GOOGLE_PLACES_BURST', 10))
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='google-places'
+        )
+        
+        # 'fast' ranks with vectorized haversine, 'exact' with ellipsoidal geodesics
+        self.distance_mode = os.getenv('GOOGLE_PLACES_DISTANCE_MODE', 'fast').lower()
+        
     def search_restaurants_along_route(self, start_coords: Tuple[float, float], 
                                      end_coords: Tuple[float, float], 
                                      radius_miles: float = 5.0,
-                                     cuisine_types: List[str] = None) -> List[Dict]:
+                                     cuisine_types: List[str] = None,
+                                     route_geometry: Optional[Union[Dict, List]] = None) -> List[PlaceRecord]:
         """
         Find restaurants along a route between two points
         
@@ -24,33 +57,37 @@ class GooglePlacesService:
             end_coords: (latitude, longitude) of end point  
             radius_miles: Search radius in miles (0.5-20 miles)
             cuisine_types: List of preferred cuisine types
+            route_geometry: Optional route polyline (e.g. the GeoJSON LineString
+                from OpenRouteService.get_route) to search along
             
         Returns:
-            List of restaurant data dictionaries
+            Ranked restaurant records (to_dict() gives the response shape)
         """
         try:
             # Convert miles to meters for Google API
             radius_meters = int(radius_miles * 1609.34)
             
             # Generate search points along the route
-            search_points = self._generate_route_points(start_coords, end_coords, radius_miles)
+            search_points = self._generate_route_points(
+                start_coords, end_coords, radius_miles, route_geometry
+            )
+            
+            # Search all points concurrently; pacing comes from the shared rate limiter.
+            # map() yields results in search point order so the merge is deterministic.
+            results = self._executor.map(
+                lambda point: self._search_nearby_restaurants(point, radius_meters, cuisine_types),
+                search_points
+            )
             
             all_restaurants = []
             seen_place_ids = set()
             
-            for point in search_points:
-                restaurants = self._search_nearby_restaurants(
-                    point, radius_meters, cuisine_types
-                )
-                
+            for restaurants in results:
                 # Remove duplicates
                 for restaurant in restaurants:
-                    if restaurant['place_id'] not in seen_place_ids:
-                        seen_place_ids.add(restaurant['place_id'])
+                    if restaurant.place_id not in seen_place_ids:
+                        seen_place_ids.add(restaurant.place_id)
                         all_restaurants.append(restaurant)
-                
-                # Rate limiting
-                time.sleep(0.1)
             
             # Sort by rating and distance from route
             return self._rank_restaurants(all_restaurants, start_coords, end_coords)
@@ -61,81 +98,117 @@ class GooglePlacesService:
     
     def _generate_route_points(self, start: Tuple[float, float], 
                               end: Tuple[float, float], 
-                              radius_miles: float) -> List[Tuple[float, float]]:
-        """Generate search points along the route"""
-        # Calculate total distance
-        total_distance = geodesic(start, end).miles
-        
-        # Determine number of search points based on distance and radius
-        if total_distance <= radius_miles * 2:
-            return [start, end]
-        
-        # Create search points every radius_miles distance
-        num_points = max(3, int(total_distance / radius_miles))
-        points = []
+                              radius_miles: float,
+                              route_polyline: Optional[Union[Dict, List]] = None) -> List[Tuple[float, float]]:
+        """
+        Generate search points along the route
         
-        for i in range(num_points):
-            ratio = i / (num_points - 1)
-            lat = start[0] + (end[0] - start[0]) * ratio
-            lng = start[1] + (end[1] - start[1]) * ratio
-            points.append((lat, lng))
+        Follows the route polyline when one is given (GeoJSON LineString or
+        (latitude, longitude) pairs), otherwise the straight line from start
+        to end, and places the fewest search circles that cover it.
+        """
+        points = polyline_to_points(route_polyline) if route_polyline else []
+        if len(points) < 2:
+            points = [start, end]
         
-        return points
+        return cover_polyline(points, radius_miles)
     
     def _search_nearby_restaurants(self, location: Tuple[float, float], 
                                   radius: int, 
-                                  cuisine_types: List[str] = None) -> List[Dict]:
+                                  cuisine_types: List[str] = None) -> List[PlaceRecord]:
         """Search for restaurants near a specific location"""
         try:
             # Mock response for development (remove when you have API key)
             if self.api_key == 'YOUR_GOOGLE_PLACES_API_KEY_HERE':
                 return self._generate_mock_restaurants(location, cuisine_types)
             
-            # Real Google Places API call
-            params = {
-                'location': f"{location[0]},{location[1]}",
-                'radius': radius,
-                'type': 'restaurant',
-                'key': self.api_key
-            }
+            # Served from the geo tile cache when an overlapping search already ran
+            rows = geo_cache.get_or_fetch(
+                'google_places_rows', location, radius, cuisine_types, 
+                lambda center, bucket_radius: self._fetch_nearby_restaurants(center, bucket_radius, cuisine_types),
+                lambda row: (row[1], row[2]),
+                lambda rows: len(rows) >= PLACES_MAX_RESULTS
+            )
+            return [PlaceRecord.from_row(row) for row in rows or []]
             
-            # Add cuisine filtering if specified
-            if cuisine_types:
-                cuisine_keywords = ' '.join(cuisine_types)
-                params['keyword'] = cuisine_keywords
+        except Exception as e:
+            logger.error(f"Error searching nearby restaurants: {e}")
+            return []
+    
+    def _fetch_nearby_restaurants(self, location: Tuple[float, float], 
+                                 radius: int, 
+                                 cuisine_types: List[str] = None) -> List[List]:
+        """Call the Places Nearby Search API and return cacheable rows (raises on failure so errors aren't cached)"""
+        # Real Google Places API call
+        params = {
+            'location': f"{location[0]},{location[1]}",
+            'radius': min(radius, PLACES_MAX_RADIUS_METERS),
+            'type': 'restaurant',
+            'key': self.api_key
+        }
+        
+        # Add cuisine filtering if specified
+        if cuisine_types:
+            cuisine_keywords = ' '.join(cuisine_types)
+            params['keyword'] = cuisine_keywords
+        
+        places = []
+        for _ in range(PLACES_MAX_PAGES):
+            data = self._fetch_places_page(params)
+            places.extend(data.get('results', []))
             
-            response = requests.get(f"{self.base_url}/nearbysearch/json", params=params)
+            # Page through so a widened tile search isn't cut off at 20 results
+            token = data.get('next_page_token')
+            if not token:
+                break
+            params = {'pagetoken': token, 'key': self.api_key}
+        
+        rows = []
+        
+        for place in places:
+            restaurant = PlaceRecord(
+                place['place_id'],
+                place['geometry']['location']['lat'],
+                place['geometry']['location']['lng'],
+                place['name'],
+                place.get('rating', 0),
+                place.get('price_level', 2),
+                place.get('vicinity', ''),
+                place.get('types', []),
+                self._extract_cuisine_types(place.get('types', [])),
+                place.get('opening_hours', {}).get('open_now', None),
+                [photo['photo_reference'] for photo in place.get('photos', [])][:3]
+            )
+            rows.append(restaurant.to_row())
+        
+        return rows
+    
+    def _fetch_places_page(self, params: Dict) -> Dict:
+        """Fetch one Nearby Search page (raises on failure)"""
+        for attempt in range(3):
+            # Respect the Places QPS quota across all concurrent searches
+            self.rate_limiter.acquire()
+            
+            response = upstream_client.get(
+                'google_places', f"{self.base_url}/nearbysearch/json", params=params
+            )
             response.raise_for_status()
             
             data = response.json()
-            restaurants = []
-            
-            for place in data.get('results', []):
-                restaurant = {
-                    'place_id': place['place_id'],
-                    'name': place['name'],
-                    'rating': place.get('rating', 0),
-                    'price_level': place.get('price_level', 2),
-                    'location': {
-                        'lat': place['geometry']['location']['lat'],
-                        'lng': place['geometry']['location']['lng']
-                    },
-                    'address': place.get('vicinity', ''),
-                    'types': place.get('types', []),
-                    'cuisine_types': self._extract_cuisine_types(place.get('types', [])),
-                    'is_open': place.get('opening_hours', {}).get('open_now', None),
-                    'photos': [photo['photo_reference'] for photo in place.get('photos', [])][:3]
-                }
-                restaurants.append(restaurant)
-            
-            return restaurants
-            
-        except Exception as e:
-            logger.error(f"Error searching nearby restaurants: {e}")
-            return []
+            status = data.get('status')
+            if status == 'INVALID_REQUEST' and 'pagetoken' in params and attempt < 2:
+                # The page token isn't live yet
+                time.sleep(PLACES_PAGE_TOKEN_DELAY_SECONDS)
+                continue
+            break
+        
+        # Quota, auth and request errors come back as HTTP 200 with no results
+        if status not in ('OK', 'ZERO_RESULTS'):
+            raise RuntimeError(f"Places Nearby Search failed: {status} {data.get('error_message', '')}".strip())
+        return data
     
     def _generate_mock_restaurants(self, location: Tuple[float, float], 
-                                  cuisine_types: List[str] = None) -> List[Dict]:
+                                  cuisine_types: List[str] = None) -> List[PlaceRecord]:
         """Generate mock restaurant data for development"""
         import random
         
@@ -170,21 +243,19 @@ class GooglePlacesService:
             cuisine_key = name.lower().split()[0]
             cuisines = cuisine_mapping.get(cuisine_key, ['american'])
             
-            restaurant = {
-                'place_id': f"mock_{location[0]:.4f}_{location[1]:.4f}_{i}",
-                'name': name,
-                'rating': round(random.uniform(3.0, 5.0), 1),
-                'price_level': random.randint(1, 4),
-                'location': {
-                    'lat': location[0] + lat_offset,
-                    'lng': location[1] + lng_offset
-                },
-                'address': f"123 Main St, City, State",
-                'types': ['restaurant', 'food', 'establishment'],
-                'cuisine_types': cuisines,
-                'is_open': random.choice([True, False, None]),
-                'photos': [f"mock_photo_{i}_1", f"mock_photo_{i}_2"]
-            }
+            restaurant = PlaceRecord(
+                f"mock_{location[0]:.4f}_{location[1]:.4f}_{i}",
+                location[0] + lat_offset,
+                location[1] + lng_offset,
+                name,
+                round(random.uniform(3.0, 5.0), 1),
+                random.randint(1, 4),
+                f"123 Main St, City, State",
+                ['restaurant', 'food', 'establishment'],
+                cuisines,
+                random.choice([True, False, None]),
+                [f"mock_photo_{i}_1", f"mock_photo_{i}_2"]
+            )
             restaurants.append(restaurant)
         
         return restaurants
@@ -208,40 +279,65 @@ class GooglePlacesService:
         
         return cuisines if cuisines else ['restaurant']
     
-    def _rank_restaurants(self, restaurants: List[Dict], 
+    def _rank_restaurants(self, restaurants: List[PlaceRecord], 
                          start_coords: Tuple[float, float], 
-                         end_coords: Tuple[float, float]) -> List[Dict]:
-        """Rank restaurants by rating, price, and proximity to route"""
+                         end_coords: Tuple[float, float]) -> List[PlaceRecord]:
+        """
+        Rank restaurants by rating, price, and proximity to route
+        
+        Distances and composite scores are computed for the whole candidate
+        set in one vectorized pass. GOOGLE_PLACES_DISTANCE_MODE=exact swaps
+        the haversine distances for ellipsoidal geodesics.
+        """
         try:
-            for restaurant in restaurants:
-                rest_coords = (restaurant['location']['lat'], restaurant['location']['lng'])
-                
-                # Calculate distance from start and end points
-                dist_from_start = geodesic(start_coords, rest_coords).miles
-                dist_from_end = geodesic(end_coords, rest_coords).miles
-                
-                # Calculate route proximity score (lower is better)
+            if not restaurants:
+                return restaurants
+            
+            count = len(restaurants)
+            lats = np.fromiter((r.lat for r in restaurants), dtype=float, count=count)
+            lngs = np.fromiter((r.lng for r in restaurants), dtype=float, count=count)
+            ratings = np.fromiter((r.rating for r in restaurants), dtype=float, count=count)
+            price_levels = np.fromiter((r.price_level for r in restaurants), dtype=float, count=count)
+            
+            # Calculate distance from start and end points
+            if self.distance_mode == 'exact':
+                dist_from_start = np.array([geodesic(start_coords, (lat, lng)).miles for lat, lng in zip(lats, lngs)])
+                dist_from_end = np.array([geodesic(end_coords, (lat, lng)).miles for lat, lng in zip(lats, lngs)])
                 route_distance = geodesic(start_coords, end_coords).miles
-                route_deviation = abs(dist_from_start + dist_from_end - route_distance)
-                
-                restaurant['distance_from_start'] = round(dist_from_start, 2)
-                restaurant['distance_from_end'] = round(dist_from_end, 2)
-                restaurant['route_deviation'] = round(route_deviation, 2)
-                
-                # Calculate composite score (higher is better)
-                rating_score = restaurant['rating'] / 5.0  # 0-1
-                price_score = (5 - restaurant['price_level']) / 4.0  # 0-1 (lower price = higher score)
-                proximity_score = max(0, 1 - (route_deviation / route_distance))  # 0-1
-                
-                restaurant['composite_score'] = (
-                    rating_score * 0.4 + 
-                    price_score * 0.2 + 
-                    proximity_score * 0.4
-                )
+            else:
+                dist_from_start = haversine_miles_array(start_coords, lats, lngs)
+                dist_from_end = haversine_miles_array(end_coords, lats, lngs)
+                route_distance = haversine_miles(start_coords, end_coords)
             
-            # Sort by composite score (highest first)
-            restaurants.sort(key=lambda x: x['composite_score'], reverse=True)
-            return restaurants
+            # Calculate route proximity score (lower is better)
+            route_deviation = np.abs(dist_from_start + dist_from_end - route_distance)
+            
+            # Calculate composite score (higher is better)
+            rating_score = ratings / 5.0  # 0-1
+            price_score = (5 - price_levels) / 4.0  # 0-1 (lower price = higher score)
+            if route_distance > 0:
+                proximity_score = np.maximum(0, 1 - (route_deviation / route_distance))  # 0-1
+            else:
+                proximity_score = np.zeros(count)
+            
+            composite_scores = (
+                rating_score * 0.4 + 
+                price_score * 0.2 + 
+                proximity_score * 0.4
+            )
+            
+            for restaurant, start_dist, end_dist, deviation, score in zip(
+                restaurants, dist_from_start.tolist(), dist_from_end.tolist(),
+                route_deviation.tolist(), composite_scores.tolist()
+            ):
+                restaurant.distance_from_start = round(start_dist, 2)
+                restaurant.distance_from_end = round(end_dist, 2)
+                restaurant.route_deviation = round(deviation, 2)
+                restaurant.composite_score = score
+            
+            # Sort by composite score (highest first, ties keep search order)
+            order = np.argsort(-composite_scores, kind='stable')
+            return [restaurants[i] for i in order]
             
         except Exception as e:
             logger.error(f"Error ranking restaurants: {e}")
@@ -285,7 +381,9 @@ class GooglePlacesService:
                 'key': self.api_key
             }
             
-            response = requests.get(f"{self.base_url}/details/json", params=params)
+            response = upstream_client.get(
+                'google_places', f"{self.base_url}/details/json", params=params
+            )
             response.raise_for_status()
             
             return response.json().get('result', {})
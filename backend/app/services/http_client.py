@@ -0,0 +1,171 @@
+"""
+Shared HTTP client for upstream services
+Keeps one pooled keep-alive session per upstream with consistent timeouts,
+jittered retries on 429/5xx and per-upstream call counters
+"""
+import os
+import random
+import threading
+import time
+import logging
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Raised for connection failures, timeouts and raise_for_status() errors
+UpstreamError = requests.exceptions.RequestException
+
+
+class UpstreamClient:
+    """
+    Pooled HTTP client shared by GooglePlacesService, OpenRouteService and OverpassAPIService
+
+    Each upstream gets its own requests.Session whose adapter keeps a keep-alive
+    connection pool per host, so repeat calls reuse TCP+TLS connections.
+    """
+
+    def __init__(self):
+        self.pool_connections = int(os.getenv('UPSTREAM_POOL_CONNECTIONS', 10))
+        self.pool_maxsize = int(os.getenv('UPSTREAM_POOL_MAXSIZE', 20))
+        self.default_timeout = float(os.getenv('UPSTREAM_TIMEOUT_SECONDS', 15))
+        self.max_retries = int(os.getenv('UPSTREAM_MAX_RETRIES', 2))
+        self.backoff_base = float(os.getenv('UPSTREAM_BACKOFF_BASE_SECONDS', 0.25))
+        self.backoff_max = float(os.getenv('UPSTREAM_BACKOFF_MAX_SECONDS', 8))
+
+        self._sessions: Dict[str, requests.Session] = {}
+        self._pool_sizes: Dict[str, int] = {}
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, upstream: str, pool_maxsize: Optional[int] = None) -> None:
+        """Override the connection pool size for one upstream (before its first call)"""
+        with self._lock:
+            if pool_maxsize:
+                self._pool_sizes[upstream] = pool_maxsize
+
+    def session(self, upstream: str) -> requests.Session:
+        """Get (or lazily create) the pooled session for an upstream"""
+        with self._lock:
+            session = self._sessions.get(upstream)
+            if session is None:
+                pool_maxsize = self._pool_sizes.get(upstream, self.pool_maxsize)
+                # Retries are handled in request() so they can be jittered and counted
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=pool_maxsize,
+                    max_retries=0
+                )
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._sessions[upstream] = session
+                self._stats[upstream] = {
+                    'calls': 0,
+                    'retries': 0,
+                    'errors': 0,
+                    'status_codes': {},
+                    'total_latency_ms': 0.0
+                }
+            return session
+
+    def request(self, upstream: str, method: str, url: str,
+                timeout: Optional[float] = None,
+                max_retries: Optional[int] = None,
+                **kwargs) -> requests.Response:
+        """
+        Send a request to an upstream, retrying 429/5xx and connection errors
+
+        Args:
+            upstream: Upstream name used for pooling and counters (e.g. 'google_places')
+            method: HTTP method
+            url: Request URL
+            timeout: Per-attempt timeout in seconds (defaults to UPSTREAM_TIMEOUT_SECONDS)
+            max_retries: Retry budget for this call (defaults to UPSTREAM_MAX_RETRIES)
+            **kwargs: Passed through to requests (params, json, data, headers, stream...)
+
+        Returns:
+            The final response; callers still decide via raise_for_status()
+        """
+        session = self.session(upstream)
+        timeout = self.default_timeout if timeout is None else timeout
+        retries = self.max_retries if max_retries is None else max_retries
+
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record(upstream, start, None)
+                if attempt >= retries:
+                    raise
+                logger.warning(f"{upstream} request failed ({e}), retrying")
+                self._sleep_backoff(upstream, attempt, None)
+                attempt += 1
+                continue
+
+            self._record(upstream, start, response.status_code)
+
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                return response
+
+            logger.warning(f"{upstream} returned {response.status_code}, retrying")
+            retry_after = response.headers.get('Retry-After')
+            response.close()
+            self._sleep_backoff(upstream, attempt, retry_after)
+            attempt += 1
+
+    def get(self, upstream: str, url: str, **kwargs) -> requests.Response:
+        return self.request(upstream, 'GET', url, **kwargs)
+
+    def post(self, upstream: str, url: str, **kwargs) -> requests.Response:
+        return self.request(upstream, 'POST', url, **kwargs)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-upstream call counters"""
+        with self._lock:
+            result = {}
+            for upstream, counters in self._stats.items():
+                calls = counters['calls']
+                result[upstream] = {
+                    'calls': calls,
+                    'retries': counters['retries'],
+                    'errors': counters['errors'],
+                    'status_codes': dict(counters['status_codes']),
+                    'avg_latency_ms': round(counters['total_latency_ms'] / calls, 1) if calls else 0.0
+                }
+            return result
+
+    def _record(self, upstream: str, start: float, status_code: Optional[int]) -> None:
+        elapsed_ms = (time.monotonic() - start) * 1000
+        with self._lock:
+            counters = self._stats[upstream]
+            counters['calls'] += 1
+            counters['total_latency_ms'] += elapsed_ms
+            if status_code is None or status_code >= 400:
+                counters['errors'] += 1
+            if status_code is not None:
+                key = str(status_code)
+                counters['status_codes'][key] = counters['status_codes'].get(key, 0) + 1
+
+    def _sleep_backoff(self, upstream: str, attempt: int, retry_after: Optional[str]) -> None:
+        """Full-jitter exponential backoff, honouring Retry-After when the upstream sends one"""
+        with self._lock:
+            self._stats[upstream]['retries'] += 1
+
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, min(self.backoff_max, float(retry_after)))
+            except ValueError:
+                pass
+        time.sleep(delay)
+
+
+# Global client instance
+upstream_client = UpstreamClient()
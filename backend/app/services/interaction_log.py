@@ -0,0 +1,275 @@
+"""
+Append-only log of recommendation interactions
+Each interaction is one JSON line appended to the current segment file;
+segments rotate at a size limit. A compactor folds the log into the profile
+store in the background and records how far it got in a checkpoint, after
+which fully compacted segments are deleted.
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .data_store import DataStore
+
+logger = logging.getLogger(__name__)
+
+# Position in the log: (segment number, byte offset of the line)
+Seq = Tuple[int, int]
+
+_SEGMENT_NAME = re.compile(r'^interactions-(\d{8})\.jsonl$')
+_CHECKPOINT_FILE = 'checkpoint.json'
+# Lock keys shared by every process using the log directory
+_APPEND_LOCK = 'append'
+_COMPACT_LOCK = 'compact'
+# A rotated-away segment is only considered finished once it has been quiet
+# this long, so a writer that picked it just before rotation isn't skipped
+_SEGMENT_SETTLE_SECONDS = 2.0
+
+
+class InteractionLog:
+    """
+    Line-delimited interaction log with segment rotation
+
+    Appends are a single buffered write to the end of the current segment,
+    independent of how much history exists. Records not yet compacted are
+    kept in memory per user (read incrementally from the log) so readers can
+    fold them into what the store returns.
+    """
+
+    def __init__(self, log_dir: str, segment_max_bytes: int = 4 * 1024 * 1024):
+        self.log_dir = log_dir
+        self.segment_max_bytes = segment_max_bytes
+        os.makedirs(log_dir, exist_ok=True)
+
+        self._pending_lock = threading.Lock()
+        # Serializes appends and compaction across threads and worker processes
+        # (the two keys land on different stripes, so neither blocks the other)
+        self._locks = DataStore(log_dir, stripes=2)
+
+        segments = self.segments()
+        self._segment = segments[-1] if segments else 0
+
+        # Uncompacted records per user, read from the log up to _scanned
+        self._pending: Dict[str, List[Tuple[Seq, Dict]]] = {}
+        self._pending_seqs: set = set()
+        self._base = self.checkpoint()
+        self._scanned = self._base
+
+    def append(self, record: Dict) -> None:
+        """Append one interaction (must carry a user_id)"""
+        self.append_many([record])
+
+    def append_many(self, records: List[Dict]) -> None:
+        """Append interactions in order with a single write"""
+        if not records:
+            return
+        line = b''.join((json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8') for record in records)
+        with self._locks.locked(_APPEND_LOCK):
+            self._follow_rotation()
+            with open(self._segment_path(self._segment), 'ab') as f:
+                f.write(line)
+                size = f.tell()
+            if size >= self.segment_max_bytes:
+                self._rotate()
+
+    def pending(self, user_id: str) -> List[Tuple[Seq, Dict]]:
+        """A user's records that are in the log but not yet past the compaction checkpoint"""
+        with self._pending_lock:
+            self._refresh_pending()
+            return list(self._pending.get(user_id, []))
+
+    def pending_count(self) -> int:
+        with self._pending_lock:
+            self._refresh_pending()
+            return sum(len(records) for records in self._pending.values())
+
+    def compact(self, apply: Callable[[Dict[str, List[Tuple[Seq, Dict]]]], None]) -> int:
+        """
+        Fold everything after the checkpoint into the store
+
+        apply receives the new records grouped by user and must be idempotent
+        per record sequence: a crash before the checkpoint is written means
+        the same records are applied again next time.
+
+        Returns:
+            Number of records compacted
+        """
+        # Later appends go to a fresh segment so the compacted ones can be dropped
+        with self._locks.locked(_APPEND_LOCK):
+            self._follow_rotation()
+            path = self._segment_path(self._segment)
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                self._rotate()
+
+        with self._locks.locked(_COMPACT_LOCK):
+            start = self.checkpoint()
+            records, end = self._read(start)
+            batches: Dict[str, List[Tuple[Seq, Dict]]] = {}
+            for seq, record in records:
+                batches.setdefault(str(record.get('user_id', '')), []).append((seq, record))
+
+            if batches:
+                apply(batches)
+            if end != start:
+                self._write_checkpoint(end)
+            self._delete_segments_before(end[0])
+            return len(records)
+
+    def checkpoint(self) -> Seq:
+        """Position up to which the log has been folded into the store"""
+        try:
+            with open(os.path.join(self.log_dir, _CHECKPOINT_FILE), 'r') as f:
+                segment, offset = json.load(f)
+            return int(segment), int(offset)
+        except (FileNotFoundError, ValueError, TypeError, json.JSONDecodeError):
+            return 0, 0
+
+    def segments(self) -> List[int]:
+        """Segment numbers on disk, oldest first"""
+        numbers = []
+        for filename in os.listdir(self.log_dir):
+            match = _SEGMENT_NAME.match(filename)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.log_dir, f'interactions-{segment:08d}.jsonl')
+
+    def _follow_rotation(self) -> None:
+        # Caller holds the append lock; another process may have rotated
+        while os.path.exists(self._segment_path(self._segment + 1)):
+            self._segment += 1
+        # or rotated and compacted, deleting the segments in between
+        if not os.path.exists(self._segment_path(self._segment)):
+            segments = self.segments()
+            if segments:
+                self._segment = max(self._segment, segments[-1])
+
+    def _rotate(self) -> None:
+        # Caller holds the append lock; creating the file tells other processes to move on too
+        self._segment += 1
+        open(self._segment_path(self._segment), 'ab').close()
+
+    def _read(self, start: Seq, read_ahead: bool = False) -> Tuple[List[Tuple[Seq, Dict]], Seq]:
+        """
+        Complete records from start on, and the position to resume reading from
+
+        Reading normally stops at the end of a rotated-away segment that hasn't
+        settled yet. With read_ahead the later segments are returned too, but
+        the resume position stays in that segment, so callers see those records
+        again and must skip the ones they have.
+        """
+        records: List[Tuple[Seq, Dict]] = []
+        position = start
+        resume: Optional[Seq] = None
+        segments = [segment for segment in self.segments() if segment >= start[0]]
+
+        for i, segment in enumerate(segments):
+            offset = start[1] if segment == start[0] else 0
+            path = self._segment_path(segment)
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            # A writer is mid-append; pick the line up next time
+                            return records, resume or (segment, offset)
+                        try:
+                            records.append(((segment, offset), json.loads(line)))
+                        except ValueError:
+                            logger.warning(f"Skipping corrupt interaction log line at {segment}:{offset}")
+                        offset += len(line)
+                settled = time.time() - os.path.getmtime(path) > _SEGMENT_SETTLE_SECONDS
+            except FileNotFoundError:
+                # Compacted and deleted by another process meanwhile
+                continue
+
+            position = (segment, offset)
+            if i + 1 < len(segments):
+                if not settled:
+                    if not read_ahead:
+                        break
+                    resume = resume or position
+                    continue
+                position = (segments[i + 1], 0)
+
+        return records, resume or position
+
+    def _refresh_pending(self) -> None:
+        # Caller holds self._pending_lock
+        checkpoint = self.checkpoint()
+        if checkpoint > self._base:
+            for user_id in list(self._pending):
+                remaining = [(seq, record) for seq, record in self._pending[user_id] if seq >= checkpoint]
+                self._pending_seqs.difference_update(seq for seq, _ in self._pending[user_id] if seq < checkpoint)
+                if remaining:
+                    self._pending[user_id] = remaining
+                else:
+                    del self._pending[user_id]
+            self._base = checkpoint
+            self._scanned = max(self._scanned, checkpoint)
+
+        # Read ahead so records are visible before their segment is compacted
+        records, self._scanned = self._read(self._scanned, read_ahead=True)
+        for seq, record in records:
+            if seq not in self._pending_seqs:
+                self._pending_seqs.add(seq)
+                self._pending.setdefault(str(record.get('user_id', '')), []).append((seq, record))
+
+    def _write_checkpoint(self, position: Seq) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.log_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(list(position), f)
+        os.replace(tmp_path, os.path.join(self.log_dir, _CHECKPOINT_FILE))
+
+    def _delete_segments_before(self, segment: int) -> None:
+        for number in self.segments():
+            if number >= segment:
+                break
+            try:
+                os.remove(self._segment_path(number))
+            except OSError:
+                pass
+
+
+class PeriodicTask:
+    """Daemon thread that calls task() every interval_seconds, or sooner when woken"""
+
+    def __init__(self, task: Callable[[], int], interval_seconds: float, name: str):
+        self._task = task
+        self.interval_seconds = interval_seconds
+        self.name = name
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def start(self) -> None:
+        """Start the thread if it isn't running (no-op when the interval is 0)"""
+        if self.interval_seconds <= 0:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def wake(self) -> None:
+        """Run the task now instead of at the end of the current interval"""
+        self.start()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+            try:
+                done = self._task()
+                if done:
+                    logger.info(f"{self.name}: processed {done} interactions")
+            except Exception as e:
+                logger.error(f"{self.name} failed: {e}")
@@ -0,0 +1,417 @@
+"""
+Offline routing engine over a preprocessed road graph
+Answers point-to-point routes with bidirectional A* and one-to-many cost
+queries with Dijkstra, returning the same route dict as OpenRouteService
+
+Build a graph from an OSM XML extract with:
+    python -m app.services.local_router build <extract.osm> <graph.npz>
+"""
+import argparse
+import heapq
+import math
+import os
+import sys
+import threading
+import logging
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .geo_utils import EARTH_RADIUS_MILES, MILES_PER_DEGREE_LAT
+
+logger = logging.getLogger(__name__)
+
+LatLon = Tuple[float, float]
+
+METERS_PER_MILE = 1609.34
+_EARTH_RADIUS_METERS = EARTH_RADIUS_MILES * METERS_PER_MILE
+
+# Default travel speeds (km/h) for drivable OSM highway classes
+HIGHWAY_SPEEDS_KMH = {
+    'motorway': 105, 'motorway_link': 60,
+    'trunk': 90, 'trunk_link': 50,
+    'primary': 80, 'primary_link': 45,
+    'secondary': 70, 'secondary_link': 40,
+    'tertiary': 60, 'tertiary_link': 35,
+    'unclassified': 50, 'residential': 40,
+    'living_street': 15, 'service': 20, 'road': 40
+}
+
+
+class LocalRoutingEngine:
+    """
+    Shortest-time routing on a road graph loaded from disk
+
+    The graph is a .npz file with node_lat/node_lon arrays and directed
+    edge_from/edge_to/edge_meters/edge_seconds arrays, as written by the
+    build command. It is loaded on first use and kept in memory.
+    """
+
+    def __init__(self, graph_path: Optional[str] = None):
+        self.graph_path = graph_path or os.getenv(
+            'LOCAL_ROUTING_GRAPH', os.path.join('data', 'graph', 'road_graph.npz')
+        )
+        # Endpoints farther than this from any graph node are outside the graph's coverage
+        self.max_snap_miles = float(os.getenv('LOCAL_ROUTING_MAX_SNAP_MILES', 5))
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        """Whether a graph file is configured and present"""
+        return self._loaded or os.path.exists(self.graph_path)
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+
+        with self._load_lock:
+            if self._loaded:
+                return
+
+            data = np.load(self.graph_path)
+            self.node_lat = data['node_lat'].astype(float)
+            self.node_lon = data['node_lon'].astype(float)
+            edge_from = data['edge_from'].astype(np.int64)
+            edge_to = data['edge_to'].astype(np.int64)
+            self.edge_to = edge_to.tolist()
+            self.edge_meters = data['edge_meters'].astype(float).tolist()
+            self.edge_seconds = data['edge_seconds'].astype(float).tolist()
+
+            node_count = len(self.node_lat)
+            self._forward = self._adjacency(edge_from, edge_to, node_count)
+            self._reverse = self._adjacency(edge_to, edge_from, node_count)
+
+            # Fastest edge speed bounds the A* heuristic from below
+            seconds = np.asarray(self.edge_seconds)
+            meters = np.asarray(self.edge_meters)
+            moving = seconds > 0
+            self._max_speed_mps = float((meters[moving] / seconds[moving]).max()) if moving.any() else 1.0
+
+            self._lat_rad = np.radians(self.node_lat).tolist()
+            self._lon_rad = np.radians(self.node_lon).tolist()
+            self._cos_lat = np.cos(np.radians(self.node_lat)).tolist()
+            self._loaded = True
+
+            logger.info(f"Loaded road graph {self.graph_path}: "
+                        f"{node_count} nodes, {len(self.edge_meters)} edges")
+
+    @staticmethod
+    def _adjacency(tails: np.ndarray, heads: np.ndarray, node_count: int) -> Tuple[List[int], List[int], List[int]]:
+        # CSR layout: edges leaving node u are edge_ids[offsets[u]:offsets[u + 1]]
+        order = np.argsort(tails, kind='stable')
+        offsets = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tails, minlength=node_count), out=offsets[1:])
+        return offsets.tolist(), heads[order].tolist(), order.tolist()
+
+    def snap(self, coords: LatLon) -> Optional[int]:
+        """Index of the graph node nearest to coords, or None when outside coverage"""
+        self._ensure_loaded()
+        dy = (self.node_lat - coords[0]) * MILES_PER_DEGREE_LAT
+        dx = (self.node_lon - coords[1]) * MILES_PER_DEGREE_LAT * math.cos(math.radians(coords[0]))
+        squared = dx * dx + dy * dy
+        node = int(np.argmin(squared))
+        if math.sqrt(squared[node]) > self.max_snap_miles:
+            return None
+        return node
+
+    def _heuristic_seconds(self, a: int, b: int) -> float:
+        # Great-circle distance at the fastest speed in the graph never overestimates
+        dlat = self._lat_rad[b] - self._lat_rad[a]
+        dlon = self._lon_rad[b] - self._lon_rad[a]
+        h = math.sin(dlat / 2) ** 2 + self._cos_lat[a] * self._cos_lat[b] * math.sin(dlon / 2) ** 2
+        return 2 * _EARTH_RADIUS_METERS * math.asin(min(1.0, math.sqrt(h))) / self._max_speed_mps
+
+    def shortest_path(self, source: int, target: int) -> Optional[List[int]]:
+        """
+        Fastest path between two nodes as a list of edge ids
+
+        Bidirectional A*: both searches run Dijkstra on costs reduced by the
+        averaged potential (h_target - h_source) / 2, which keeps reduced
+        costs non-negative for both directions so the usual bidirectional
+        stopping rule stays exact.
+        """
+        self._ensure_loaded()
+        if source == target:
+            return []
+
+        potentials: Dict[int, float] = {}
+
+        def potential(node: int) -> float:
+            value = potentials.get(node)
+            if value is None:
+                value = (self._heuristic_seconds(node, target) - self._heuristic_seconds(node, source)) / 2
+                potentials[node] = value
+            return value
+
+        seconds = self.edge_seconds
+        searches = (
+            (self._forward, {source: 0.0}, {source: None}, [(0.0, source)], set(), 1.0),
+            (self._reverse, {target: 0.0}, {target: None}, [(0.0, target)], set(), -1.0)
+        )
+        best = math.inf
+        meeting = None
+
+        while searches[0][3] and searches[1][3]:
+            if searches[0][3][0][0] + searches[1][3][0][0] >= best:
+                break
+
+            # Advance whichever frontier is closer
+            side = 0 if searches[0][3][0][0] <= searches[1][3][0][0] else 1
+            adjacency, dist, parent, heap, settled, sign = searches[side]
+            other_dist = searches[1 - side][1]
+
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled.add(u)
+
+            offsets, heads, edge_ids = adjacency
+            pu = potential(u)
+            for k in range(offsets[u], offsets[u + 1]):
+                v = heads[k]
+                edge = edge_ids[k]
+                reduced = max(0.0, seconds[edge] - sign * (pu - potential(v)))
+                nd = d + reduced
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    parent[v] = (u, edge)
+                    heapq.heappush(heap, (nd, v))
+                    if v in other_dist and nd + other_dist[v] < best:
+                        best = nd + other_dist[v]
+                        meeting = v
+
+        if meeting is None:
+            return None
+
+        forward_parent = searches[0][2]
+        reverse_parent = searches[1][2]
+
+        path: List[int] = []
+        node = meeting
+        while forward_parent[node] is not None:
+            node, edge = forward_parent[node]
+            path.append(edge)
+        path.reverse()
+
+        node = meeting
+        while reverse_parent[node] is not None:
+            node, edge = reverse_parent[node]
+            path.append(edge)
+
+        return path
+
+    def one_to_many(self, source: int, targets: List[int], reverse: bool = False) -> List[Optional[Tuple[float, float]]]:
+        """
+        Fastest (meters, seconds) from source to every target (to source when reverse)
+
+        Plain Dijkstra that stops once every target is settled; unreachable
+        targets are None.
+        """
+        self._ensure_loaded()
+        offsets, heads, edge_ids = self._reverse if reverse else self._forward
+        seconds = self.edge_seconds
+        meters = self.edge_meters
+
+        remaining = set(targets)
+        results: Dict[int, Tuple[float, float]] = {}
+        dist = {source: 0.0}
+        length = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = set()
+
+        while heap and remaining:
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled.add(u)
+            if u in remaining:
+                remaining.discard(u)
+                results[u] = (length[u], d)
+
+            for k in range(offsets[u], offsets[u + 1]):
+                v = heads[k]
+                edge = edge_ids[k]
+                nd = d + seconds[edge]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    length[v] = length[u] + meters[edge]
+                    heapq.heappush(heap, (nd, v))
+
+        return [results.get(target) for target in targets]
+
+    def route(self, start_coords: LatLon, end_coords: LatLon) -> Optional[Dict]:
+        """
+        Fastest route between two coordinates in the get_route dict shape
+
+        Returns None when an endpoint is outside the graph or no path exists.
+        """
+        self._ensure_loaded()
+        source = self.snap(start_coords)
+        target = self.snap(end_coords)
+        if source is None or target is None:
+            logger.warning(f"Route endpoints {start_coords} -> {end_coords} are outside the road graph")
+            return None
+
+        path = self.shortest_path(source, target)
+        if path is None:
+            logger.warning(f"No path in road graph from {start_coords} to {end_coords}")
+            return None
+
+        nodes = [source] + [self.edge_to[edge] for edge in path]
+        coordinates = [[start_coords[1], start_coords[0]]]
+        coordinates += [[float(self.node_lon[n]), float(self.node_lat[n])] for n in nodes]
+        coordinates.append([end_coords[1], end_coords[0]])
+
+        lons = [c[0] for c in coordinates]
+        lats = [c[1] for c in coordinates]
+
+        return {
+            'geometry': {'type': 'LineString', 'coordinates': coordinates},
+            'distance_meters': sum(self.edge_meters[edge] for edge in path),
+            'duration_seconds': sum(self.edge_seconds[edge] for edge in path),
+            'instructions': [],
+            'bbox': [min(lons), min(lats), max(lons), max(lats)],
+            'route_points': [(lat, lon) for lon, lat in coordinates]
+        }
+
+    def matrix(self, origins: List[LatLon], destinations: List[LatLon]) -> Dict:
+        """Distance/duration matrix in the OpenRouteService shape; unroutable cells are None"""
+        self._ensure_loaded()
+        destination_nodes = [self.snap(d) for d in destinations]
+        reachable = [n for n in destination_nodes if n is not None]
+
+        distances = []
+        durations = []
+        for origin in origins:
+            source = self.snap(origin)
+            costs = dict(zip(reachable, self.one_to_many(source, reachable))) if source is not None else {}
+            row = [costs.get(n) if n is not None else None for n in destination_nodes]
+            distances.append([cell[0] if cell else None for cell in row])
+            durations.append([cell[1] if cell else None for cell in row])
+
+        return {'distances': distances, 'durations': durations}
+
+
+def _parse_maxspeed(value: Optional[str]) -> Optional[float]:
+    """OSM maxspeed tag in km/h ('50', '65 mph'), or None if unusable"""
+    if not value:
+        return None
+    parts = value.strip().split()
+    try:
+        speed = float(parts[0])
+    except (ValueError, IndexError):
+        return None
+    if len(parts) > 1 and parts[1].lower() == 'mph':
+        speed *= 1.609
+    return speed if speed > 0 else None
+
+
+def build_graph(osm_path: str, output_path: str) -> Dict:
+    """
+    Build a routing graph from an OSM XML extract
+
+    Keeps drivable highways, honours oneway tags, and keeps only the
+    largest connected component so every snapped endpoint is routable.
+    """
+    node_coords: Dict[int, LatLon] = {}
+    edges: List[Tuple[int, int, float]] = []
+
+    for _, element in ET.iterparse(osm_path, events=('end',)):
+        if element.tag == 'node':
+            node_coords[int(element.get('id'))] = (float(element.get('lat')), float(element.get('lon')))
+            element.clear()
+        elif element.tag == 'way':
+            tags = {tag.get('k'): tag.get('v') for tag in element.findall('tag')}
+            highway = tags.get('highway')
+            if highway in HIGHWAY_SPEEDS_KMH:
+                refs = [int(nd.get('ref')) for nd in element.findall('nd')]
+                speed = _parse_maxspeed(tags.get('maxspeed')) or HIGHWAY_SPEEDS_KMH[highway]
+                oneway = tags.get('oneway', '')
+                forward = oneway != '-1'
+                backward = not (oneway in ('yes', '1', 'true') or
+                                (oneway == '' and (highway == 'motorway' or tags.get('junction') == 'roundabout')))
+                if oneway == '-1':
+                    backward = True
+                for a, b in zip(refs, refs[1:]):
+                    if forward:
+                        edges.append((a, b, speed))
+                    if backward:
+                        edges.append((b, a, speed))
+            element.clear()
+
+    edges = [edge for edge in edges if edge[0] in node_coords and edge[1] in node_coords]
+    if not edges:
+        raise ValueError(f"No drivable roads found in {osm_path}")
+
+    # Compact node ids
+    used = sorted({node for edge in edges for node in edge[:2]})
+    position = {node: i for i, node in enumerate(used)}
+    tails = np.array([position[a] for a, _, _ in edges], dtype=np.int64)
+    heads = np.array([position[b] for _, b, _ in edges], dtype=np.int64)
+    speeds_kmh = np.array([speed for _, _, speed in edges], dtype=float)
+
+    # Largest weakly connected component (union-find)
+    parent = list(range(len(used)))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in zip(tails.tolist(), heads.tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[ra] = rb
+    roots = np.array([find(i) for i in range(len(used))])
+    largest = np.bincount(roots).argmax()
+    keep_nodes = roots == largest
+    keep_edges = keep_nodes[tails]
+
+    remap = np.cumsum(keep_nodes) - 1
+    lat = np.array([node_coords[n][0] for n in used])[keep_nodes]
+    lon = np.array([node_coords[n][1] for n in used])[keep_nodes]
+    tails = remap[tails[keep_edges]]
+    heads = remap[heads[keep_edges]]
+    speeds_kmh = speeds_kmh[keep_edges]
+
+    lat1, lon1 = np.radians(lat[tails]), np.radians(lon[tails])
+    lat2, lon2 = np.radians(lat[heads]), np.radians(lon[heads])
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    meters = 2 * _EARTH_RADIUS_METERS * np.arcsin(np.minimum(1.0, np.sqrt(h)))
+    seconds = meters / (speeds_kmh / 3.6)
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    np.savez_compressed(
+        output_path,
+        node_lat=lat.astype(np.float32), node_lon=lon.astype(np.float32),
+        edge_from=tails.astype(np.int32), edge_to=heads.astype(np.int32),
+        edge_meters=meters.astype(np.float32), edge_seconds=seconds.astype(np.float32)
+    )
+
+    return {'nodes': int(len(lat)), 'edges': int(len(tails))}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Local routing graph tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='Build a routing graph from an OSM XML extract')
+    build.add_argument('osm_path')
+    build.add_argument('output_path', nargs='?', default=os.path.join('data', 'graph', 'road_graph.npz'))
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        summary = build_graph(args.osm_path, args.output_path)
+        print(f"Wrote {args.output_path}: {summary['nodes']} nodes, {summary['edges']} edges")
+    return 0
+
+
+# Global engine instance
+local_router = LocalRoutingEngine()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
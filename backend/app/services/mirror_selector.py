@@ -0,0 +1,248 @@
+"""
+Health-aware selection across equivalent upstream mirrors
+Tracks latency and errors per mirror, tries the healthiest first, hedges
+slow requests onto the next mirror and stops sending to mirrors that keep
+failing until a cooldown has passed
+"""
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class MirrorUnavailable(Exception):
+    """Raised when no mirror could be tried"""
+
+
+class _MirrorState:
+    def __init__(self, url: str, window: int):
+        self.url = url
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.trial_in_flight = False
+        self.requests = 0
+        self.failures = 0
+        self.circuit_opens = 0
+
+
+class MirrorSelector:
+    """
+    Route calls to the healthiest of several mirrors
+
+    Mirrors are ranked by recent median latency inflated by their error
+    rate. A call goes to the best mirror; if it hasn't answered within that
+    mirror's recent p90 latency, a hedged duplicate goes to the next one and
+    the first success wins. A mirror whose circuit is open (too many
+    consecutive failures) is skipped until its cooldown ends, then gets a
+    single trial request.
+    """
+
+    def __init__(self, name: str, urls: List[str],
+                 window: int = 50,
+                 hedge_enabled: bool = True,
+                 hedge_default_seconds: float = 5.0,
+                 hedge_min_seconds: float = 0.5,
+                 failure_threshold: int = 3,
+                 cooldown_seconds: float = 60.0,
+                 max_workers: int = 8):
+        self.name = name
+        self.hedge_enabled = hedge_enabled
+        self.hedge_default_seconds = hedge_default_seconds
+        self.hedge_min_seconds = hedge_min_seconds
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+
+        self._mirrors = [_MirrorState(url, window) for url in urls]
+        self._lock = threading.Lock()
+        self._hedges = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=f'{name}-mirror'
+        )
+
+        _register_selector(self)
+
+    def execute(self, call: Callable[[str], T]) -> T:
+        """
+        Run call(url) against the mirrors, returning the first successful result
+
+        Raises the last mirror's exception when every mirror failed.
+        """
+        trials: List[_MirrorState] = []
+        pending = self._ranked(trials)
+        if not pending:
+            raise MirrorUnavailable(f"No {self.name} mirrors configured")
+
+        last_error: Exception = MirrorUnavailable(f"All {self.name} mirrors failed")
+
+        try:
+            while pending:
+                primary = pending.pop(0)
+                future, started = self._submit(call, primary)
+                futures = {future}
+
+                # The p90 clock starts when the call runs, not while it queues for a worker
+                started.wait()
+                done, _ = wait(futures, timeout=self._hedge_delay(primary))
+                if not done and pending and self.hedge_enabled:
+                    secondary = pending.pop(0)
+                    logger.info(f"{self.name}: {primary.url} slower than its p90, hedging to {secondary.url}")
+                    futures.add(self._submit(call, secondary)[0])
+                    with self._lock:
+                        self._hedges += 1
+
+                # First success wins; the slower request finishes in the background
+                remaining = futures
+                while remaining:
+                    done, remaining = wait(remaining, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            return future.result()
+                        except Exception as e:
+                            last_error = e
+
+            raise last_error
+        finally:
+            # Hand back trial slots claimed for mirrors that were never tried
+            with self._lock:
+                for mirror in pending:
+                    if mirror in trials:
+                        mirror.trial_in_flight = False
+
+    def urls(self) -> List[str]:
+        """Mirror URLs in the order they would be tried now"""
+        return [mirror.url for mirror in self._ranked()]
+
+    def stats(self) -> Dict:
+        """Per-mirror latency, error and circuit state"""
+        now = time.time()
+        with self._lock:
+            mirrors = {}
+            for mirror in self._mirrors:
+                mirrors[mirror.url] = {
+                    'requests': mirror.requests,
+                    'failures': mirror.failures,
+                    'error_rate': round(self._error_rate(mirror), 3),
+                    'p50_seconds': round(self._percentile(mirror, 0.5), 3) if mirror.latencies else None,
+                    'p90_seconds': round(self._percentile(mirror, 0.9), 3) if mirror.latencies else None,
+                    'circuit': self._circuit_state(mirror, now),
+                    'circuit_opens': mirror.circuit_opens
+                }
+            return {'mirrors': mirrors, 'hedged_requests': self._hedges}
+
+    def _submit(self, call: Callable[[str], T], mirror: _MirrorState) -> Tuple[Future, threading.Event]:
+        """Queue call(mirror.url); the event is set once a worker starts running it"""
+        with self._lock:
+            mirror.requests += 1
+        running = threading.Event()
+
+        def timed():
+            running.set()
+            started = time.monotonic()
+            try:
+                result = call(mirror.url)
+            except Exception:
+                self._record(mirror, False, time.monotonic() - started)
+                raise
+            self._record(mirror, True, time.monotonic() - started)
+            return result
+
+        return self._executor.submit(timed), running
+
+    def _record(self, mirror: _MirrorState, success: bool, latency: float) -> None:
+        with self._lock:
+            mirror.outcomes.append(success)
+            mirror.trial_in_flight = False
+            if success:
+                mirror.latencies.append(latency)
+                mirror.consecutive_failures = 0
+                mirror.open_until = 0.0
+                return
+
+            mirror.failures += 1
+            mirror.consecutive_failures += 1
+            if mirror.consecutive_failures >= self.failure_threshold:
+                if not mirror.open_until or mirror.open_until <= time.time():
+                    mirror.circuit_opens += 1
+                    logger.warning(f"{self.name}: opening circuit for {mirror.url} "
+                                   f"after {mirror.consecutive_failures} consecutive failures")
+                mirror.open_until = time.time() + self.cooldown_seconds
+
+    def _ranked(self, trials: Optional[List[_MirrorState]] = None) -> List[_MirrorState]:
+        """
+        Usable mirrors, best first
+
+        Half-open mirrors are included only while their single trial slot is
+        free; when trials is given, those slots are claimed and the mirrors
+        appended to it, so concurrent callers can't both send a trial.
+        """
+        now = time.time()
+        with self._lock:
+            available = []
+            for m in self._mirrors:
+                state = self._circuit_state(m, now)
+                if state == 'closed':
+                    available.append(m)
+                elif state == 'half_open' and not m.trial_in_flight:
+                    if trials is not None:
+                        m.trial_in_flight = True
+                        trials.append(m)
+                    available.append(m)
+            # Stable sort keeps the configured order between equally healthy mirrors
+            available.sort(key=self._score)
+            if available:
+                return available
+
+            # Every circuit is open: try the one that reopens soonest rather than nothing
+            return sorted(self._mirrors, key=lambda m: m.open_until)[:1]
+
+    def _score(self, mirror: _MirrorState) -> float:
+        # Caller holds self._lock
+        latency = self._percentile(mirror, 0.5) if mirror.latencies else self.hedge_default_seconds
+        return latency * (1 + 4 * self._error_rate(mirror))
+
+    def _hedge_delay(self, mirror: _MirrorState) -> float:
+        with self._lock:
+            if len(mirror.latencies) < 5:
+                return self.hedge_default_seconds
+            return max(self.hedge_min_seconds, self._percentile(mirror, 0.9))
+
+    def _circuit_state(self, mirror: _MirrorState, now: float) -> str:
+        if not mirror.open_until:
+            return 'closed'
+        return 'open' if mirror.open_until > now else 'half_open'
+
+    @staticmethod
+    def _error_rate(mirror: _MirrorState) -> float:
+        if not mirror.outcomes:
+            return 0.0
+        return mirror.outcomes.count(False) / len(mirror.outcomes)
+
+    @staticmethod
+    def _percentile(mirror: _MirrorState, fraction: float) -> float:
+        ordered = sorted(mirror.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+_selectors: Dict[str, MirrorSelector] = {}
+_selectors_lock = threading.Lock()
+
+
+def _register_selector(selector: MirrorSelector) -> None:
+    with _selectors_lock:
+        _selectors[selector.name] = selector
+
+
+def mirror_stats() -> Dict[str, Dict]:
+    """Statistics for every mirror selector created in this process"""
+    with _selectors_lock:
+        selectors = list(_selectors.values())
+    return {selector.name: selector.stats() for selector in selectors}
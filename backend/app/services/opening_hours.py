@@ -0,0 +1,191 @@
+"""
+OpenStreetMap opening_hours evaluation
+Compiles opening_hours expressions into sorted weekly minute intervals once
+per distinct expression, so checking whether a venue is open is a bisect
+
+Supported: 24/7, weekday selectors (Mo-Fr, Sa,Su, Fr-Mo), time spans
+including past midnight and open ends (18:00-02:00, 17:00+), off/closed,
+';' rules that override earlier days and ',' additional rules. Expressions
+using anything else (months, weeks, dates, sunrise, fallback rules) compile
+to None, meaning "unknown".
+"""
+import re
+import logging
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+WEEKDAYS = ('Mo', 'Tu', 'We', 'Th', 'Fr', 'Sa', 'Su')
+_HOLIDAYS = ('PH', 'SH')
+
+_TOKEN = re.compile(
+    r'\s*(?:'
+    r'(?P<days>(?:Mo|Tu|We|Th|Fr|Sa|Su)(?:-(?:Mo|Tu|We|Th|Fr|Sa|Su))?)'
+    r'|(?P<holiday>PH|SH)'
+    r'|(?P<span>(?P<start>\d{1,2}:\d{2})(?:-(?P<end>\d{1,2}:\d{2}))?(?P<open_end>\+)?)'
+    r'|(?P<state>off|closed|open)'
+    r'|(?P<comma>,)'
+    r')',
+    re.IGNORECASE
+)
+
+Interval = Tuple[int, int]
+
+
+class OpeningHours:
+    """Weekly open intervals in minutes from Monday 00:00"""
+
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self, intervals: List[Interval]):
+        merged: List[List[int]] = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+
+    def is_open_at_minute(self, week_minute: int) -> bool:
+        i = bisect_right(self.starts, week_minute % MINUTES_PER_WEEK) - 1
+        return i >= 0 and week_minute % MINUTES_PER_WEEK < self.ends[i]
+
+    def is_open(self, when: datetime) -> bool:
+        """Whether the venue is open at a (local) datetime"""
+        return self.is_open_at_minute(when.weekday() * MINUTES_PER_DAY + when.hour * 60 + when.minute)
+
+    def intervals(self) -> List[Interval]:
+        return list(zip(self.starts, self.ends))
+
+
+def _minutes(clock: str) -> int:
+    hour, minute = clock.split(':')
+    return int(hour) * 60 + int(minute)
+
+
+def _day_range(token: str) -> List[int]:
+    names = token.split('-')
+    first = WEEKDAYS.index(names[0].capitalize())
+    last = WEEKDAYS.index(names[-1].capitalize())
+    # Ranges may wrap past Sunday (Fr-Mo)
+    return [(first + offset) % 7 for offset in range((last - first) % 7 + 1)]
+
+
+def _parse_rule(rule: str) -> Optional[List[Tuple[Optional[List[int]], List[Interval]]]]:
+    """
+    Split one ';' rule into (days, spans) groups; ',' before a weekday starts
+    an additional group. days is None for "every day"; None overall if the
+    rule uses syntax we don't evaluate.
+    """
+    groups: List[Tuple[Optional[List[int]], List[Interval]]] = []
+    days: Optional[List[int]] = None
+    holiday_only = False
+    spans: List[Interval] = []
+    seen_time = False
+
+    def close_group():
+        if holiday_only and not days:
+            # Public/school holiday rules don't apply to a regular week
+            return
+        groups.append((days, spans if seen_time else [(0, MINUTES_PER_DAY)]))
+
+    pos = 0
+    rule = rule.strip()
+    while pos < len(rule):
+        match = _TOKEN.match(rule, pos)
+        if not match or match.end() == pos:
+            return None
+        pos = match.end()
+
+        if match.group('days') or match.group('holiday'):
+            if seen_time:
+                close_group()
+                days, holiday_only, spans, seen_time = None, False, [], False
+            if match.group('holiday'):
+                holiday_only = days is None
+            else:
+                days = (days or []) + _day_range(match.group('days'))
+                holiday_only = False
+        elif match.group('span'):
+            start = _minutes(match.group('start'))
+            if match.group('end'):
+                end = _minutes(match.group('end'))
+                if end <= start:
+                    end += MINUTES_PER_DAY
+            else:
+                if not match.group('open_end'):
+                    return None
+                # Open end: assume open until midnight
+                end = max(MINUTES_PER_DAY, start + 60)
+            spans.append((start, end))
+            seen_time = True
+        elif match.group('state'):
+            if match.group('state').lower() != 'open':
+                spans = []
+            else:
+                spans = [(0, MINUTES_PER_DAY)]
+            seen_time = True
+
+    close_group()
+    return groups
+
+
+@lru_cache(maxsize=4096)
+def compile_opening_hours(expression: str) -> Optional[OpeningHours]:
+    """
+    Compile an opening_hours expression (memoized per expression string)
+
+    Returns:
+        OpeningHours, or None when the expression is empty or uses syntax
+        we don't evaluate
+    """
+    expression = re.sub(r'"[^"]*"', '', expression or '').strip().rstrip(';')
+    if not expression:
+        return None
+    if expression == '24/7':
+        return OpeningHours([(0, MINUTES_PER_WEEK)])
+
+    # Spans per weekday; a later ';' rule replaces the days it names
+    week: Dict[int, List[Interval]] = {day: [] for day in range(7)}
+    for rule in expression.split(';'):
+        if not rule.strip():
+            continue
+        groups = _parse_rule(rule)
+        if groups is None:
+            logger.debug(f"Unsupported opening_hours expression: {expression!r}")
+            return None
+
+        replaced = set()
+        for days, spans in groups:
+            for day in range(7) if days is None else days:
+                if day not in replaced:
+                    week[day] = []
+                    replaced.add(day)
+                week[day].extend(spans)
+
+    intervals: List[Interval] = []
+    for day, spans in week.items():
+        for start, end in spans:
+            start += day * MINUTES_PER_DAY
+            end += day * MINUTES_PER_DAY
+            # Sunday spans past midnight continue on Monday morning
+            if end > MINUTES_PER_WEEK:
+                intervals.append((0, end - MINUTES_PER_WEEK))
+                end = MINUTES_PER_WEEK
+            intervals.append((start, end))
+    return OpeningHours(intervals)
+
+
+def is_open_at(expression: str, when: datetime) -> Optional[bool]:
+    """Whether a venue with this opening_hours is open at when; None if unknown"""
+    hours = compile_opening_hours(expression or '')
+    if hours is None:
+        return None
+    return hours.is_open(when)
@@ -1,9 +1,14 @@
-import requests
 import os
 import logging
 from typing import Dict, List, Tuple, Optional
 from geopy.distance import geodesic
-import time
+import numpy as np
+
+from .distance_matrix import estimate_matrix, matrix_engine
+from .http_client import UpstreamError, upstream_client
+from .local_router import local_router
+from .route_cache import route_cache
+from .route_index import RouteIndex, route_indexes
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +17,9 @@ class OpenRouteService:
         self.api_key = os.getenv('OPENROUTE_SERVICE_API_KEY', 'YOUR_OPENROUTE_SERVICE_API_KEY_HERE')
         self.base_url = 'https://api.openrouteservice.org'
         
+        # 'mock' (demo routes), 'openroute' (live API) or 'local' (offline road graph)
+        self.routing_backend = os.getenv('ROUTING_BACKEND', 'mock').lower()
+        
     def get_route(self, start_coords: Tuple[float, float], 
                   end_coords: Tuple[float, float], 
                   profile: str = 'driving-car') -> Optional[Dict]:
@@ -27,63 +35,112 @@ class OpenRouteService:
             Route data dictionary with geometry, distance, and duration
         """
         try:
-            # For demo purposes, always use mock data to ensure system works
-            logger.info(f"Using mock route data for demo from {start_coords} to {end_coords}")
-            return self._generate_mock_route(start_coords, end_coords)
-            
-            # OpenRouteService expects [longitude, latitude] format
-            coordinates = [
-                [start_coords[1], start_coords[0]],  # start: [lon, lat]
-                [end_coords[1], end_coords[0]]       # end: [lon, lat]
-            ]
-            
-            url = f"{self.base_url}/v2/directions/{profile}"
-            
-            headers = {
-                'Authorization': self.api_key,
-                'Content-Type': 'application/json'
-            }
-            
-            payload = {
-                'coordinates': coordinates,
-                'format': 'geojson',
-                'geometry_simplify': True,
-                'instructions': True,
-                'elevation': False
-            }
-            
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            if 'features' in data and len(data['features']) > 0:
-                feature = data['features'][0]
-                properties = feature['properties']
-                
-                return {
-                    'geometry': feature['geometry'],
-                    'distance_meters': properties['summary']['distance'],
-                    'duration_seconds': properties['summary']['duration'],
-                    'instructions': properties.get('segments', [{}])[0].get('steps', []),
-                    'bbox': data.get('bbox', []),
-                    'route_points': self._extract_route_points(feature['geometry'])
-                }
-            
-            return None
-            
-        except requests.exceptions.RequestException as e:
+            # Repeat plans for the same endpoints skip the routing call entirely
+            route = route_cache.get_or_fetch(
+                start_coords, end_coords, f"{self.routing_backend}:{profile}",
+                lambda: self._fetch_route(start_coords, end_coords, profile)
+            )
+            
+            if route is None and self.routing_backend == 'local':
+                # Not cached, so the real route is used once the graph can answer
+                logger.info(f"Using mock route data from {start_coords} to {end_coords}")
+                return self._generate_mock_route(start_coords, end_coords)
+            return route
+            
+        except UpstreamError as e:
             logger.error(f"OpenRouteService API error: {e}")
             return self._generate_mock_route(start_coords, end_coords)
         except Exception as e:
             logger.error(f"Route calculation error: {e}")
             return None
     
+    def _fetch_route(self, start_coords: Tuple[float, float], 
+                     end_coords: Tuple[float, float], 
+                     profile: str) -> Optional[Dict]:
+        """Fetch a route from OpenRouteService (raises on API errors so they aren't cached)"""
+        if self.routing_backend == 'local':
+            return self._fetch_local_route(start_coords, end_coords)
+        
+        if self.routing_backend != 'openroute':
+            # For demo purposes, use mock data to ensure system works
+            logger.info(f"Using mock route data for demo from {start_coords} to {end_coords}")
+            return self._generate_mock_route(start_coords, end_coords)
+        
+        # OpenRouteService expects [longitude, latitude] format
+        coordinates = [
+            [start_coords[1], start_coords[0]],  # start: [lon, lat]
+            [end_coords[1], end_coords[0]]       # end: [lon, lat]
+        ]
+        
+        url = f"{self.base_url}/v2/directions/{profile}"
+        
+        headers = {
+            'Authorization': self.api_key,
+            'Content-Type': 'application/json'
+        }
+        
+        payload = {
+            'coordinates': coordinates,
+            'format': 'geojson',
+            'geometry_simplify': True,
+            'instructions': True,
+            'elevation': False
+        }
+        
+        response = upstream_client.post(
+            'openroute', url, json=payload, headers=headers, timeout=10
+        )
+        response.raise_for_status()
+        
+        data = response.json()
+        
+        if 'features' in data and len(data['features']) > 0:
+            feature = data['features'][0]
+            properties = feature['properties']
+            
+            return {
+                'geometry': feature['geometry'],
+                'distance_meters': properties['summary']['distance'],
+                'duration_seconds': properties['summary']['duration'],
+                'instructions': properties.get('segments', [{}])[0].get('steps', []),
+                'bbox': data.get('bbox', []),
+                'route_points': self._extract_route_points(feature['geometry'])
+            }
+        
+        return None
+    
+    def _fetch_local_route(self, start_coords: Tuple[float, float], 
+                           end_coords: Tuple[float, float]) -> Optional[Dict]:
+        """Route on the offline road graph (None if it can't answer)"""
+        try:
+            if local_router.is_available():
+                route = local_router.route(start_coords, end_coords)
+                if route is not None:
+                    return route
+            else:
+                logger.warning(f"Local road graph {local_router.graph_path} not found")
+        except Exception as e:
+            logger.error(f"Local routing error: {e}")
+        
+        return None
+    
+    def get_route_index(self, route_geometry: Dict) -> RouteIndex:
+        """
+        Linear-referencing index for a route, built once and reused for repeat queries
+        
+        Args:
+            route_geometry: GeoJSON LineString geometry from route (or (lat, lon) points)
+        """
+        return route_indexes.get(route_geometry)
+    
     def get_route_points_with_spacing(self, route_geometry: Dict, 
                                     spacing_miles: float = 5.0) -> List[Tuple[float, float]]:
         """
         Extract evenly spaced points along a route for restaurant searching
         
+        Points are interpolated along the segments, so they are exactly
+        spacing_miles apart even where the route has few vertices.
+        
         Args:
             route_geometry: GeoJSON LineString geometry from route
             spacing_miles: Distance between points in miles
@@ -95,34 +152,10 @@ class OpenRouteService:
             if route_geometry['type'] != 'LineString':
                 return []
             
-            coordinates = route_geometry['coordinates']  # [lon, lat] pairs
-            route_points = [(lat, lon) for lon, lat in coordinates]  # Convert to (lat, lon)
-            
-            if len(route_points) < 2:
-                return route_points
-            
-            # Calculate evenly spaced points
-            spaced_points = [route_points[0]]  # Always include start point
-            current_distance = 0
-            target_distance = spacing_miles
-            
-            for i in range(1, len(route_points)):
-                prev_point = route_points[i-1]
-                current_point = route_points[i]
-                
-                segment_distance = geodesic(prev_point, current_point).miles
-                current_distance += segment_distance
-                
-                # Check if we've reached the target spacing
-                if current_distance >= target_distance:
-                    spaced_points.append(current_point)
-                    target_distance += spacing_miles
-            
-            # Always include end point if it's not already included
-            if route_points[-1] not in spaced_points:
-                spaced_points.append(route_points[-1])
+            if len(route_geometry['coordinates']) < 2:
+                return [(lat, lon) for lon, lat in route_geometry['coordinates']]
             
-            return spaced_points
+            return self.get_route_index(route_geometry).spaced_points(spacing_miles)
             
         except Exception as e:
             logger.error(f"Error extracting route points: {e}")
@@ -134,49 +167,78 @@ class OpenRouteService:
         """
         Calculate distance/time matrix between multiple points
         
+        Large matrices are split into chunks within the provider limits and
+        fetched concurrently; previously seen origin->destination cells come
+        from the cache.
+        
         Args:
             origins: List of (latitude, longitude) origin points
             destinations: List of (latitude, longitude) destination points
             profile: Transport mode
             
         Returns:
-            Matrix data with distances and durations
+            Matrix data with distances (meters) and durations (seconds); if the
+            provider fails, the whole matrix is a straight-line estimate and
+            carries 'estimated': True
         """
         try:
+            if self.routing_backend == 'local' and local_router.is_available():
+                return local_router.matrix(origins, destinations)
+            
             if self.api_key == 'YOUR_OPENROUTE_SERVICE_API_KEY_HERE':
                 logger.warning("OpenRouteService API key not configured - using mock matrix")
                 return self._generate_mock_matrix(origins, destinations)
             
-            # Combine all points and convert to [lon, lat] format
-            all_points = origins + destinations
-            locations = [[point[1], point[0]] for point in all_points]
-            
-            url = f"{self.base_url}/v2/matrix/{profile}"
-            
-            headers = {
-                'Authorization': self.api_key,
-                'Content-Type': 'application/json'
-            }
-            
-            payload = {
-                'locations': locations,
-                'sources': list(range(len(origins))),
-                'destinations': list(range(len(origins), len(all_points))),
-                'metrics': ['distance', 'duration']
-            }
-            
-            response = requests.post(url, json=payload, headers=headers, timeout=15)
-            response.raise_for_status()
+            try:
+                return matrix_engine.compute(
+                    origins, destinations, profile,
+                    lambda chunk_origins, chunk_destinations: self._fetch_matrix(
+                        chunk_origins, chunk_destinations, profile
+                    )
+                )
+            except Exception as e:
+                logger.error(f"Matrix request failed, using straight-line estimate: {e}")
+                matrix = estimate_matrix(origins, destinations)
+                matrix['estimated'] = True
+                return matrix
             
-            return response.json()
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"OpenRouteService Matrix API error: {e}")
-            return self._generate_mock_matrix(origins, destinations)
         except Exception as e:
             logger.error(f"Matrix calculation error: {e}")
             return None
     
+    def _fetch_matrix(self, origins: List[Tuple[float, float]], 
+                     destinations: List[Tuple[float, float]],
+                     profile: str) -> Dict:
+        """Request one matrix chunk from OpenRouteService (raises on failure)"""
+        # Combine all points and convert to [lon, lat] format
+        all_points = origins + destinations
+        locations = [[point[1], point[0]] for point in all_points]
+        
+        url = f"{self.base_url}/v2/matrix/{profile}"
+        
+        headers = {
+            'Authorization': self.api_key,
+            'Content-Type': 'application/json'
+        }
+        
+        payload = {
+            'locations': locations,
+            'sources': list(range(len(origins))),
+            'destinations': list(range(len(origins), len(all_points))),
+            'metrics': ['distance', 'duration']
+        }
+        
+        response = upstream_client.post(
+            'openroute', url, json=payload, headers=headers, timeout=15
+        )
+        response.raise_for_status()
+        
+        data = response.json()
+        return {
+            'distances': data['distances'],
+            'durations': data['durations']
+        }
+    
     def find_nearest_route_point(self, restaurant_coords: Tuple[float, float], 
                                 route_points: List[Tuple[float, float]]) -> Tuple[float, float]:
         """
@@ -187,21 +249,36 @@ class OpenRouteService:
             route_points: List of route points as (latitude, longitude)
             
         Returns:
-            Closest route point as (latitude, longitude)
+            Closest route point as (latitude, longitude); this is the foot of the
+            perpendicular on the nearest segment, not necessarily a vertex
         """
         if not route_points:
             return restaurant_coords
         
-        closest_point = route_points[0]
-        min_distance = geodesic(restaurant_coords, closest_point).miles
+        return self.find_nearest_route_points([restaurant_coords], route_points)[0]
+    
+    def find_nearest_route_points(self, coords: List[Tuple[float, float]], 
+                                 route_points: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+        """
+        Batch version of find_nearest_route_point
         
-        for point in route_points[1:]:
-            distance = geodesic(restaurant_coords, point).miles
-            if distance < min_distance:
-                min_distance = distance
-                closest_point = point
+        Args:
+            coords: List of (latitude, longitude) points to snap
+            route_points: List of route points as (latitude, longitude)
+            
+        Returns:
+            Closest route point for each input, in input order
+        """
+        if not route_points:
+            return list(coords)
+        if not coords:
+            return []
         
-        return closest_point
+        index = route_indexes.get(route_points)
+        lats = np.array([c[0] for c in coords], dtype=float)
+        lons = np.array([c[1] for c in coords], dtype=float)
+        _, positions, _ = index.nearest(lats, lons)
+        return [(float(lat), float(lon)) for lat, lon in index.points_at(positions)]
     
     def _extract_route_points(self, geometry: Dict) -> List[Tuple[float, float]]:
         """Extract lat/lon points from route geometry"""
@@ -270,28 +347,7 @@ class OpenRouteService:
     def _generate_mock_matrix(self, origins: List[Tuple[float, float]], 
                             destinations: List[Tuple[float, float]]) -> Dict:
         """Generate mock matrix data for testing without API key"""
-        distances = []
-        durations = []
-        
-        for origin in origins:
-            origin_distances = []
-            origin_durations = []
-            
-            for destination in destinations:
-                distance_miles = geodesic(origin, destination).miles
-                distance_meters = distance_miles * 1609.34
-                duration_seconds = distance_miles * 60  # Assume 1 mile per minute
-                
-                origin_distances.append(distance_meters)
-                origin_durations.append(duration_seconds)
-            
-            distances.append(origin_distances)
-            durations.append(origin_durations)
-        
-        return {
-            'distances': distances,
-            'durations': durations
-        }
+        return estimate_matrix(origins, destinations)
 
 
 # Global service instance
@@ -1,12 +1,94 @@
 import requests
+import codecs
 import json
+import os
+import re
 import logging
-from typing import Dict, List, Tuple, Optional, Set
-from geopy.distance import geodesic
-import time
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional, Set, Union
+import numpy as np
+
+from .geo_cache import geo_cache
+from .geo_utils import polyline_to_points, simplify_polyline
+from .http_client import upstream_client
+from .mirror_selector import MirrorSelector, MirrorUnavailable
+from .poi_store import poi_store
+from .restaurant_record import DIETS, RestaurantRecord, diet_mask
+from .route_index import route_indexes
 
 logger = logging.getLogger(__name__)
 
+# The only OSM tags the parser reads; queries project elements down to these
+OSM_TAGS_READ = (
+    'name', 'amenity', 'cuisine', 'website', 'phone', 'opening_hours',
+    'addr:housenumber', 'addr:street', 'addr:city', 'addr:state', 'addr:postcode',
+    'stars', 'brand', 'price',
+    'diet:vegetarian', 'diet:vegan', 'diet:gluten_free', 'diet:halal', 'diet:kosher'
+)
+
+# Compact output: one converted element per node carrying its id, coordinates
+# and the tags above, printed unsorted
+_COMPACT_OUTPUT = (
+    'convert node ::id=id(), "@lat"=lat(), "@lon"=lon(), ' +
+    ', '.join(f'"{tag}"=t["{tag}"]' for tag in OSM_TAGS_READ) +
+    ';\n        out qt;'
+)
+
+FOOD_AMENITY_PATTERN = '^(restaurant|cafe|fast_food|pub|bar)$'
+
+_json_decoder = json.JSONDecoder()
+_REMARK = re.compile(r'"remark"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def iter_overpass_elements(chunks: Iterable[bytes]) -> Iterator[Dict]:
+    """
+    Yield the items of an Overpass JSON "elements" array as the bytes arrive
+
+    Only the element being decoded is held in memory, never the whole
+    document. Raises ValueError if the stream ends before the array closes.
+    """
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    in_array = False
+    chunks = iter(chunks)
+
+    for chunk in chunks:
+        buffer = buffer[pos:] + text_decoder.decode(chunk)
+        pos = 0
+
+        if not in_array:
+            key = buffer.find('"elements"')
+            bracket = buffer.find('[', key) if key != -1 else -1
+            if bracket == -1:
+                continue
+            pos = bracket + 1
+            in_array = True
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                break
+
+            if buffer[pos] == ']':
+                # Overpass reports timeouts and other runtime errors after the array
+                tail = buffer[pos + 1:] + ''.join(text_decoder.decode(c) for c in chunks)
+                remark = _REMARK.search(tail)
+                if remark:
+                    logger.warning(f"Overpass remark: {remark.group(1)}")
+                return
+
+            try:
+                element, end = _json_decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # Element split across chunks; wait for more bytes
+                break
+            yield element
+            pos = end
+
+    raise ValueError("Overpass response ended before the elements array closed")
+
+
 class OverpassAPIService:
     def __init__(self):
         self.base_url = 'https://overpass-api.de/api/interpreter'
@@ -14,21 +96,80 @@ class OverpassAPIService:
             'https://lz4.overpass-api.de/api/interpreter',
             'https://z.overpass-api.de/api/interpreter'
         ]
+        
+        # Healthiest mirror first, hedged onto the next one past its recent p90 latency
+        self.mirrors = MirrorSelector(
+            'overpass',
+            [self.base_url] + self.backup_urls,
+            hedge_enabled=os.getenv('OVERPASS_HEDGE_ENABLED', 'true').lower() == 'true',
+            hedge_default_seconds=float(os.getenv('OVERPASS_HEDGE_DEFAULT_SECONDS', 5)),
+            failure_threshold=int(os.getenv('OVERPASS_BREAKER_FAILURES', 3)),
+            cooldown_seconds=float(os.getenv('OVERPASS_BREAKER_COOLDOWN_SECONDS', 60))
+        )
+        
+        # 'mock' (demo data), 'live' (one corridor query per route against the mirrors)
+        # or 'local' (offline POI store built by app.services.poi_store)
+        self.backend = os.getenv('OVERPASS_BACKEND', 'mock').lower()
+        # Longest around: polyline per statement; longer corridors become several statements in one query
+        self.corridor_max_vertices = int(os.getenv('OVERPASS_CORRIDOR_MAX_VERTICES', 200))
     
     def find_restaurants_along_route(self, 
                                    route_points: List[Tuple[float, float]], 
                                    radius_miles: float = 5.0,
                                    cuisine_types: Optional[List[str]] = None,
                                    dietary_restrictions: Optional[List[str]] = None,
-                                   max_budget: Optional[float] = None) -> List[Dict]:
+                                   max_budget: Optional[float] = None,
+                                   route_geometry: Optional[Union[Dict, List]] = None,
+                                   route_stretches: Optional[List[Tuple[float, float]]] = None) -> List[RestaurantRecord]:
         """
         Find restaurants along a route using OpenStreetMap data via Overpass API
+        
+        Args:
+            route_points: Search points along the route as (latitude, longitude)
+            radius_miles: Maximum distance from the route
+            cuisine_types: Preferred cuisine types
+            dietary_restrictions: Dietary restrictions to filter by
+            max_budget: Maximum budget per meal
+            route_geometry: Full route polyline (GeoJSON LineString or points);
+                the corridor follows it when given, otherwise route_points
+            route_stretches: (start, end) arc-length miles along the route to
+                search; the whole route when omitted
+            
+        Returns:
+            Restaurant records ordered along the route, each with route_point_index
+            and distance_from_route_miles; call to_dict() on them for the response
         """
         try:
             logger.info(f"Finding restaurants along route with {len(route_points)} points")
             
+            if self.backend == 'local':
+                if poi_store.is_available():
+                    return self._search_local_corridor(
+                        route_points, radius_miles, cuisine_types, dietary_restrictions,
+                        max_budget, route_geometry, route_stretches
+                    )
+                logger.warning(f"POI store {poi_store.db_path} not found - using mock restaurant data")
+            
+            if self.backend == 'live':
+                return self._search_restaurants_along_corridor(
+                    route_points, radius_miles, cuisine_types, dietary_restrictions,
+                    max_budget, route_geometry, route_stretches
+                )
+            
             # For demo purposes, return mock restaurant data
-            return self._generate_mock_restaurants(route_points, radius_miles, cuisine_types)
+            restaurants = [
+                RestaurantRecord.from_dict(restaurant)
+                for restaurant in self._generate_mock_restaurants(route_points, radius_miles, cuisine_types)
+            ]
+            if route_stretches and restaurants:
+                polyline = polyline_to_points(route_geometry) if route_geometry else list(route_points)
+                _, positions, _ = route_indexes.get(polyline).nearest(
+                    np.array([r.lat for r in restaurants], dtype=float),
+                    np.array([r.lon for r in restaurants], dtype=float)
+                )
+                keep = self._in_stretches(positions, route_stretches, radius_miles)
+                restaurants = [r for r, kept in zip(restaurants, keep) if kept]
+            return restaurants
             
         except Exception as e:
             logger.error(f"Error finding restaurants along route: {e}")
@@ -103,46 +244,347 @@ class OverpassAPIService:
         
         return restaurants
     
+    def _search_restaurants_along_corridor(self, 
+                                         route_points: List[Tuple[float, float]], 
+                                         radius_miles: float,
+                                         cuisine_types: Optional[List[str]] = None,
+                                         dietary_restrictions: Optional[List[str]] = None,
+                                         max_budget: Optional[float] = None,
+                                         route_geometry: Optional[Union[Dict, List]] = None,
+                                         route_stretches: Optional[List[Tuple[float, float]]] = None) -> List[RestaurantRecord]:
+        """
+        Search the route corridor (or the given stretches of it) with a single Overpass query
+        
+        The route is simplified first and the query radius widened by the
+        simplification tolerance, so the corridor still contains everything
+        within radius_miles of the real route; results are then trimmed to
+        the exact radius against the full polyline.
+        """
+        polyline = polyline_to_points(route_geometry) if route_geometry else list(route_points)
+        if not polyline:
+            return []
+        
+        tolerance_miles = min(1.0, radius_miles / 4)
+        simplified = [
+            simplify_polyline(part, tolerance_miles)
+            for part in self._corridor_parts(polyline, route_stretches, radius_miles)
+        ]
+        query_radius_meters = int((radius_miles + tolerance_miles) * 1609.34)
+        
+        query = self._build_corridor_query(
+            simplified, query_radius_meters, cuisine_types, dietary_restrictions, max_budget
+        )
+        restaurants = self._post_query(query, timeout=90)
+        if restaurants is None:
+            return []
+        
+        # Cuisine and diet are exact in the query; budget is only narrowed there
+        if max_budget is not None:
+            restaurants = self._filter_by_budget(restaurants, max_budget)
+        
+        return self._trim_to_route(restaurants, polyline, route_points, radius_miles, route_stretches)
+    
+    def _search_local_corridor(self, 
+                               route_points: List[Tuple[float, float]], 
+                               radius_miles: float,
+                               cuisine_types: Optional[List[str]] = None,
+                               dietary_restrictions: Optional[List[str]] = None,
+                               max_budget: Optional[float] = None,
+                               route_geometry: Optional[Union[Dict, List]] = None,
+                               route_stretches: Optional[List[Tuple[float, float]]] = None) -> List[RestaurantRecord]:
+        """
+        Corridor search against the local POI store
+        """
+        polyline = polyline_to_points(route_geometry) if route_geometry else list(route_points)
+        if not polyline:
+            return []
+        
+        tolerance_miles = min(1.0, radius_miles / 4)
+        restaurants = []
+        for part in self._corridor_parts(polyline, route_stretches, radius_miles):
+            # Diet exclusions are applied in SQL
+            restaurants.extend(poi_store.along_polyline(
+                simplify_polyline(part, tolerance_miles), radius_miles + tolerance_miles,
+                self._normalize_diets(dietary_restrictions)
+            ))
+        
+        cuisine_pattern = self._cuisine_pattern(cuisine_types)
+        if cuisine_pattern:
+            matcher = re.compile(cuisine_pattern, re.IGNORECASE)
+            restaurants = [r for r in restaurants if matcher.search(r.cuisine)]
+        if max_budget is not None:
+            restaurants = self._filter_by_budget(restaurants, max_budget)
+        
+        return self._trim_to_route(restaurants, polyline, route_points, radius_miles, route_stretches)
+    
+    @staticmethod
+    def _corridor_parts(polyline: List[Tuple[float, float]], 
+                        route_stretches: Optional[List[Tuple[float, float]]],
+                        radius_miles: float) -> List[List[Tuple[float, float]]]:
+        """
+        The polyline, or its pieces covering each (start, end) stretch in miles
+        
+        Pieces extend radius_miles past each end so they contain everything
+        _in_stretches keeps.
+        """
+        if not route_stretches:
+            return [polyline]
+        index = route_indexes.get(polyline)
+        return [index.slice(start - radius_miles, end + radius_miles) for start, end in route_stretches]
+    
+    @staticmethod
+    def _in_stretches(positions: np.ndarray, 
+                      route_stretches: List[Tuple[float, float]], 
+                      radius_miles: float) -> np.ndarray:
+        """Whether each arc-length position is within radius_miles of one of the stretches"""
+        keep = np.zeros(len(positions), dtype=bool)
+        for start, end in route_stretches:
+            keep |= (positions >= start - radius_miles) & (positions <= end + radius_miles)
+        return keep
+    
+    def _trim_to_route(self, 
+                       restaurants: List[RestaurantRecord], 
+                       polyline: List[Tuple[float, float]], 
+                       route_points: List[Tuple[float, float]], 
+                       radius_miles: float,
+                       route_stretches: Optional[List[Tuple[float, float]]] = None) -> List[RestaurantRecord]:
+        """
+        Dedupe corridor candidates by OSM id, keep those within radius_miles of
+        the polyline (and of the searched stretches) and order them along the route
+        """
+        # One element per OSM id even where corridor statements overlap
+        unique = []
+        seen: Set = set()
+        for restaurant in restaurants:
+            if restaurant.osm_id in seen:
+                continue
+            seen.add(restaurant.osm_id)
+            unique.append(restaurant)
+        restaurants = unique
+        
+        if not restaurants:
+            return []
+        
+        index = route_indexes.get(polyline)
+        lats = np.array([r.lat for r in restaurants], dtype=float)
+        lons = np.array([r.lon for r in restaurants], dtype=float)
+        distances, positions, _ = index.nearest(lats, lons)
+        
+        # Closest search point along the route, for callers that group by route point
+        if route_points:
+            _, search_positions, _ = index.nearest(
+                np.array([p[0] for p in route_points], dtype=float),
+                np.array([p[1] for p in route_points], dtype=float)
+            )
+        else:
+            search_positions = np.zeros(1)
+        nearest_point = np.abs(positions[:, None] - search_positions[None, :]).argmin(axis=1)
+        
+        keep = distances <= radius_miles
+        if route_stretches:
+            keep &= self._in_stretches(positions, route_stretches, radius_miles)
+        within = np.nonzero(keep)[0]
+        ordered = within[np.argsort(positions[within], kind='stable')]
+        
+        results = []
+        for i in ordered:
+            restaurant = restaurants[i]
+            restaurant.route_point_index = int(nearest_point[i])
+            # Kept exact so callers can re-filter by a smaller radius; to_dict() rounds
+            restaurant.distance_from_route_miles = float(distances[i])
+            results.append(restaurant)
+        
+        logger.info(f"Corridor search found {len(restaurants)} candidates, {len(results)} within {radius_miles} miles")
+        return results
+    
+    def _build_corridor_query(self, 
+                            polylines: List[List[Tuple[float, float]]], 
+                            radius_meters: int,
+                            cuisine_types: Optional[List[str]] = None,
+                            dietary_restrictions: Optional[List[str]] = None,
+                            max_budget: Optional[float] = None) -> str:
+        """
+        Build one Overpass QL query covering a radius around one or more polylines
+        """
+        statements = []
+        step = max(2, self.corridor_max_vertices)
+        for polyline in polylines:
+            # Consecutive pieces share an endpoint so the corridor has no gaps
+            for start in range(0, max(1, len(polyline) - 1), step - 1):
+                piece = polyline[start:start + step]
+                coords = ','.join(f"{lat:.6f},{lon:.6f}" for lat, lon in piece)
+                statements.extend(self._restaurant_statements(
+                    f"(around:{radius_meters},{coords})", cuisine_types, dietary_restrictions, max_budget
+                ))
+        
+        body = '\n          '.join(statements)
+        query = f"""
+        [out:json][timeout:60];
+        (
+          {body}
+        );
+        {_COMPACT_OUTPUT}
+        """
+        
+        return query
+    
+    def _restaurant_statements(self, 
+                               area: str, 
+                               cuisine_types: Optional[List[str]] = None,
+                               dietary_restrictions: Optional[List[str]] = None,
+                               max_budget: Optional[float] = None) -> List[str]:
+        """
+        Overpass QL node statements for food amenities in an area, with the
+        cuisine, dietary and budget filters expressed as tag predicates
+        """
+        predicates = ''
+        
+        cuisine_pattern = self._cuisine_pattern(cuisine_types)
+        if cuisine_pattern:
+            predicates += f'["cuisine"~"{cuisine_pattern}",i]'
+        
+        # Same rule as _meets_dietary_restrictions: only an explicit "no" excludes
+        for diet in self._normalize_diets(dietary_restrictions):
+            predicates += f'["diet:{diet}"!="no"]'
+        
+        if max_budget is not None and max_budget < 15:
+            # Low budget keeps price level 1: fast food, or anything with a price tag
+            # (the exact price rule is applied after parsing)
+            return [
+                f'node["amenity"="fast_food"]{predicates}{area};',
+                f'node["amenity"~"{FOOD_AMENITY_PATTERN}"]["price"]{predicates}{area};'
+            ]
+        
+        return [f'node["amenity"~"{FOOD_AMENITY_PATTERN}"]{predicates}{area};']
+    
+    @staticmethod
+    def _cuisine_pattern(cuisine_types: Optional[List[str]]) -> Optional[str]:
+        """
+        Regex matching any of the cuisines as one entry of a ';'-separated OSM cuisine tag
+        (valid both in Overpass QL and Python)
+        """
+        names = []
+        for cuisine in cuisine_types or []:
+            # OSM cuisine values are lowercase with underscores; drop anything else
+            name = re.sub(r'[^a-z0-9_]', '', str(cuisine).strip().lower().replace(' ', '_').replace('-', '_'))
+            if name and name not in names:
+                names.append(name)
+        if not names:
+            return None
+        return f"(^|;)[ ]*({'|'.join(names)})[ ]*(;|$)"
+    
+    @staticmethod
+    def _normalize_diets(dietary_restrictions: Optional[List[str]]) -> List[str]:
+        """Dietary restrictions as the diet keys we track ('gluten-free' -> 'gluten_free')"""
+        diets = []
+        for restriction in dietary_restrictions or []:
+            diet = str(restriction).strip().lower().replace('-', '_').replace(' ', '_')
+            if diet in DIETS and diet not in diets:
+                diets.append(diet)
+        return diets
+    
     def _search_restaurants_near_point(self, 
                                      lat: float, 
                                      lon: float, 
                                      radius_meters: int,
                                      cuisine_types: Optional[List[str]] = None,
-                                     dietary_restrictions: Optional[List[str]] = None) -> List[Dict]:
+                                     dietary_restrictions: Optional[List[str]] = None) -> List[RestaurantRecord]:
         """
         Search for restaurants near a specific point using Overpass API
         """
         try:
-            # Build Overpass query
-            query = self._build_overpass_query(lat, lon, radius_meters, cuisine_types)
+            if self.backend == 'local' and poi_store.is_available():
+                restaurants = poi_store.nearby(
+                    lat, lon, radius_meters / 1609.34, self._normalize_diets(dietary_restrictions)
+                )
+                cuisine_pattern = self._cuisine_pattern(cuisine_types)
+                if cuisine_pattern:
+                    matcher = re.compile(cuisine_pattern, re.IGNORECASE)
+                    restaurants = [r for r in restaurants if matcher.search(r.cuisine)]
+            else:
+                # Served from the geo tile cache when an overlapping search already ran
+                rows = geo_cache.get_or_fetch(
+                    'overpass_rows', (lat, lon), radius_meters, cuisine_types,
+                    lambda center, bucket_radius: self._fetch_restaurant_rows(
+                        center[0], center[1], bucket_radius, cuisine_types
+                    ),
+                    lambda row: (row[1], row[2])
+                )
+                if rows is None:
+                    return []
+                restaurants = [RestaurantRecord.from_row(row) for row in rows]
             
-            # Try main URL first, then backups
-            urls_to_try = [self.base_url] + self.backup_urls
-            
-            for url in urls_to_try:
-                try:
-                    response = requests.post(
-                        url,
-                        data={'data': query},
-                        timeout=30
-                    )
-                    response.raise_for_status()
-                    data = response.json()
-                    
-                    restaurants = self._parse_overpass_response(data, dietary_restrictions)
-                    return restaurants
-                    
-                except requests.exceptions.RequestException as e:
-                    logger.warning(f"Overpass API URL {url} failed: {e}")
-                    continue
+            # Dietary filtering happens after the cache so one tile serves every diet
+            if dietary_restrictions:
+                restaurants = [
+                    r for r in restaurants
+                    if self._meets_dietary_restrictions(r, dietary_restrictions)
+                ]
             
-            logger.error("All Overpass API URLs failed")
-            return []
+            return restaurants
             
         except Exception as e:
             logger.error(f"Error searching restaurants near point: {e}")
             return []
     
+    def _fetch_restaurants_near_point(self, 
+                                    lat: float, 
+                                    lon: float, 
+                                    radius_meters: int,
+                                    cuisine_types: Optional[List[str]] = None) -> Optional[List[RestaurantRecord]]:
+        """
+        Query the Overpass mirrors for one point (None if every mirror failed)
+        """
+        # Build Overpass query
+        query = self._build_overpass_query(lat, lon, radius_meters, cuisine_types)
+        
+        return self._post_query(query, timeout=30)
+    
+    def _fetch_restaurant_rows(self, 
+                               lat: float, 
+                               lon: float, 
+                               radius_meters: int,
+                               cuisine_types: Optional[List[str]] = None) -> Optional[List[List]]:
+        """Point search results as cacheable rows (None if every mirror failed)"""
+        restaurants = self._fetch_restaurants_near_point(lat, lon, radius_meters, cuisine_types)
+        if restaurants is None:
+            return None
+        return [restaurant.to_row() for restaurant in restaurants]
+    
+    def _post_query(self, query: str, timeout: float) -> Optional[List[RestaurantRecord]]:
+        """
+        Run an Overpass query on the healthiest mirror and parse the restaurants
+        (None if every mirror failed)
+        """
+        try:
+            return self.mirrors.execute(
+                lambda url: self._post_to_mirror(url, query, timeout)
+            )
+        except (requests.exceptions.RequestException, ValueError, MirrorUnavailable) as e:
+            logger.error(f"All Overpass API URLs failed: {e}")
+            return None
+    
+    def _post_to_mirror(self, url: str, query: str, timeout: float) -> List[RestaurantRecord]:
+        """Send one query to one mirror, parsing elements as they stream in (raises on failure)"""
+        try:
+            # Failing over to the next mirror is the retry, so don't retry in place
+            response = upstream_client.post(
+                'overpass',
+                url,
+                data={'data': query},
+                timeout=timeout,
+                max_retries=0,
+                stream=True
+            )
+            with response:
+                response.raise_for_status()
+                return list(self._parse_elements(
+                    iter_overpass_elements(response.iter_content(chunk_size=64 * 1024))
+                ))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"Overpass API URL {url} failed: {e}")
+            raise
+    
     def _build_overpass_query(self, 
                             lat: float, 
                             lon: float, 
@@ -152,66 +594,80 @@ class OverpassAPIService:
         Build Overpass QL query for restaurants
         """
         # Base query for restaurants and cafes
+        # Diet is left out so one cached tile serves every dietary filter
+        statements = self._restaurant_statements(f"(around:{radius_meters},{lat},{lon})", cuisine_types)
+        body = '\n          '.join(statements)
         query = f"""
         [out:json][timeout:25];
         (
-          node["amenity"="restaurant"](around:{radius_meters},{lat},{lon});
-          node["amenity"="cafe"](around:{radius_meters},{lat},{lon});
-          node["amenity"="fast_food"](around:{radius_meters},{lat},{lon});
-          node["amenity"="pub"](around:{radius_meters},{lat},{lon});
-          node["amenity"="bar"](around:{radius_meters},{lat},{lon});
+          {body}
         );
-        out geom;
+        {_COMPACT_OUTPUT}
         """
         
         return query
     
     def _parse_overpass_response(self, 
                                data: Dict, 
-                               dietary_restrictions: Optional[List[str]] = None) -> List[Dict]:
+                               dietary_restrictions: Optional[List[str]] = None) -> List[RestaurantRecord]:
         """
         Parse Overpass API response and extract restaurant information
         """
-        restaurants = []
-        
         try:
-            for element in data.get('elements', []):
-                if element.get('type') != 'node':
-                    continue
-                
-                tags = element.get('tags', {})
-                
-                # Extract basic information
-                restaurant = {
-                    'osm_id': element.get('id'),
-                    'lat': element.get('lat'),
-                    'lon': element.get('lon'),
-                    'name': tags.get('name', 'Unknown Restaurant'),
-                    'amenity': tags.get('amenity', 'restaurant'),
-                    'cuisine': tags.get('cuisine', 'unknown'),
-                    'website': tags.get('website', ''),
-                    'phone': tags.get('phone', ''),
-                    'opening_hours': tags.get('opening_hours', ''),
-                    'address': self._extract_address(tags),
-                    'rating': self._extract_rating(tags),
-                    'price_level': self._extract_price_level(tags),
-                    'dietary_info': self._extract_dietary_info(tags)
-                }
-                
-                # Filter by dietary restrictions if specified
-                if dietary_restrictions and not self._meets_dietary_restrictions(
-                    restaurant, dietary_restrictions
-                ):
-                    continue
-                
-                restaurants.append(restaurant)
-            
-            return restaurants
+            return list(self._parse_elements(data.get('elements', []), dietary_restrictions))
             
         except Exception as e:
             logger.error(f"Error parsing Overpass response: {e}")
             return []
     
+    def _parse_elements(self, 
+                        elements: Iterable[Dict], 
+                        dietary_restrictions: Optional[List[str]] = None) -> Iterator[RestaurantRecord]:
+        """
+        Turn Overpass node elements into restaurant records one at a time
+        
+        Accepts both plain nodes and the compact converted form, whose
+        coordinates arrive as "@lat"/"@lon" and whose missing tags are empty.
+        """
+        for element in elements:
+            if element.get('type') != 'node':
+                continue
+            
+            tags = element.get('tags', {})
+            lat = element.get('lat')
+            lon = element.get('lon')
+            if '@lat' in tags:
+                tags = {k: v for k, v in tags.items() if v != ''}
+                lat = float(tags.pop('@lat'))
+                lon = float(tags.pop('@lon'))
+            
+            # Extract basic information
+            dietary_info = self._extract_dietary_info(tags)
+            restaurant = RestaurantRecord(
+                element.get('id'),
+                lat,
+                lon,
+                tags.get('name', 'Unknown Restaurant'),
+                tags.get('amenity', 'restaurant'),
+                tags.get('cuisine', 'unknown'),
+                tags.get('website', ''),
+                tags.get('phone', ''),
+                tags.get('opening_hours', ''),
+                self._extract_address(tags),
+                self._extract_rating(tags),
+                self._extract_price_level(tags),
+                diet_mask(diet for diet, supported in dietary_info.items() if supported),
+                diet_mask(self._extract_dietary_unavailable(tags))
+            )
+            
+            # Filter by dietary restrictions if specified
+            if dietary_restrictions and not self._meets_dietary_restrictions(
+                restaurant, dietary_restrictions
+            ):
+                continue
+            
+            yield restaurant
+    
     def _extract_address(self, tags: Dict) -> str:
         """Extract address from OSM tags"""
         address_parts = []
@@ -307,43 +763,50 @@ class OverpassAPIService:
         
         return dietary_info
     
+    def _extract_dietary_unavailable(self, tags: Dict) -> List[str]:
+        """Diets the venue is explicitly tagged as not catering for (diet:*=no)"""
+        return [diet for diet in DIETS if tags.get(f'diet:{diet}') == 'no']
+    
     def _meets_dietary_restrictions(self, 
-                                  restaurant: Dict, 
+                                  restaurant: RestaurantRecord, 
                                   restrictions: List[str]) -> bool:
         """Check if restaurant meets dietary restrictions"""
-        dietary_info = restaurant.get('dietary_info', {})
-        
-        for restriction in restrictions:
-            restriction_key = restriction.lower()
-            if restriction_key in dietary_info and not dietary_info[restriction_key]:
-                # If we have explicit info saying they don't support this diet
-                continue
-            # If no explicit info, we'll be optimistic and include it
-        
-        return True  # Be inclusive when dietary info is limited
+        # Only explicit info saying they don't support a diet excludes; with no
+        # explicit info we're optimistic and include it
+        return not restaurant.diet_no_mask & diet_mask(self._normalize_diets(restrictions))
     
-    def _filter_by_budget(self, restaurants: List[Dict], max_budget: float) -> List[Dict]:
+    def _filter_by_budget(self, restaurants: List[RestaurantRecord], max_budget: float) -> List[RestaurantRecord]:
         """Filter restaurants by maximum budget per meal"""
         if max_budget >= 30:  # High budget
             return restaurants
         elif max_budget >= 15:  # Medium budget
-            return [r for r in restaurants if r.get('price_level', 2) <= 2]
+            return [r for r in restaurants if r.price_level <= 2]
         else:  # Low budget
-            return [r for r in restaurants if r.get('price_level', 2) <= 1]
+            return [r for r in restaurants if r.price_level <= 1]
     
     def _calculate_distance_from_route(self, 
                                      restaurant_coords: Tuple[float, float], 
                                      route_points: List[Tuple[float, float]]) -> float:
-        """Calculate minimum distance from restaurant to any point on the route"""
+        """Calculate minimum distance from restaurant to the route polyline"""
         if not route_points:
             return 999.0
         
-        min_distance = float('inf')
-        for route_point in route_points:
-            distance = geodesic(restaurant_coords, route_point).miles
-            min_distance = min(min_distance, distance)
+        return self._calculate_distances_from_route([restaurant_coords], route_points)[0]
+    
+    def _calculate_distances_from_route(self, 
+                                      restaurant_coords: List[Tuple[float, float]], 
+                                      route_points: List[Tuple[float, float]]) -> List[float]:
+        """Distance in miles from each restaurant to the route polyline, in input order"""
+        if not route_points:
+            return [999.0] * len(restaurant_coords)
+        if not restaurant_coords:
+            return []
         
-        return min_distance
+        index = route_indexes.get(route_points)
+        lats = np.array([c[0] for c in restaurant_coords], dtype=float)
+        lons = np.array([c[1] for c in restaurant_coords], dtype=float)
+        distances, _, _ = index.nearest(lats, lons)
+        return distances.tolist()
     
     def get_restaurant_details(self, osm_id: int) -> Optional[Dict]:
         """
@@ -353,20 +816,12 @@ class OverpassAPIService:
             query = f"""
             [out:json][timeout:10];
             node(id:{osm_id});
-            out geom;
+            {_COMPACT_OUTPUT}
             """
             
-            response = requests.post(
-                self.base_url,
-                data={'data': query},
-                timeout=15
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            elements = data.get('elements', [])
-            if elements:
-                return self._parse_overpass_response(data, None)[0]
+            restaurants = self._post_query(query, timeout=15)
+            if restaurants:
+                return restaurants[0].to_dict()
             
             return None
             
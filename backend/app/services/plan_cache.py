@@ -0,0 +1,129 @@
+"""
+Response cache for /api/trips/plan-route
+Stores the serialized JSON body keyed on a canonical form of the request,
+so identical plans skip routing, restaurant search and serialization
+"""
+import hashlib
+import json
+import os
+import logging
+from datetime import date
+from typing import Dict, Optional
+
+from .cache import TieredCache
+
+logger = logging.getLogger(__name__)
+
+# Bump when the plan-route response shape or planning logic changes
+PLAN_CACHE_SCHEMA = 1
+
+MEALS = ('breakfast', 'lunch', 'dinner')
+
+
+def _identity(payload: bytes) -> bytes:
+    return payload
+
+
+def _file_stamp(path: str) -> str:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return '-'
+    return f"{int(stat.st_mtime)}-{stat.st_size}"
+
+
+class PlanResponseCache:
+    """Size-bounded, TTL'd cache of plan-route response bodies"""
+
+    def __init__(self):
+        # 3 decimals snaps endpoints to roughly 100 m, like the route cache
+        self.snap_decimals = int(os.getenv('PLAN_CACHE_SNAP_DECIMALS', 3))
+        # Changing this invalidates every cached plan (e.g. after refreshing provider data)
+        self.data_version = os.getenv('PLAN_CACHE_DATA_VERSION', '1')
+        self.cache = TieredCache(
+            'plan_responses',
+            max_entries=int(os.getenv('PLAN_CACHE_MAX_ENTRIES', 500)),
+            ttl_seconds=float(os.getenv('PLAN_CACHE_TTL_SECONDS', 3600)),
+            max_bytes=int(os.getenv('PLAN_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+            encode=_identity,
+            decode=_identity
+        )
+
+    def canonical_request(self, data: Dict) -> Dict:
+        """
+        The parts of a plan request that affect the response, normalized
+
+        Coordinates are snapped, disabled meals dropped, lists sorted and
+        lower-cased, and today's date included because opening-hours pruning
+        depends on the weekday.
+        """
+        digits = self.snap_decimals
+
+        def location(value: Dict) -> list:
+            return [round(float(value['lat']), digits), round(float(value['lng']), digits)]
+
+        meals = {}
+        for meal_type in MEALS:
+            meal_pref = (data.get('meal_preferences') or {}).get(meal_type) or {}
+            if not meal_pref.get('enabled', False):
+                continue
+            preferred_time = meal_pref.get('preferred_time') or {}
+            meals[meal_type] = {
+                'radius_miles': float(meal_pref.get('radius_miles', 10.0)),
+                'time': str(meal_pref.get('time', '')).strip().upper(),
+                'preferred_time': [
+                    preferred_time.get('hour'),
+                    preferred_time.get('minute'),
+                    str(preferred_time.get('period', '')).upper()
+                ] if preferred_time else None
+            }
+
+        daily_budget = data.get('daily_budget')
+        return {
+            'start': location(data['start_location']),
+            'end': location(data['end_location']),
+            'departure_time': ' '.join(str(data.get('departure_time', '09:00 AM')).upper().split()),
+            'meals': meals,
+            'dietary_restrictions': sorted({str(d).strip().lower() for d in data.get('dietary_restrictions') or []}),
+            'preferred_cuisines': sorted({str(c).strip().lower() for c in data.get('preferred_cuisines') or []}),
+            'daily_budget': None if daily_budget is None else float(daily_budget),
+            'date': date.today().isoformat()
+        }
+
+    def version(self) -> str:
+        """Stamp of the code and provider data behind a response"""
+        # Imported lazily: these services are only needed to describe the active backends
+        from .local_router import local_router
+        from .openroute_service import openroute_service
+        from .overpass_api import overpass_service
+        from .poi_store import poi_store
+
+        parts = [str(PLAN_CACHE_SCHEMA), self.data_version,
+                 openroute_service.routing_backend, overpass_service.backend]
+        if openroute_service.routing_backend == 'local':
+            parts.append(_file_stamp(local_router.graph_path))
+        if overpass_service.backend == 'local':
+            parts.append(_file_stamp(poi_store.db_path))
+        return ':'.join(parts)
+
+    def key(self, data: Dict) -> Optional[str]:
+        """Cache key for a plan request (None if the request can't be canonicalized)"""
+        try:
+            canonical = json.dumps(self.canonical_request(data), sort_keys=True, separators=(',', ':'))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None
+        digest = hashlib.sha256(f"{self.version()}|{canonical}".encode('utf-8')).hexdigest()
+        return f"plan:{digest}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.cache.get(key)
+
+    def set(self, key: str, body: bytes) -> None:
+        self.cache.set(key, body)
+
+    def stats(self) -> Dict:
+        return self.cache.stats()
+
+
+# Global cache instance
+plan_cache = PlanResponseCache()
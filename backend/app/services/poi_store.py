@@ -0,0 +1,248 @@
+"""
+Local OpenStreetMap restaurant store backed by SQLite with an R*Tree index
+Answers nearby and route-corridor lookups offline, using the same parsed
+fields as the live Overpass search
+
+Import food amenities from an OSM XML extract with:
+    python -m app.services.poi_store import <extract.osm> [poi.sqlite3]
+"""
+import argparse
+import math
+import os
+import sqlite3
+import sys
+import threading
+import logging
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .geo_utils import MILES_PER_DEGREE_LAT, densify_polyline, haversine_miles
+from .restaurant_record import DIETS, RestaurantRecord, diet_mask
+
+logger = logging.getLogger(__name__)
+
+LatLon = Tuple[float, float]
+
+FOOD_AMENITIES = ('restaurant', 'cafe', 'fast_food', 'pub', 'bar')
+
+_BASE_COLUMNS = ('osm_id', 'lat', 'lon', 'name', 'amenity', 'cuisine', 'website', 'phone',
+                 'opening_hours', 'address', 'rating', 'price_level')
+# Diet columns hold 1 (diet:*=yes/only), 0 (untagged) or -1 (diet:*=no)
+_COLUMNS = _BASE_COLUMNS + DIETS
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS pois (
+    id INTEGER PRIMARY KEY,
+    osm_id INTEGER UNIQUE NOT NULL,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    name TEXT,
+    amenity TEXT,
+    cuisine TEXT,
+    website TEXT,
+    phone TEXT,
+    opening_hours TEXT,
+    address TEXT,
+    rating REAL,
+    price_level INTEGER,
+    {', '.join(f'{diet} INTEGER NOT NULL DEFAULT 0' for diet in DIETS)}
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS poi_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+"""
+
+# SQLite's default limit on bound parameters is 999
+_ID_BATCH = 900
+# Corridor boxes cover at most this many radii of route each, so a long
+# diagonal segment doesn't become one huge box
+_BOX_SPAN_RADII = 2.0
+
+
+class PoiStore:
+    """Read access to a local POI database; one SQLite connection per thread"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv(
+            'POI_STORE_PATH', os.path.join('data', 'restaurants', 'poi.sqlite3')
+        )
+        self._local = threading.local()
+
+    def is_available(self) -> bool:
+        """Whether the database file exists"""
+        return os.path.exists(self.db_path)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True)
+            connection.row_factory = sqlite3.Row
+            self._local.connection = connection
+        return connection
+
+    def nearby(self, lat: float, lon: float, radius_miles: float,
+               diets: Optional[List[str]] = None) -> List[RestaurantRecord]:
+        """Restaurants within radius_miles of a point, nearest first, excluding any tagged diet:*=no for diets"""
+        ids = self._ids_in_boxes([self._box([(lat, lon)], radius_miles)])
+        results = []
+        for restaurant in self._load(ids, diets):
+            distance = haversine_miles((lat, lon), (restaurant.lat, restaurant.lon))
+            if distance <= radius_miles:
+                results.append((distance, restaurant))
+        results.sort(key=lambda item: item[0])
+        return [restaurant for _, restaurant in results]
+
+    def along_polyline(self, polyline: List[LatLon], radius_miles: float,
+                       diets: Optional[List[str]] = None) -> List[RestaurantRecord]:
+        """
+        Candidate restaurants near a polyline
+
+        Returns everything inside the radius-padded bounding box of each
+        piece of the route, excluding venues tagged diet:*=no for any of diets;
+        callers trim to the exact distance from the route. Long segments are
+        split first so the boxes stay a few radii across.
+        """
+        if not polyline:
+            return []
+        if len(polyline) == 1:
+            boxes = [self._box(polyline, radius_miles)]
+        else:
+            points = densify_polyline(polyline, max(radius_miles, 0.1) * _BOX_SPAN_RADII)
+            boxes = [self._box([a, b], radius_miles) for a, b in zip(points, points[1:])]
+        return self._load(self._ids_in_boxes(boxes), diets)
+
+    def count(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM pois').fetchone()[0]
+
+    @staticmethod
+    def _box(points: List[LatLon], radius_miles: float) -> Tuple[float, float, float, float]:
+        lats = [p[0] for p in points]
+        lons = [p[1] for p in points]
+        lat_pad = radius_miles / MILES_PER_DEGREE_LAT
+        widest = min(89.0, max(abs(min(lats)), abs(max(lats))) + lat_pad)
+        lon_pad = radius_miles / (MILES_PER_DEGREE_LAT * math.cos(math.radians(widest)))
+        return min(lats) - lat_pad, max(lats) + lat_pad, min(lons) - lon_pad, max(lons) + lon_pad
+
+    def _ids_in_boxes(self, boxes: Iterable[Tuple[float, float, float, float]]) -> List[int]:
+        connection = self._connection()
+        ids: Set[int] = set()
+        for min_lat, max_lat, min_lon, max_lon in boxes:
+            rows = connection.execute(
+                'SELECT id FROM poi_rtree WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?',
+                (min_lat, max_lat, min_lon, max_lon)
+            )
+            ids.update(row[0] for row in rows)
+        return sorted(ids)
+
+    def _load(self, ids: List[int], diets: Optional[List[str]] = None) -> List[RestaurantRecord]:
+        connection = self._connection()
+        diet_clause = ''.join(f' AND {diet} >= 0' for diet in diets or [] if diet in DIETS)
+        restaurants = []
+        for start in range(0, len(ids), _ID_BATCH):
+            batch = ids[start:start + _ID_BATCH]
+            rows = connection.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM pois "
+                f"WHERE id IN ({','.join('?' * len(batch))}){diet_clause}",
+                batch
+            )
+            restaurants.extend(self._row_to_restaurant(row) for row in rows)
+        return restaurants
+
+    @staticmethod
+    def _row_to_restaurant(row: sqlite3.Row) -> RestaurantRecord:
+        # Same record as OverpassAPIService._parse_overpass_response
+        return RestaurantRecord(
+            *(row[column] for column in _BASE_COLUMNS),
+            diet_mask(diet for diet in DIETS if row[diet] > 0),
+            diet_mask(diet for diet in DIETS if row[diet] < 0)
+        )
+
+
+def _iter_food_nodes(osm_path: str) -> Iterable[Dict]:
+    """Yield food-amenity nodes from an OSM XML file as Overpass-style elements"""
+    for _, element in ET.iterparse(osm_path, events=('end',)):
+        if element.tag == 'node':
+            tags = {tag.get('k'): tag.get('v') for tag in element.findall('tag')}
+            if tags.get('amenity') in FOOD_AMENITIES:
+                yield {
+                    'type': 'node',
+                    'id': int(element.get('id')),
+                    'lat': float(element.get('lat')),
+                    'lon': float(element.get('lon')),
+                    'tags': tags
+                }
+            element.clear()
+        elif element.tag in ('way', 'relation'):
+            element.clear()
+
+
+def import_extract(osm_path: str, db_path: str, batch_size: int = 5000) -> int:
+    """
+    Load an OSM extract's food amenities into the store (re-importing replaces existing rows)
+
+    Returns:
+        Number of restaurants written
+    """
+    # Parse with the live search's rules so offline and online results match
+    from .overpass_api import overpass_service
+
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    connection = sqlite3.connect(db_path)
+    connection.executescript(_SCHEMA)
+
+    placeholders = ','.join('?' * len(_COLUMNS))
+    written = 0
+
+    def flush(elements: List[Dict]) -> int:
+        restaurants = overpass_service._parse_overpass_response({'elements': elements})
+        rows = [
+            tuple(r[column] for column in _BASE_COLUMNS) +
+            tuple(1 if r.diet_mask & bit else -1 if r.diet_no_mask & bit else 0
+                  for bit in (diet_mask([diet]) for diet in DIETS))
+            for r in restaurants
+        ]
+        connection.executemany(
+            f"INSERT OR REPLACE INTO pois ({', '.join(_COLUMNS)}) VALUES ({placeholders})", rows
+        )
+        return len(rows)
+
+    batch: List[Dict] = []
+    with connection:
+        for element in _iter_food_nodes(osm_path):
+            batch.append(element)
+            if len(batch) >= batch_size:
+                written += flush(batch)
+                batch = []
+        if batch:
+            written += flush(batch)
+
+        # Rebuild the R*Tree in one pass; replaced rows get new ids
+        connection.execute('DELETE FROM poi_rtree')
+        connection.execute('INSERT INTO poi_rtree SELECT id, lat, lat, lon, lon FROM pois')
+
+    connection.close()
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Local POI store tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    importer = subparsers.add_parser('import', help='Import food amenities from an OSM XML extract')
+    importer.add_argument('osm_path')
+    importer.add_argument('db_path', nargs='?', default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        db_path = args.db_path or poi_store.db_path
+        written = import_extract(args.osm_path, db_path)
+        print(f"Imported {written} restaurants into {db_path}")
+    return 0
+
+
+# Global store instance
+poi_store = PoiStore()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""
+Storage engines for AI recommendation profiles and interactions
+JSONFileStore keeps the original two-file layout; SQLiteProfileStore holds
+one indexed row per profile and per interaction in a WAL-mode database, so
+reading a user costs one indexed lookup and readers never block each other
+
+Import existing JSON data into SQLite with:
+    python -m app.services.profile_store migrate [data_dir] [db_path]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .data_store import DataStore
+
+logger = logging.getLogger(__name__)
+
+# Interaction log records grouped by user, as (log position, interaction)
+LogBatches = Dict[str, List[Tuple[Tuple[int, int], Dict]]]
+Fold = Callable[[str, Dict, Dict], Dict]
+
+
+def _unapplied(profile: Dict, records: List[Tuple[Tuple[int, int], Dict]]) -> List[Tuple[Tuple[int, int], Dict]]:
+    """Log records past the position the profile was last compacted to"""
+    applied = tuple(profile.get('log_seq') or (-1, -1))
+    return [(seq, record) for seq, record in records if tuple(seq) > applied]
+
+
+def _fold(user_id: str, profile: Dict, records: List[Tuple[Tuple[int, int], Dict]], fold: Fold) -> Dict:
+    for _, record in records:
+        profile = fold(user_id, profile, record)
+    profile['log_seq'] = list(records[-1][0])
+    return profile
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    user_id TEXT PRIMARY KEY,
+    profile TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    interaction TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS interactions_user ON interactions (user_id, id);
+"""
+
+
+class JSONFileStore:
+    """Profiles and interactions in user_profiles.json and user_interactions.json"""
+
+    PROFILES = 'user_profiles.json'
+    INTERACTIONS = 'user_interactions.json'
+
+    def __init__(self, data_dir: str = 'data'):
+        # Locked, atomically replaced files so several worker processes can share them
+        self.files = DataStore(data_dir)
+        self.user_profiles_file = self.files.path(self.PROFILES)
+        self.interactions_file = self.files.path(self.INTERACTIONS)
+
+        for key in (self.PROFILES, self.INTERACTIONS):
+            with self.files.locked(key):
+                if not self.files.exists(key):
+                    self.files.write(key, {})
+
+    def get_profile(self, user_id: str) -> Dict:
+        return self.all_profiles().get(user_id, {})
+
+    def put_profile(self, user_id: str, profile: Dict) -> None:
+        self.files.update(self.PROFILES, lambda profiles: {**profiles, user_id: profile}, default={})
+
+    def update_profile(self, user_id: str, update: Callable[[Dict], Dict]) -> Dict:
+        """Apply update to the stored profile ({} if none) and save the result"""
+        with self.files.locked(self.PROFILES):
+            profiles = self.all_profiles()
+            profiles[user_id] = update(profiles.get(user_id, {}))
+            self.files.write(self.PROFILES, profiles)
+            return profiles[user_id]
+
+    def get_interactions(self, user_id: str) -> List[Dict]:
+        return self.all_interactions().get(user_id, [])
+
+    def append_interaction(self, user_id: str, interaction: Dict) -> None:
+        def append(interactions: Dict[str, List[Dict]]) -> Dict[str, List[Dict]]:
+            interactions.setdefault(user_id, []).append(interaction)
+            return interactions
+
+        self.files.update(self.INTERACTIONS, append, default={})
+
+    def apply_log(self, batches: LogBatches, fold: Fold) -> None:
+        """
+        Store logged interactions and fold them into their profiles
+
+        Records at or before a profile's log_seq were applied by an earlier
+        run and are skipped, so re-applying a batch changes nothing.
+        """
+        with self.files.locked(self.PROFILES, self.INTERACTIONS):
+            profiles = self.all_profiles()
+            interactions = self.all_interactions()
+            for user_id, records in batches.items():
+                profile = profiles.get(user_id, {})
+                records = _unapplied(profile, records)
+                if not records:
+                    continue
+                interactions.setdefault(user_id, []).extend(record for _, record in records)
+                profiles[user_id] = _fold(user_id, profile, records, fold)
+
+            # A crash between the two writes can repeat this batch in the history,
+            # but never folds it into a profile twice
+            self.files.write(self.INTERACTIONS, interactions)
+            self.files.write(self.PROFILES, profiles)
+
+    def all_profiles(self) -> Dict[str, Dict]:
+        return self.files.read(self.PROFILES, {})
+
+    def all_interactions(self) -> Dict[str, List[Dict]]:
+        return self.files.read(self.INTERACTIONS, {})
+
+
+class SQLiteProfileStore:
+    """Profiles and interactions in a WAL-mode SQLite database; one connection per thread"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        # WAL persists in the database file: readers see the last commit while a writer appends
+        connection.execute('PRAGMA journal_mode=WAL')
+        with connection:
+            connection.executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def get_profile(self, user_id: str) -> Dict:
+        row = self._connection().execute(
+            'SELECT profile FROM profiles WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def put_profile(self, user_id: str, profile: Dict) -> None:
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO profiles (user_id, profile) VALUES (?, ?)',
+                (user_id, json.dumps(profile, separators=(',', ':')))
+            )
+
+    def update_profile(self, user_id: str, update: Callable[[Dict], Dict]) -> Dict:
+        """Read, update and write a profile in one write transaction so concurrent updates don't overwrite each other"""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT profile FROM profiles WHERE user_id = ?', (user_id,)
+            ).fetchone()
+            profile = update(json.loads(row[0]) if row else {})
+            connection.execute(
+                'INSERT OR REPLACE INTO profiles (user_id, profile) VALUES (?, ?)',
+                (user_id, json.dumps(profile, separators=(',', ':')))
+            )
+        except Exception:
+            connection.rollback()
+            raise
+        connection.commit()
+        return profile
+
+    def get_interactions(self, user_id: str) -> List[Dict]:
+        rows = self._connection().execute(
+            'SELECT interaction FROM interactions WHERE user_id = ? ORDER BY id', (user_id,)
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def append_interaction(self, user_id: str, interaction: Dict) -> None:
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                'INSERT INTO interactions (user_id, interaction) VALUES (?, ?)',
+                (user_id, json.dumps(interaction, separators=(',', ':')))
+            )
+
+    def apply_log(self, batches: LogBatches, fold: Fold) -> None:
+        """
+        Store logged interactions and fold them into their profiles in one transaction
+
+        Records at or before a profile's log_seq were applied by an earlier
+        run and are skipped, so re-applying a batch changes nothing.
+        """
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for user_id, records in batches.items():
+                row = connection.execute(
+                    'SELECT profile FROM profiles WHERE user_id = ?', (user_id,)
+                ).fetchone()
+                profile = json.loads(row[0]) if row else {}
+                records = _unapplied(profile, records)
+                if not records:
+                    continue
+                connection.executemany(
+                    'INSERT INTO interactions (user_id, interaction) VALUES (?, ?)',
+                    [(user_id, json.dumps(record, separators=(',', ':'))) for _, record in records]
+                )
+                connection.execute(
+                    'INSERT OR REPLACE INTO profiles (user_id, profile) VALUES (?, ?)',
+                    (user_id, json.dumps(_fold(user_id, profile, records, fold), separators=(',', ':')))
+                )
+        except Exception:
+            connection.rollback()
+            raise
+        connection.commit()
+
+    def all_profiles(self) -> Dict[str, Dict]:
+        rows = self._connection().execute('SELECT user_id, profile FROM profiles')
+        return {user_id: json.loads(profile) for user_id, profile in rows}
+
+    def all_interactions(self) -> Dict[str, List[Dict]]:
+        interactions: Dict[str, List[Dict]] = {}
+        rows = self._connection().execute('SELECT user_id, interaction FROM interactions ORDER BY id')
+        for user_id, interaction in rows:
+            interactions.setdefault(user_id, []).append(json.loads(interaction))
+        return interactions
+
+
+def create_store(data_dir: str = 'data'):
+    """Storage engine selected by AI_STORAGE_BACKEND ('json' or 'sqlite')"""
+    backend = os.getenv('AI_STORAGE_BACKEND', 'json').lower()
+    if backend == 'sqlite':
+        db_path = os.getenv('AI_STORAGE_PATH', os.path.join(data_dir, 'ai_store.sqlite3'))
+        return SQLiteProfileStore(db_path)
+    return JSONFileStore(data_dir)
+
+
+def migrate_json(data_dir: str, db_path: str) -> Tuple[int, int]:
+    """
+    Import user_profiles.json and user_interactions.json into a SQLite store
+
+    Re-running replaces the imported users' profiles and interactions rather
+    than duplicating them.
+
+    Returns:
+        (profiles imported, interactions imported)
+    """
+    source = JSONFileStore(data_dir)
+    profiles = source.all_profiles()
+    interactions = source.all_interactions()
+
+    store = SQLiteProfileStore(db_path)
+    connection = store._connection()
+    with connection:
+        connection.executemany(
+            'INSERT OR REPLACE INTO profiles (user_id, profile) VALUES (?, ?)',
+            [(user_id, json.dumps(profile, separators=(',', ':'))) for user_id, profile in profiles.items()]
+        )
+        connection.executemany(
+            'DELETE FROM interactions WHERE user_id = ?', [(user_id,) for user_id in interactions]
+        )
+        connection.executemany(
+            'INSERT INTO interactions (user_id, interaction) VALUES (?, ?)',
+            [(user_id, json.dumps(interaction, separators=(',', ':')))
+             for user_id, user_interactions in interactions.items()
+             for interaction in user_interactions]
+        )
+
+    return len(profiles), sum(len(items) for items in interactions.values())
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='AI recommendation storage tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate = subparsers.add_parser('migrate', help='Import the JSON profile and interaction files into SQLite')
+    migrate.add_argument('data_dir', nargs='?', default='data')
+    migrate.add_argument('db_path', nargs='?', default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == 'migrate':
+        db_path = args.db_path or os.getenv('AI_STORAGE_PATH', os.path.join(args.data_dir, 'ai_store.sqlite3'))
+        profiles, interactions = migrate_json(args.data_dir, db_path)
+        print(f"Imported {profiles} profiles and {interactions} interactions into {db_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
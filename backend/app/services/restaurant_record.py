@@ -0,0 +1,345 @@
+"""
+Compact in-memory representation of restaurants
+Search, filtering, route matching and AI ranking work on RestaurantRecord
+(OpenStreetMap) and PlaceRecord (Google Places) objects; the response dict
+is only built at the JSON boundary with to_dict()
+"""
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+DIETS = ('vegetarian', 'vegan', 'gluten_free', 'halal', 'kosher')
+_DIET_BITS = {diet: 1 << i for i, diet in enumerate(DIETS)}
+
+
+def diet_mask(diets: Iterable[str]) -> int:
+    """Bitmask of the given diet keys (unknown keys are ignored)"""
+    mask = 0
+    for diet in diets:
+        mask |= _DIET_BITS.get(diet, 0)
+    return mask
+
+
+def diets_in_mask(mask: int) -> List[str]:
+    """Diet keys whose bits are set, in DIETS order"""
+    return [diet for diet in DIETS if mask & _DIET_BITS[diet]]
+
+
+class CuisineRegistry:
+    """Interns cuisine strings to small integer ids shared by every record in the process"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._lock = threading.Lock()
+
+    def intern(self, name: str) -> int:
+        cuisine_id = self._ids.get(name)
+        if cuisine_id is None:
+            with self._lock:
+                cuisine_id = self._ids.get(name)
+                if cuisine_id is None:
+                    cuisine_id = len(self._names)
+                    self._names.append(name)
+                    self._ids[name] = cuisine_id
+        return cuisine_id
+
+    def find(self, name: str) -> Optional[int]:
+        """Id of an already interned cuisine, without interning it"""
+        return self._ids.get(name)
+
+    def name(self, cuisine_id: int) -> str:
+        return self._names[cuisine_id]
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+# Global registries
+cuisines = CuisineRegistry()
+place_types = CuisineRegistry()
+
+
+class _ItemAccess:
+    """Membership and get() on top of a record's __getitem__"""
+
+    __slots__ = ()
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class RestaurantRecord(_ItemAccess):
+    """
+    One restaurant with slot storage, a dietary bitmask and an interned cuisine
+
+    Supports read/write item access with the response dict's keys so code
+    written against restaurant dicts keeps working; keys that are not
+    record fields (e.g. meal_type) go into a small per-record extras dict.
+    """
+
+    __slots__ = ('osm_id', 'lat', 'lon', 'name', 'amenity', 'cuisine_id',
+                 'website', 'phone', 'opening_hours', 'address', 'rating', 'price_level',
+                 'diet_mask', 'diet_no_mask', 'route_point_index', 'distance_from_route_miles',
+                 'extra')
+
+    def __init__(self, osm_id: Any, lat: float, lon: float, name: str, amenity: str,
+                 cuisine: str, website: str, phone: str, opening_hours: str, address: str,
+                 rating: float, price_level: int, diet_mask: int = 0, diet_no_mask: int = 0):
+        self.osm_id = osm_id
+        self.lat = lat
+        self.lon = lon
+        self.name = name
+        self.amenity = amenity
+        self.cuisine_id = cuisines.intern(cuisine)
+        self.website = website
+        self.phone = phone
+        self.opening_hours = opening_hours
+        self.address = address
+        self.rating = rating
+        self.price_level = price_level
+        self.diet_mask = diet_mask
+        self.diet_no_mask = diet_no_mask
+        self.route_point_index: Optional[int] = None
+        self.distance_from_route_miles: Optional[float] = None
+        self.extra: Optional[Dict] = None
+
+    @property
+    def cuisine(self) -> str:
+        return cuisines.name(self.cuisine_id)
+
+    @property
+    def dietary_info(self) -> Dict[str, bool]:
+        return {diet: bool(self.diet_mask & bit) for diet, bit in _DIET_BITS.items()}
+
+    @property
+    def dietary_unavailable(self) -> List[str]:
+        return diets_in_mask(self.diet_no_mask)
+
+    def to_dict(self) -> Dict:
+        """The restaurant dict returned by the API"""
+        result = {
+            'osm_id': self.osm_id,
+            'lat': self.lat,
+            'lon': self.lon,
+            'name': self.name,
+            'amenity': self.amenity,
+            'cuisine': self.cuisine,
+            'website': self.website,
+            'phone': self.phone,
+            'opening_hours': self.opening_hours,
+            'address': self.address,
+            'rating': self.rating,
+            'price_level': self.price_level,
+            'dietary_info': self.dietary_info,
+            'dietary_unavailable': self.dietary_unavailable
+        }
+        if self.route_point_index is not None:
+            result['route_point_index'] = self.route_point_index
+        if self.distance_from_route_miles is not None:
+            result['distance_from_route_miles'] = round(self.distance_from_route_miles, 2)
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'RestaurantRecord':
+        """Build a record from a restaurant dict (as produced by to_dict)"""
+        dietary_info = data.get('dietary_info') or {}
+        record = cls(
+            data.get('osm_id'), data.get('lat'), data.get('lon'),
+            data.get('name', 'Unknown Restaurant'), data.get('amenity', 'restaurant'),
+            data.get('cuisine', 'unknown'), data.get('website', ''), data.get('phone', ''),
+            data.get('opening_hours', ''), data.get('address', ''),
+            data.get('rating', 3.0), data.get('price_level', 2),
+            diet_mask(diet for diet, supported in dietary_info.items() if supported),
+            diet_mask(data.get('dietary_unavailable') or [])
+        )
+        for key, value in data.items():
+            if key not in _DICT_KEYS or key in _ROUTE_KEYS:
+                record[key] = value
+        return record
+
+    def to_row(self) -> List:
+        """JSON-serialisable row for caches (cuisine ids are per-process, so the name is stored)"""
+        return [self.osm_id, self.lat, self.lon, self.name, self.amenity, self.cuisine,
+                self.website, self.phone, self.opening_hours, self.address,
+                self.rating, self.price_level, self.diet_mask, self.diet_no_mask]
+
+    @classmethod
+    def from_row(cls, row: List) -> 'RestaurantRecord':
+        return cls(*row)
+
+    # Dict-style access by response key
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _DICT_KEYS:
+            value = getattr(self, key)
+            if value is None and key in _ROUTE_KEYS:
+                raise KeyError(key)
+            return value
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in _SETTABLE_KEYS:
+            setattr(self, key, value)
+        elif key == 'cuisine':
+            self.cuisine_id = cuisines.intern(value)
+        elif key == 'dietary_info':
+            self.diet_mask = diet_mask(diet for diet, supported in value.items() if supported)
+        elif key == 'dietary_unavailable':
+            self.diet_no_mask = diet_mask(value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __repr__(self) -> str:
+        return f"RestaurantRecord(osm_id={self.osm_id!r}, name={self.name!r})"
+
+
+class PlaceRecord(_ItemAccess):
+    """
+    One Google Places restaurant with slot storage and interned type/cuisine ids
+
+    Ranking and AI annotations live in slots that are left out of the
+    response until set. Like RestaurantRecord it supports dict-style access
+    with the response dict's keys, and unknown keys go into an extras dict.
+    """
+
+    __slots__ = ('place_id', 'lat', 'lng', 'name', 'rating', 'price_level', 'address',
+                 'type_ids', 'cuisine_ids', 'is_open', 'photos',
+                 'distance_from_start', 'distance_from_end', 'route_deviation', 'composite_score',
+                 'ai_score', 'recommendation_reason', 'extra')
+
+    def __init__(self, place_id: str, lat: float, lng: float, name: str, rating: float,
+                 price_level: int, address: str, types: Iterable[str], cuisine_types: Iterable[str],
+                 is_open: Optional[bool], photos: Iterable[str]):
+        self.place_id = place_id
+        self.lat = lat
+        self.lng = lng
+        self.name = name
+        self.rating = rating
+        self.price_level = price_level
+        self.address = address
+        self.type_ids = tuple(place_types.intern(t) for t in types)
+        # Lower-cased so the ids line up with the AI engine's cuisine preferences
+        self.cuisine_ids = tuple(cuisines.intern(c.lower()) for c in cuisine_types)
+        self.is_open = is_open
+        self.photos = tuple(photos)
+        self.distance_from_start: Optional[float] = None
+        self.distance_from_end: Optional[float] = None
+        self.route_deviation: Optional[float] = None
+        self.composite_score: Optional[float] = None
+        self.ai_score: Optional[float] = None
+        self.recommendation_reason: Optional[str] = None
+        self.extra: Optional[Dict] = None
+
+    @property
+    def types(self) -> List[str]:
+        return [place_types.name(type_id) for type_id in self.type_ids]
+
+    @property
+    def cuisine_types(self) -> List[str]:
+        return [cuisines.name(cuisine_id) for cuisine_id in self.cuisine_ids]
+
+    @property
+    def location(self) -> Dict[str, float]:
+        return {'lat': self.lat, 'lng': self.lng}
+
+    def to_dict(self) -> Dict:
+        """The restaurant dict returned by the API"""
+        result = {
+            'place_id': self.place_id,
+            'name': self.name,
+            'rating': self.rating,
+            'price_level': self.price_level,
+            'location': self.location,
+            'address': self.address,
+            'types': self.types,
+            'cuisine_types': self.cuisine_types,
+            'is_open': self.is_open,
+            'photos': list(self.photos)
+        }
+        for key in _PLACE_ANNOTATION_KEYS:
+            value = getattr(self, key)
+            if value is not None:
+                result[key] = value
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+    def to_row(self) -> List:
+        """JSON-serialisable row for caches (ids are per-process, so names are stored)"""
+        return [self.place_id, self.lat, self.lng, self.name, self.rating, self.price_level,
+                self.address, self.types, self.cuisine_types, self.is_open, list(self.photos)]
+
+    @classmethod
+    def from_row(cls, row: List) -> 'PlaceRecord':
+        return cls(*row)
+
+    # Dict-style access by response key
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _PLACE_KEYS:
+            value = getattr(self, key)
+            if value is None and key in _PLACE_ANNOTATION_KEYS:
+                raise KeyError(key)
+            if isinstance(value, tuple):
+                value = list(value)
+            return value
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in _PLACE_SETTABLE_KEYS:
+            setattr(self, key, value)
+        elif key == 'location':
+            self.lat = value['lat']
+            self.lng = value['lng']
+        elif key == 'types':
+            self.type_ids = tuple(place_types.intern(t) for t in value)
+        elif key == 'cuisine_types':
+            self.cuisine_ids = tuple(cuisines.intern(c.lower()) for c in value)
+        elif key == 'photos':
+            self.photos = tuple(value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __repr__(self) -> str:
+        return f"PlaceRecord(place_id={self.place_id!r}, name={self.name!r})"
+
+
+_ROUTE_KEYS = ('route_point_index', 'distance_from_route_miles')
+_DICT_KEYS = frozenset((
+    'osm_id', 'lat', 'lon', 'name', 'amenity', 'cuisine', 'website', 'phone',
+    'opening_hours', 'address', 'rating', 'price_level', 'dietary_info', 'dietary_unavailable'
+) + _ROUTE_KEYS)
+_SETTABLE_KEYS = frozenset((
+    'osm_id', 'lat', 'lon', 'name', 'amenity', 'website', 'phone',
+    'opening_hours', 'address', 'rating', 'price_level'
+) + _ROUTE_KEYS)
+
+_PLACE_ANNOTATION_KEYS = ('distance_from_start', 'distance_from_end', 'route_deviation',
+                          'composite_score', 'ai_score', 'recommendation_reason')
+_PLACE_KEYS = frozenset((
+    'place_id', 'name', 'rating', 'price_level', 'location', 'address', 'types',
+    'cuisine_types', 'is_open', 'photos'
+) + _PLACE_ANNOTATION_KEYS)
+_PLACE_SETTABLE_KEYS = frozenset((
+    'place_id', 'name', 'rating', 'price_level', 'address', 'is_open'
+) + _PLACE_ANNOTATION_KEYS)
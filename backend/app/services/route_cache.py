@@ -0,0 +1,134 @@
+"""
+Persistent cache for OpenRouteService routes
+Routes are keyed on snapped start/end coordinates plus profile and stored
+in a compact binary form in memory and on disk
+"""
+import json
+import os
+import logging
+import struct
+import zlib
+from array import array
+from typing import Callable, Dict, Optional, Tuple
+
+from .cache import TieredCache
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b'FRRT'
+_VERSION = 1
+_HEADER = struct.Struct('>4sBddIB')
+_COORD_SCALE = 1e6
+
+
+def encode_route(route: Dict) -> bytes:
+    """
+    Pack a route dict into bytes
+
+    Layout: header (magic, version, distance, duration, point count, bbox size),
+    bbox doubles, then a zlib block holding delta-encoded E6 [lon, lat] pairs
+    followed by the JSON instructions. route_points are the same vertices as
+    the geometry, so they are rebuilt on decode rather than stored twice.
+    """
+    coordinates = route['geometry']['coordinates']
+    bbox = [float(v) for v in route.get('bbox') or []]
+
+    deltas = array('i')
+    prev_lon = prev_lat = 0
+    for lon, lat in coordinates:
+        lon_e6 = int(round(lon * _COORD_SCALE))
+        lat_e6 = int(round(lat * _COORD_SCALE))
+        deltas.append(lon_e6 - prev_lon)
+        deltas.append(lat_e6 - prev_lat)
+        prev_lon, prev_lat = lon_e6, lat_e6
+
+    instructions = json.dumps(route.get('instructions') or [], separators=(',', ':')).encode('utf-8')
+    body = zlib.compress(deltas.tobytes() + instructions)
+
+    header = _HEADER.pack(
+        _MAGIC, _VERSION,
+        float(route['distance_meters']), float(route['duration_seconds']),
+        len(coordinates), len(bbox)
+    )
+    return header + struct.pack(f'>{len(bbox)}d', *bbox) + body
+
+
+def decode_route(payload: bytes) -> Dict:
+    """Unpack bytes produced by encode_route back into the get_route dict shape"""
+    magic, version, distance, duration, count, bbox_size = _HEADER.unpack_from(payload)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("Unrecognized route cache entry")
+
+    offset = _HEADER.size
+    bbox = list(struct.unpack_from(f'>{bbox_size}d', payload, offset))
+    offset += bbox_size * 8
+
+    body = zlib.decompress(payload[offset:])
+    deltas = array('i')
+    deltas.frombytes(body[:count * 2 * deltas.itemsize])
+    instructions = json.loads(body[count * 2 * deltas.itemsize:].decode('utf-8'))
+
+    coordinates = []
+    lon_e6 = lat_e6 = 0
+    for i in range(0, len(deltas), 2):
+        lon_e6 += deltas[i]
+        lat_e6 += deltas[i + 1]
+        coordinates.append([lon_e6 / _COORD_SCALE, lat_e6 / _COORD_SCALE])
+
+    return {
+        'geometry': {'type': 'LineString', 'coordinates': coordinates},
+        'distance_meters': distance,
+        'duration_seconds': duration,
+        'instructions': instructions,
+        'bbox': bbox,
+        'route_points': [(lat, lon) for lon, lat in coordinates]
+    }
+
+
+class RouteCache:
+    """Route cache keyed on snapped start/end coordinates and routing profile"""
+
+    def __init__(self):
+        # 3 decimals snaps endpoints to roughly 100 m
+        self.snap_decimals = int(os.getenv('ROUTE_CACHE_SNAP_DECIMALS', 3))
+        self.cache = TieredCache(
+            'routes',
+            max_entries=int(os.getenv('ROUTE_CACHE_MAX_ENTRIES', 500)),
+            ttl_seconds=float(os.getenv('ROUTE_CACHE_TTL_SECONDS', 7 * 86400)),
+            disk_dir=os.getenv('ROUTE_CACHE_DISK_DIR', os.path.join('data', 'routes')),
+            encode=encode_route,
+            decode=decode_route
+        )
+
+    def key(self, start_coords: Tuple[float, float],
+            end_coords: Tuple[float, float],
+            profile: str) -> str:
+        digits = self.snap_decimals
+        return (f"{profile}:{round(start_coords[0], digits)},{round(start_coords[1], digits)}:"
+                f"{round(end_coords[0], digits)},{round(end_coords[1], digits)}")
+
+    def get_or_fetch(self, start_coords: Tuple[float, float],
+                     end_coords: Tuple[float, float],
+                     profile: str,
+                     fetch: Callable[[], Optional[Dict]]) -> Optional[Dict]:
+        """Return the cached route, calling fetch() on a miss (only LineString routes are cached)"""
+        key = self.key(start_coords, end_coords, profile)
+
+        route = self.cache.get(key)
+        if route is not None:
+            return route
+
+        route = fetch()
+        if route and route.get('geometry', {}).get('type') == 'LineString':
+            try:
+                self.cache.set(key, route)
+            except (ValueError, TypeError, KeyError) as e:
+                logger.warning(f"Route not cached: {e}")
+        return route
+
+    def stats(self) -> Dict:
+        return self.cache.stats()
+
+
+# Global cache instance
+route_cache = RouteCache()
@@ -0,0 +1,322 @@
+"""
+Linear-referencing and spatial indexes for route polylines
+Built once per route; answers point-at-distance, even spacing, arc-length
+position and distance-to-route queries without rescanning the polyline
+"""
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+from .geo_utils import EARTH_RADIUS_MILES, MILES_PER_DEGREE_LAT, polyline_to_points
+
+LatLon = Tuple[float, float]
+
+
+def _to_unit_vectors(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """(N, 3) unit vectors on the sphere for latitude/longitude arrays in degrees"""
+    lat = np.radians(lats)
+    lon = np.radians(lons)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+class RouteIndex:
+    """
+    Cumulative-distance index over a route polyline
+
+    Segment lengths are computed once with vectorized haversine; distance
+    lookups then binary-search the cumulative array and interpolate along
+    the segment's great circle, so points come out at exact spacing.
+    """
+
+    def __init__(self, points: List[LatLon]):
+        if not points:
+            raise ValueError("RouteIndex needs at least one point")
+
+        coords = np.asarray(points, dtype=float)
+        self.lats = coords[:, 0]
+        self.lons = coords[:, 1]
+
+        lat = np.radians(self.lats)
+        lon = np.radians(self.lons)
+        h = (np.sin(np.diff(lat) / 2) ** 2 +
+             np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2)
+        self.segment_miles = 2 * EARTH_RADIUS_MILES * np.arcsin(np.minimum(1.0, np.sqrt(h)))
+        self.cumulative_miles = np.concatenate(([0.0], np.cumsum(self.segment_miles)))
+        self.total_miles = float(self.cumulative_miles[-1])
+
+        # Unit vectors for projecting arbitrary coordinates onto segments
+        self._vectors = _to_unit_vectors(self.lats, self.lons)
+        self._segment_grid = None
+
+    @classmethod
+    def from_geometry(cls, route: Union[Dict, List]) -> 'RouteIndex':
+        """Build from a GeoJSON LineString or a list of (latitude, longitude) points"""
+        return cls(polyline_to_points(route))
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def points_at(self, distances: np.ndarray) -> np.ndarray:
+        """(N, 2) array of (latitude, longitude) at each arc-length distance in miles"""
+        distances = np.clip(np.asarray(distances, dtype=float), 0.0, self.total_miles)
+
+        if len(self.lats) == 1:
+            return np.column_stack((np.full(distances.shape, self.lats[0]),
+                                    np.full(distances.shape, self.lons[0])))
+
+        segment = np.searchsorted(self.cumulative_miles, distances, side='right') - 1
+        segment = np.clip(segment, 0, len(self.segment_miles) - 1)
+
+        lengths = self.segment_miles[segment]
+        offsets = distances - self.cumulative_miles[segment]
+        ratio = np.divide(offsets, lengths, out=np.zeros_like(offsets), where=lengths > 0)
+
+        # Interpolate along the great circle so spacing matches the haversine lengths
+        angle = lengths / EARTH_RADIUS_MILES
+        sin_angle = np.sin(angle)
+        straight = sin_angle < 1e-12
+        safe_sin = np.where(straight, 1.0, sin_angle)
+        weight_start = np.where(straight, 1 - ratio, np.sin((1 - ratio) * angle) / safe_sin)
+        weight_end = np.where(straight, ratio, np.sin(ratio * angle) / safe_sin)
+
+        vectors = (weight_start[:, None] * self._vectors[segment] +
+                   weight_end[:, None] * self._vectors[segment + 1])
+        lats = np.degrees(np.arctan2(vectors[:, 2], np.hypot(vectors[:, 0], vectors[:, 1])))
+        lons = np.degrees(np.arctan2(vectors[:, 1], vectors[:, 0]))
+        return np.column_stack((lats, lons))
+
+    def point_at(self, distance_miles: float) -> LatLon:
+        """(latitude, longitude) at an arc-length distance along the route"""
+        lat, lon = self.points_at(np.array([distance_miles]))[0]
+        return float(lat), float(lon)
+
+    def spaced_points(self, spacing_miles: float) -> List[LatLon]:
+        """Points every spacing_miles along the route, always including both ends"""
+        if spacing_miles <= 0 or self.total_miles == 0:
+            return [(float(self.lats[0]), float(self.lons[0])), (float(self.lats[-1]), float(self.lons[-1]))]
+
+        distances = np.arange(0.0, self.total_miles, spacing_miles)
+        if self.total_miles - distances[-1] > 1e-9:
+            distances = np.append(distances, self.total_miles)
+
+        return [(float(lat), float(lon)) for lat, lon in self.points_at(distances)]
+
+    def slice(self, start_miles: float, end_miles: float) -> List[LatLon]:
+        """The stretch of route between two arc-length positions, including interior vertices"""
+        start_miles = max(0.0, min(start_miles, self.total_miles))
+        end_miles = max(start_miles, min(end_miles, self.total_miles))
+
+        first = int(np.searchsorted(self.cumulative_miles, start_miles, side='right'))
+        last = int(np.searchsorted(self.cumulative_miles, end_miles, side='left'))
+
+        points = [self.point_at(start_miles)]
+        points.extend((float(self.lats[i]), float(self.lons[i])) for i in range(first, last))
+        points.append(self.point_at(end_miles))
+        return points
+
+    def project(self, lats: np.ndarray, lons: np.ndarray,
+                segments: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Project coordinates onto route segments
+
+        Args:
+            lats, lons: Coordinates to project (degrees)
+            segments: Segment indices to consider (all segments by default)
+
+        Returns:
+            (distance to route in miles, arc-length position in miles, index of nearest segment)
+        """
+        points = _to_unit_vectors(np.asarray(lats, dtype=float), np.asarray(lons, dtype=float))
+
+        if len(self.lats) == 1:
+            chord = np.linalg.norm(points - self._vectors[0], axis=1)
+            distance = 2 * EARTH_RADIUS_MILES * np.arcsin(np.minimum(1.0, chord / 2))
+            zeros = np.zeros(len(points))
+            return distance, zeros, zeros.astype(int)
+
+        if segments is None:
+            segments = np.arange(len(self.segment_miles))
+
+        starts = self._vectors[segments]
+        directions = self._vectors[segments + 1] - starts
+        length_sq = np.einsum('ij,ij->i', directions, directions)
+
+        # (points, segments) projection parameters clamped onto each segment
+        relative = points[:, None, :] - starts[None, :, :]
+        t = np.einsum('psk,sk->ps', relative, directions)
+        t = np.divide(t, length_sq, out=np.zeros_like(t), where=length_sq > 0)
+        t = np.clip(t, 0.0, 1.0)
+
+        # Push the chord foot back onto the sphere so long segments follow the great circle
+        feet = starts[None, :, :] + t[..., None] * directions[None, :, :]
+        feet /= np.maximum(np.linalg.norm(feet, axis=2, keepdims=True), 1e-15)
+        chord = np.linalg.norm(points[:, None, :] - feet, axis=2)
+
+        nearest = np.argmin(chord, axis=1)
+        rows = np.arange(len(points))
+        best_chord = chord[rows, nearest]
+        best_segment = segments[nearest]
+        best_feet = feet[rows, nearest]
+
+        distance = 2 * EARTH_RADIUS_MILES * np.arcsin(np.minimum(1.0, best_chord / 2))
+        along = np.arccos(np.clip(np.einsum('ij,ij->i', self._vectors[best_segment], best_feet), -1.0, 1.0))
+        position = self.cumulative_miles[best_segment] + along * EARTH_RADIUS_MILES
+        return distance, position, best_segment
+
+    @property
+    def segment_grid(self) -> 'SegmentGrid':
+        """Spatial index over this route's segments (built on first use)"""
+        if self._segment_grid is None:
+            self._segment_grid = SegmentGrid(self)
+        return self._segment_grid
+
+    def nearest(self, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Perpendicular distance to the polyline and nearest arc-length position for a batch of points
+
+        Returns:
+            (distance to route in miles, arc-length position in miles, index of nearest segment)
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+        if len(self.lats) == 1 or len(lats) == 0:
+            return self.project(lats, lons)
+        return self.segment_grid.nearest(lats, lons)
+
+    def locate(self, coord: LatLon) -> float:
+        """Arc-length position in miles of the route point nearest to coord"""
+        _, position, _ = self.nearest(np.array([coord[0]]), np.array([coord[1]]))
+        return float(position[0])
+
+
+class SegmentGrid:
+    """
+    Uniform grid over a route's segments for nearest-segment queries
+
+    Segments are registered in the cells of points sampled along them (on
+    an equirectangular projection centred on the route). Queries are
+    grouped by cell; the nearest occupied ring gives a first answer, and
+    the search then widens once to every ring that could still hold a
+    closer segment, so the answer is exact while only nearby segments are
+    ever measured.
+    """
+
+    def __init__(self, route: RouteIndex, cell_miles: float = None):
+        self.route = route
+        segment_count = len(route.segment_miles)
+
+        if cell_miles is None:
+            mean_segment = route.total_miles / segment_count if segment_count else 1.0
+            cell_miles = max(2.0, 4 * mean_segment)
+        self.cell_miles = cell_miles
+
+        lat_min, lat_max = float(route.lats.min()), float(route.lats.max())
+        self._cos_ref = math.cos(math.radians((lat_min + lat_max) / 2))
+
+        # Sample every half cell along the route so each segment lands in every cell it crosses
+        self.sample_step = cell_miles / 2
+        distances = np.union1d(
+            np.arange(0.0, route.total_miles, self.sample_step),
+            route.cumulative_miles
+        )
+        samples = route.points_at(distances)
+        sample_segments = np.clip(
+            np.searchsorted(route.cumulative_miles, distances, side='right') - 1,
+            0, segment_count - 1
+        )
+        # A sample at a vertex also belongs to the segment ending there
+        at_vertex = np.isin(distances, route.cumulative_miles[1:])
+        sample_segments = np.concatenate((sample_segments, sample_segments[at_vertex] - 1))
+        samples = np.concatenate((samples, samples[at_vertex]))
+        keep = sample_segments >= 0
+
+        cells_x, cells_y = self._cells(samples[keep, 0], samples[keep, 1])
+        buckets: Dict[Tuple[int, int], set] = {}
+        for cx, cy, segment in zip(cells_x.tolist(), cells_y.tolist(), sample_segments[keep].tolist()):
+            buckets.setdefault((cx, cy), set()).add(segment)
+        # Occupied cells and the segments registered in each
+        self._cell_keys = np.array(list(buckets), dtype=int).reshape(-1, 2)
+        self._cell_segments = [np.fromiter(sorted(segments), dtype=int) for segments in buckets.values()]
+
+        # Projected distances overstate true ones where cos(lat) < cos(reference lat)
+        lat_extreme = min(89.0, max(abs(lat_min), abs(lat_max)) + 1.0)
+        self._min_scale = 0.99 * min(1.0, math.cos(math.radians(lat_extreme)) / self._cos_ref)
+
+    def _cells(self, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        x = lons * MILES_PER_DEGREE_LAT * self._cos_ref
+        y = lats * MILES_PER_DEGREE_LAT
+        return np.floor(x / self.cell_miles).astype(int), np.floor(y / self.cell_miles).astype(int)
+
+    def _within(self, rings: np.ndarray, k: int) -> np.ndarray:
+        """Segments registered in occupied cells at most k rings out"""
+        return np.unique(np.concatenate(
+            [self._cell_segments[i] for i in np.nonzero(rings <= k)[0].tolist()]
+        ))
+
+    def nearest(self, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        count = len(lats)
+        distance = np.empty(count)
+        position = np.empty(count)
+        segment = np.empty(count, dtype=int)
+
+        cells_x, cells_y = self._cells(lats, lons)
+        cell_keys = np.stack((cells_x, cells_y), axis=1)
+        unique_cells, group = np.unique(cell_keys, axis=0, return_inverse=True)
+        group = group.reshape(-1)
+        ring_miles = self.cell_miles * self._min_scale
+
+        for g, (cx, cy) in enumerate(unique_cells.tolist()):
+            members = np.nonzero(group == g)[0]
+            member_lats = lats[members]
+            member_lons = lons[members]
+
+            # Ring of each occupied cell around this one
+            rings = np.maximum(np.abs(self._cell_keys[:, 0] - cx), np.abs(self._cell_keys[:, 1] - cy))
+            k = int(rings.min())
+            result = self.route.project(member_lats, member_lons, self._within(rings, k))
+
+            # Everything within k * ring_miles - sample_step / 2 of any member has
+            # been examined; widen to the ring that covers the farthest answer
+            needed = int(math.ceil((result[0].max() + self.sample_step / 2) / ring_miles))
+            if needed > k:
+                result = self.route.project(member_lats, member_lons, self._within(rings, needed))
+
+            distance[members], position[members], segment[members] = result
+
+        return distance, position, segment
+
+
+class RouteIndexCache:
+    """Small LRU of RouteIndex objects so each route is indexed once"""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, RouteIndex]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, route: Union[Dict, List]) -> RouteIndex:
+        points = polyline_to_points(route)
+        fingerprint = hashlib.sha1(np.asarray(points, dtype=float).tobytes()).hexdigest()
+
+        with self._lock:
+            index = self._entries.get(fingerprint)
+            if index is not None:
+                self._entries.move_to_end(fingerprint)
+                return index
+
+        index = RouteIndex(points)
+
+        with self._lock:
+            self._entries[fingerprint] = index
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+
+# Global index cache
+route_indexes = RouteIndexCache()
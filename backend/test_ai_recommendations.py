@@ -0,0 +1,99 @@
+"""
+Tests for the AI recommendation engine's profile cache and batch scoring
+Run with: python -m pytest test_ai_recommendations.py
+"""
+import pytest
+from flask import Flask
+
+from app.routes import recommendations as recommendations_module
+from app.services.ai_recommendations import AIRecommendationEngine
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    # Flush and compact only when asked
+    monkeypatch.setenv('AI_FLUSH_INTERVAL_SECONDS', '0')
+    monkeypatch.setenv('AI_LOG_COMPACT_INTERVAL_SECONDS', '0')
+    monkeypatch.delenv('AI_INTERACTION_LOG_DIR', raising=False)
+    monkeypatch.delenv('AI_STORAGE_BACKEND', raising=False)
+    return AIRecommendationEngine(str(tmp_path))
+
+
+def restaurant(name, cuisine, distance=2.0, price_level=2, rating=4.0):
+    return {
+        'place_id': name, 'name': name, 'cuisine_types': [cuisine],
+        'distance_miles': distance, 'price_level': price_level, 'rating': rating
+    }
+
+
+def test_profile_read_during_compaction_keeps_every_interaction(engine, monkeypatch):
+    for i in range(3):
+        engine.record_user_interaction('u1', restaurant(f'r{i}', 'thai'), 'selected')
+
+    # Compaction runs right after the profile load reads the store
+    get_profile = engine.store.get_profile
+
+    def get_then_compact(user_id):
+        profile = get_profile(user_id)
+        engine.compact()
+        return profile
+
+    monkeypatch.setattr(engine.store, 'get_profile', get_then_compact)
+    profile = engine._load_user_profile('u1')
+    monkeypatch.undo()
+
+    assert profile['total_interactions'] == 3
+    assert profile['cuisine_preferences']['thai']['selections'] == 3
+
+    # The cached copy stays complete as new interactions land on it
+    engine.record_user_interaction('u1', restaurant('r3', 'thai'), 'selected')
+    assert engine._load_user_profile('u1')['total_interactions'] == 4
+
+
+def test_batch_scores_match_per_restaurant_scores(engine, monkeypatch):
+    engine.record_user_interaction('u1', restaurant('r0', 'thai', distance=0.5, price_level=1), 'selected')
+    engine.record_user_interaction('u1', restaurant('r1', 'italian', distance=4.0), 'visited', rating=5)
+    profile = engine._load_user_profile('u1')
+
+    candidates = [
+        restaurant('a', 'thai', distance=0.8, price_level=1),
+        restaurant('b', 'Italian', distance=5.0, rating=3.5),
+        restaurant('c', 'mexican', distance=12.0, price_level=4),
+        {'name': 'd'}
+    ]
+    # Dietary compliance goes through the per-restaurant hook in both paths
+    monkeypatch.setattr(
+        engine, '_score_dietary_compliance',
+        lambda r, restrictions: 1.0 if r.get('name') in ('a', 'c') else 0.0
+    )
+
+    for restrictions in (None, ['vegan']):
+        expected = [engine._calculate_recommendation_score(r, profile, restrictions) for r in candidates]
+        assert engine._score_batch(candidates, profile, restrictions).tolist() == expected
+
+
+def test_loaded_profile_is_a_private_copy(engine):
+    engine.record_user_interaction('u1', restaurant('r0', 'thai'), 'selected')
+    profile = engine._load_user_profile('u1')
+    profile['total_interactions'] = 100
+    profile['cuisine_preferences']['thai']['selections'] = 100
+
+    reloaded = engine._load_user_profile('u1')
+    assert reloaded['total_interactions'] == 1
+    assert reloaded['cuisine_preferences']['thai']['selections'] == 1
+
+
+def test_profile_endpoint_hides_log_position(engine, monkeypatch):
+    engine.record_user_interaction('u1', restaurant('r0', 'thai'), 'selected')
+    engine.compact()
+    assert 'log_seq' in engine._load_user_profile('u1')
+
+    monkeypatch.setattr(recommendations_module, 'ai_engine', engine)
+    app = Flask(__name__)
+    app.register_blueprint(recommendations_module.recommendations_bp)
+    response = app.test_client().get('/user-profile/u1')
+
+    assert response.status_code == 200
+    raw_data = response.get_json()['raw_data']
+    assert raw_data['total_interactions'] == 1
+    assert 'log_seq' not in raw_data
@@ -0,0 +1,99 @@
+"""
+Tests for the shared JSON data store and its striped locks
+Run with: python -m pytest test_data_store.py
+"""
+import multiprocessing
+import threading
+
+import pytest
+
+from app.services import data_store as data_store_module
+from app.services.data_store import DataStore
+
+WORKERS = 4
+UPDATES = 50
+
+
+def increment(counter):
+    counter['count'] += 1
+    return counter
+
+
+def hammer(data_dir, updates):
+    # Each worker gets its own store, as each gunicorn worker would
+    store = DataStore(data_dir)
+    for _ in range(updates):
+        store.update('counter.json', increment, default={'count': 0})
+
+
+@pytest.mark.skipif(data_store_module.fcntl is None, reason='cross-process locks need fcntl')
+def test_update_from_several_processes_loses_nothing(tmp_path):
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=hammer, args=(str(tmp_path), UPDATES)) for _ in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    assert DataStore(str(tmp_path)).read('counter.json') == {'count': WORKERS * UPDATES}
+
+
+def test_update_from_several_threads_loses_nothing(tmp_path):
+    store = DataStore(str(tmp_path))
+    threads = [
+        threading.Thread(target=lambda: [store.update('counter.json', increment, default={'count': 0})
+                                         for _ in range(UPDATES)])
+        for _ in range(WORKERS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+
+    assert store.read('counter.json') == {'count': WORKERS * UPDATES}
+
+
+def keys_on_one_stripe(store, count):
+    by_stripe = {}
+    for i in range(1000):
+        key = f'doc-{i}.json'
+        keys = by_stripe.setdefault(store.stripe(key), [])
+        keys.append(key)
+        if len(keys) == count:
+            return keys
+    raise AssertionError('no shared stripe found')
+
+
+def test_locked_keys_sharing_a_stripe_do_not_deadlock(tmp_path):
+    store = DataStore(str(tmp_path), stripes=4)
+    first, second = keys_on_one_stripe(store, 2)
+    other = next(f'other-{i}.json' for i in range(1000) if store.stripe(f'other-{i}.json') != store.stripe(first))
+
+    def lock_in_order(*keys):
+        for _ in range(UPDATES):
+            with store.locked(*keys):
+                pass
+
+    # Same stripe twice in one call, and overlapping key sets taken in opposite orders
+    threads = [
+        threading.Thread(target=lock_in_order, args=(first, second), daemon=True),
+        threading.Thread(target=lock_in_order, args=(second, other, first), daemon=True),
+        threading.Thread(target=lock_in_order, args=(other, second), daemon=True)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+        assert not thread.is_alive(), 'locked() deadlocked'
+
+    # Every stripe is free again afterwards
+    with store.locked(first, other):
+        pass
+
+
+def test_update_returning_none_leaves_document(tmp_path):
+    store = DataStore(str(tmp_path))
+    store.write('doc.json', {'a': 1})
+    assert store.update('doc.json', lambda doc: None) is None
+    assert store.read('doc.json') == {'a': 1}
@@ -0,0 +1,92 @@
+"""
+Tests for the chunked, cell-cached distance matrix engine
+Run with: python -m pytest test_distance_matrix.py
+"""
+import pytest
+
+from app.services import openroute_service as openroute_module
+from app.services.distance_matrix import DistanceMatrixEngine, estimate_matrix
+from app.services.rate_limiter import TokenBucket
+
+ORIGINS = [(40.0 + i * 0.01, -74.0) for i in range(6)]
+DESTINATIONS = [(40.5, -74.0 + j * 0.01) for j in range(6)]
+
+
+def road_fetch(calls):
+    """Fake provider: road values are double the straight line, and every call is recorded"""
+    def fetch(origins, destinations):
+        calls.append((list(origins), list(destinations)))
+        estimate = estimate_matrix(origins, destinations)
+        return {
+            'distances': [[d * 2 for d in row] for row in estimate['distances']],
+            'durations': [[d * 2 for d in row] for row in estimate['durations']]
+        }
+    return fetch
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    # 3x3 chunks so a 6x6 matrix takes four requests
+    monkeypatch.setenv('ORS_MATRIX_MAX_LOCATIONS', '6')
+    engine = DistanceMatrixEngine()
+    # Don't draw on (or wait for) the shared provider quota
+    engine.rate_limiter = TokenBucket(rate=1000)
+    return engine
+
+
+def test_chunks_are_merged_and_cached(engine):
+    calls = []
+    matrix = engine.compute(ORIGINS, DESTINATIONS, 'driving-car', road_fetch(calls))
+    expected = estimate_matrix(ORIGINS, DESTINATIONS)
+
+    assert len(calls) == 4
+    assert matrix['durations'] == [[d * 2 for d in row] for row in expected['durations']]
+
+    engine.compute(ORIGINS, DESTINATIONS, 'driving-car', road_fetch(calls))
+    assert len(calls) == 4
+
+
+def test_failing_chunk_fails_the_matrix(engine):
+    calls = []
+    working = road_fetch(calls)
+
+    def flaky(origins, destinations):
+        if ORIGINS[0] in origins and DESTINATIONS[0] in destinations:
+            raise RuntimeError('upstream timeout')
+        return working(origins, destinations)
+
+    with pytest.raises(RuntimeError):
+        engine.compute(ORIGINS, DESTINATIONS, 'driving-car', flaky)
+    assert len(calls) == 3
+
+    # The chunks that succeeded were cached; a retry fetches only the failed one
+    matrix = engine.compute(ORIGINS, DESTINATIONS, 'driving-car', working)
+    assert len(calls) == 4
+    assert calls[-1] == (ORIGINS[:3], DESTINATIONS[:3])
+    expected = estimate_matrix(ORIGINS, DESTINATIONS)
+    assert matrix['durations'] == [[d * 2 for d in row] for row in expected['durations']]
+
+
+def test_service_falls_back_to_a_flagged_estimate(engine, monkeypatch):
+    monkeypatch.setattr(openroute_module, 'matrix_engine', engine)
+    monkeypatch.setenv('ROUTING_BACKEND', 'openroute')
+    monkeypatch.setenv('OPENROUTE_SERVICE_API_KEY', 'test-key')
+    service = openroute_module.OpenRouteService()
+
+    calls = []
+    working = road_fetch(calls)
+
+    def flaky(origins, destinations, profile):
+        if ORIGINS[0] in origins and DESTINATIONS[0] in destinations:
+            raise RuntimeError('upstream timeout')
+        return working(origins, destinations)
+
+    monkeypatch.setattr(service, '_fetch_matrix', flaky)
+    matrix = service.calculate_distance_matrix(ORIGINS, DESTINATIONS)
+
+    # No mix of road and straight-line cells: the whole matrix is the estimate
+    assert matrix['estimated'] is True
+    assert matrix['durations'] == estimate_matrix(ORIGINS, DESTINATIONS)['durations']
+
+    monkeypatch.setattr(service, '_fetch_matrix', lambda o, d, profile: working(o, d))
+    assert 'estimated' not in service.calculate_distance_matrix(ORIGINS, DESTINATIONS)
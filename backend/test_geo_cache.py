@@ -0,0 +1,80 @@
+"""
+Tests for the geohash tile cache of nearby-restaurant searches
+Run with: python -m pytest test_geo_cache.py
+"""
+import pytest
+
+from app.services import google_places as google_places_module
+from app.services.geo_cache import GeoTileCache
+from app.services.google_places import PLACES_MAX_RESULTS, GooglePlacesService
+
+LOCATION = (40.7128, -74.0060)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('GEO_CACHE_DISK_DIR', str(tmp_path / 'tiles'))
+    return GeoTileCache()
+
+
+def spread_fetch(calls, count):
+    """Fake provider returning count places on a line running east from the search center"""
+    def fetch(center, radius):
+        calls.append((center, radius))
+        return [[f'p{i}', center[0], center[1] + i * 0.0005] for i in range(count)]
+    return fetch
+
+
+def position(row):
+    return row[1], row[2]
+
+
+def test_tile_results_are_cached_and_trimmed(cache):
+    calls = []
+    first = cache.get_or_fetch('test', LOCATION, 1609, None, spread_fetch(calls, 10), position)
+    second = cache.get_or_fetch('test', LOCATION, 1609, None, spread_fetch(calls, 10), position)
+
+    assert len(calls) == 1
+    assert first == second
+    assert calls[0][1] > 1609
+
+
+def test_capped_tile_result_is_not_cached(cache):
+    calls = []
+    capped = spread_fetch(calls, 20)
+    rows = cache.get_or_fetch('test', LOCATION, 1609, None, capped, position,
+                              lambda rows: len(rows) >= 20)
+
+    # The widened tile search came back full, so the caller's own circle is searched
+    assert len(calls) == 2
+    assert calls[1] == (LOCATION, 1609)
+    assert rows and all(row[1] == LOCATION[0] for row in rows)
+
+    cache.get_or_fetch('test', LOCATION, 1609, None, capped, position, lambda rows: len(rows) >= 20)
+    assert len(calls) == 4
+
+
+def test_places_search_pages_through_results(monkeypatch):
+    monkeypatch.setenv('GOOGLE_PLACES_API_KEY', 'test-key')
+    service = GooglePlacesService()
+    monkeypatch.setattr(google_places_module, 'PLACES_PAGE_TOKEN_DELAY_SECONDS', 0)
+
+    def place(i):
+        return {'place_id': f'p{i}', 'name': f'P{i}', 'types': ['restaurant'],
+                'geometry': {'location': {'lat': LOCATION[0], 'lng': LOCATION[1] + i * 0.0001}}}
+
+    pages = []
+
+    def fetch_page(params):
+        pages.append(dict(params))
+        start = 20 * (len(pages) - 1)
+        data = {'status': 'OK', 'results': [place(i) for i in range(start, start + 20)]}
+        if len(pages) < 3:
+            data['next_page_token'] = f'token{len(pages)}'
+        return data
+
+    monkeypatch.setattr(service, '_fetch_places_page', fetch_page)
+    rows = service._fetch_nearby_restaurants(LOCATION, 5000)
+
+    assert len(rows) == PLACES_MAX_RESULTS
+    assert [p.get('pagetoken') for p in pages] == [None, 'token1', 'token2']
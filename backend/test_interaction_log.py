@@ -0,0 +1,160 @@
+"""
+Tests for the interaction log and its compaction into the profile stores
+Run with: python -m pytest test_interaction_log.py
+"""
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from app.services.interaction_log import InteractionLog
+from app.services.profile_store import JSONFileStore, SQLiteProfileStore
+
+
+def fold(user_id, profile, record):
+    profile = profile or {'user_id': user_id, 'ids': []}
+    profile['ids'].append(record['id'])
+    return profile
+
+
+def settle(log, segment):
+    """Age a segment's mtime past the settle window"""
+    path = log._segment_path(segment)
+    old = time.time() - 60
+    os.utime(path, (old, old))
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteProfileStore(str(tmp_path / 'store' / 'ai.sqlite3'))
+    return JSONFileStore(str(tmp_path / 'store'))
+
+
+def test_crash_before_checkpoint_is_reapplied_once(tmp_path, store, monkeypatch):
+    log = InteractionLog(str(tmp_path / 'log'))
+    log.append_many([{'user_id': 'u1', 'id': i} for i in range(3)])
+    log.append({'user_id': 'u2', 'id': 3})
+
+    def crash(position):
+        raise RuntimeError('crashed before checkpoint')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(log, '_write_checkpoint', crash)
+        with pytest.raises(RuntimeError):
+            log.compact(lambda batches: store.apply_log(batches, fold))
+    assert log.checkpoint() == (0, 0)
+    assert store.get_profile('u1')['ids'] == [0, 1, 2]
+
+    # Segment 0 was rotated away and must settle before it is compacted past
+    settle(log, 0)
+
+    # The restarted compactor sees the same records again and skips them
+    restarted = InteractionLog(str(tmp_path / 'log'))
+    assert restarted.compact(lambda batches: store.apply_log(batches, fold)) == 4
+    assert restarted.checkpoint() > (0, 0)
+    assert store.get_profile('u1')['ids'] == [0, 1, 2]
+    assert store.get_profile('u2')['ids'] == [3]
+    assert [i['id'] for i in store.get_interactions('u1')] == [0, 1, 2]
+    assert restarted.pending('u1') == []
+
+
+def test_apply_log_skips_applied_records(store):
+    batch = {'u1': [((0, 0), {'id': 0}), ((0, 10), {'id': 1})]}
+    store.apply_log(batch, fold)
+    store.apply_log(batch, fold)
+    store.apply_log({'u1': [((0, 10), {'id': 1}), ((1, 0), {'id': 2})]}, fold)
+
+    profile = store.get_profile('u1')
+    assert profile['ids'] == [0, 1, 2]
+    assert profile['log_seq'] == [1, 0]
+    assert [i['id'] for i in store.get_interactions('u1')] == [0, 1, 2]
+
+
+def test_unsettled_segment_is_not_compacted_past(tmp_path, store):
+    log = InteractionLog(str(tmp_path / 'log'), segment_max_bytes=64)
+    log.append({'user_id': 'u1', 'id': 0, 'pad': 'x' * 64})
+    assert log.segments() == [0, 1]
+
+    log.append({'user_id': 'u1', 'id': 1})
+    assert log.compact(lambda batches: store.apply_log(batches, fold)) == 1
+    # Stopped at the end of segment 0, which is still within the settle window
+    assert log.checkpoint()[0] == 0
+    assert 0 in log.segments()
+
+    # A writer that picked segment 0 just before the rotation lands late
+    with open(log._segment_path(0), 'ab') as f:
+        f.write((json.dumps({'user_id': 'u1', 'id': 2}) + '\n').encode('utf-8'))
+
+    # Readers see every record (read ahead), once each, across repeated refreshes
+    assert sorted(record['id'] for _, record in log.pending('u1')) == [1, 2]
+    assert sorted(record['id'] for _, record in log.pending('u1')) == [1, 2]
+
+    assert log.compact(lambda batches: store.apply_log(batches, fold)) == 1
+    assert store.get_profile('u1')['ids'] == [0, 2]
+
+    settle(log, 0)
+    for segment in log.segments()[:-1]:
+        settle(log, segment)
+    log.compact(lambda batches: store.apply_log(batches, fold))
+    assert sorted(store.get_profile('u1')['ids']) == [0, 1, 2]
+    assert 0 not in log.segments()
+    assert log.pending('u1') == []
+
+
+def test_partial_line_is_read_once_complete(tmp_path):
+    log = InteractionLog(str(tmp_path / 'log'))
+    log.append({'user_id': 'u1', 'id': 0})
+    with open(log._segment_path(0), 'ab') as f:
+        f.write(b'{"user_id":"u1","id"')
+
+    assert [record['id'] for _, record in log.pending('u1')] == [0]
+
+    with open(log._segment_path(0), 'ab') as f:
+        f.write(b':1}\n')
+    assert [record['id'] for _, record in log.pending('u1')] == [0, 1]
+
+
+def test_two_logs_share_one_directory(tmp_path, store):
+    log_dir = str(tmp_path / 'log')
+    first = InteractionLog(log_dir, segment_max_bytes=256)
+    second = InteractionLog(log_dir, segment_max_bytes=256)
+
+    def writer(log, user_id, count):
+        for i in range(count):
+            log.append({'user_id': user_id, 'id': i})
+
+    threads = [
+        threading.Thread(target=writer, args=(first, 'a', 50)),
+        threading.Thread(target=writer, args=(second, 'b', 50))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Each instance followed the other's rotations instead of reopening old segments
+    assert len(first.segments()) > 1
+
+    # Every record is visible, in order, from either instance
+    for log in (first, second):
+        assert [record['id'] for _, record in log.pending('a')] == list(range(50))
+        assert [record['id'] for _, record in log.pending('b')] == list(range(50))
+
+    for segment in first.segments():
+        settle(first, segment)
+    first.compact(lambda batches: store.apply_log(batches, fold))
+    # Compacting through one instance doesn't repeat records through the other
+    second.compact(lambda batches: store.apply_log(batches, fold))
+
+    assert store.get_profile('a')['ids'] == list(range(50))
+    assert store.get_profile('b')['ids'] == list(range(50))
+    assert second.pending('a') == [] and second.pending('b') == []
+
+    # Appends after compaction go to the live segment for both instances
+    first.append({'user_id': 'a', 'id': 50})
+    second.append({'user_id': 'a', 'id': 51})
+    assert first._segment == second._segment == first.segments()[-1]
+    assert [record['id'] for _, record in first.pending('a')] == [50, 51]
@@ -0,0 +1,135 @@
+"""
+Tests for the offline routing engine and the local routing backend
+Run with: python -m pytest test_local_router.py
+"""
+import random
+
+import numpy as np
+import pytest
+
+from app.services import openroute_service as openroute_module
+from app.services.geo_utils import haversine_miles
+from app.services.local_router import METERS_PER_MILE, LocalRoutingEngine
+from app.services.route_cache import RouteCache
+
+SIZE = 8
+ORIGIN = (40.0, -74.0)
+STEP = 0.01
+
+
+def grid_node(row, column):
+    return row * SIZE + column
+
+
+@pytest.fixture
+def graph_path(tmp_path):
+    """An 8x8 street grid with random speeds, some one-way streets and a few diagonals"""
+    rng = random.Random(7)
+    lat = [ORIGIN[0] + row * STEP for row in range(SIZE) for _ in range(SIZE)]
+    lon = [ORIGIN[1] + column * STEP for _ in range(SIZE) for column in range(SIZE)]
+
+    pairs = []
+    for row in range(SIZE):
+        for column in range(SIZE):
+            if column + 1 < SIZE:
+                pairs.append((grid_node(row, column), grid_node(row, column + 1)))
+            if row + 1 < SIZE:
+                pairs.append((grid_node(row, column), grid_node(row + 1, column)))
+            if row + 1 < SIZE and column + 1 < SIZE and rng.random() < 0.2:
+                pairs.append((grid_node(row, column), grid_node(row + 1, column + 1)))
+
+    tails, heads, meters, seconds = [], [], [], []
+    for a, b in pairs:
+        length = haversine_miles((lat[a], lon[a]), (lat[b], lon[b])) * METERS_PER_MILE
+        oneway = rng.random() < 0.15
+        for tail, head in ((a, b), (b, a))[:1 if oneway else 2]:
+            tails.append(tail)
+            heads.append(head)
+            meters.append(length)
+            seconds.append(length / rng.uniform(8, 30))
+
+    path = tmp_path / 'graph.npz'
+    np.savez_compressed(
+        path,
+        node_lat=np.array(lat, dtype=np.float32), node_lon=np.array(lon, dtype=np.float32),
+        edge_from=np.array(tails, dtype=np.int32), edge_to=np.array(heads, dtype=np.int32),
+        edge_meters=np.array(meters, dtype=np.float32), edge_seconds=np.array(seconds, dtype=np.float32)
+    )
+    return str(path)
+
+
+@pytest.fixture
+def engine(graph_path):
+    return LocalRoutingEngine(graph_path)
+
+
+def test_bidirectional_astar_matches_dijkstra(engine):
+    nodes = list(range(SIZE * SIZE))
+    for source in nodes[::5]:
+        dijkstra = engine.one_to_many(source, nodes)
+        for target in nodes:
+            path = engine.shortest_path(source, target)
+            if dijkstra[target] is None:
+                assert path is None
+                continue
+            assert path is not None
+            assert sum(engine.edge_seconds[edge] for edge in path) == pytest.approx(dijkstra[target][1])
+
+            # The path is a connected walk from source to target
+            node = source
+            for edge in path:
+                offsets, heads, edge_ids = engine._forward
+                assert edge in edge_ids[offsets[node]:offsets[node + 1]]
+                node = engine.edge_to[edge]
+            assert node == target
+
+
+def test_one_to_many_reverse_is_cost_to_source(engine):
+    nodes = list(range(SIZE * SIZE))
+    target = grid_node(3, 4)
+    to_target = engine.one_to_many(target, nodes, reverse=True)
+    for source in nodes:
+        forward = engine.one_to_many(source, [target])[0]
+        assert (forward is None) == (to_target[source] is None)
+        if forward is not None:
+            assert forward[1] == pytest.approx(to_target[source][1])
+
+
+def test_snap_finds_nearest_node_within_coverage(engine):
+    assert engine.snap((ORIGIN[0] + 2 * STEP + 0.002, ORIGIN[1] + 5 * STEP - 0.001)) == grid_node(2, 5)
+    assert engine.snap((ORIGIN[0] + 1.0, ORIGIN[1])) is None
+
+
+def test_unsnappable_endpoint_has_no_route(engine):
+    inside = (ORIGIN[0] + STEP, ORIGIN[1] + STEP)
+    outside = (ORIGIN[0] + 1.0, ORIGIN[1] + 1.0)
+    assert engine.route(inside, outside) is None
+    assert engine.route(outside, inside) is None
+
+    route = engine.route(inside, (ORIGIN[0] + 6 * STEP, ORIGIN[1] + 5 * STEP))
+    assert route['geometry']['type'] == 'LineString'
+    assert route['duration_seconds'] > 0
+
+
+def test_local_backend_does_not_cache_fallback_routes(tmp_path, graph_path, monkeypatch):
+    monkeypatch.setenv('ROUTE_CACHE_DISK_DIR', str(tmp_path / 'routes'))
+    monkeypatch.setenv('ROUTING_BACKEND', 'local')
+    cache = RouteCache()
+    monkeypatch.setattr(openroute_module, 'route_cache', cache)
+    router = LocalRoutingEngine(str(tmp_path / 'missing.npz'))
+    monkeypatch.setattr(openroute_module, 'local_router', router)
+    service = openroute_module.OpenRouteService()
+
+    start = (ORIGIN[0] + STEP, ORIGIN[1] + STEP)
+    end = (ORIGIN[0] + 6 * STEP, ORIGIN[1] + 5 * STEP)
+
+    # No graph yet: a mock route is served but not cached
+    mock = service.get_route(start, end)
+    assert mock is not None
+    assert cache.cache.get(cache.key(start, end, 'local:driving-car')) is None
+
+    # Once the graph exists the real route is computed and cached
+    router.graph_path = graph_path
+    route = service.get_route(start, end)
+    assert route == LocalRoutingEngine(graph_path).route(start, end)
+    assert cache.cache.get(cache.key(start, end, 'local:driving-car')) is not None
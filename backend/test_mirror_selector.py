@@ -0,0 +1,91 @@
+"""
+Tests for health-aware mirror selection, hedging and circuit breaking
+Run with: python -m pytest test_mirror_selector.py
+"""
+import threading
+import time
+
+from app.services.mirror_selector import MirrorSelector
+
+
+def test_queue_time_does_not_trigger_a_hedge():
+    selector = MirrorSelector('test-queue', ['a', 'b'], hedge_default_seconds=0.2, max_workers=1)
+
+    # Keep the only worker busy past the hedge delay
+    selector._executor.submit(time.sleep, 0.5)
+
+    def call(url):
+        time.sleep(0.05)
+        return url
+
+    assert selector.execute(call) == 'a'
+    assert selector.stats()['hedged_requests'] == 0
+
+
+def test_slow_primary_is_hedged():
+    selector = MirrorSelector('test-hedge', ['a', 'b'], hedge_default_seconds=0.1)
+
+    def call(url):
+        time.sleep(1.0 if url == 'a' else 0.01)
+        return url
+
+    assert selector.execute(call) == 'b'
+    assert selector.stats()['hedged_requests'] == 1
+
+
+def trip(selector, index, fast_history=0):
+    """Open a mirror's circuit, optionally after a run of fast successes"""
+    mirror = selector._mirrors[index]
+    for _ in range(fast_history):
+        selector._record(mirror, True, 0.01)
+    selector._record(mirror, False, 0.01)
+
+
+def test_half_open_mirror_gets_a_single_trial():
+    selector = MirrorSelector('test-trial', ['a', 'b'], failure_threshold=1,
+                              cooldown_seconds=0.05, hedge_enabled=False)
+    # a's fast history ranks it ahead of b once it is half-open
+    trip(selector, 0, fast_history=5)
+    assert selector.stats()['mirrors']['a']['circuit'] == 'open'
+    time.sleep(0.1)
+
+    release = threading.Event()
+    calls = []
+    calls_lock = threading.Lock()
+
+    def call(url):
+        with calls_lock:
+            calls.append(url)
+        if url == 'a':
+            release.wait(5)
+        return url
+
+    # Widen the gap between ranking and submitting
+    submit = selector._submit
+    selector._submit = lambda call, mirror: (time.sleep(0.05), submit(call, mirror))[1]
+
+    # Concurrent callers all see a half-open; only one may send it a trial
+    threads = [threading.Thread(target=selector.execute, args=(call,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls.count('a') == 1
+    assert selector.stats()['mirrors']['a']['circuit'] == 'closed'
+
+
+def test_unused_trial_slot_is_released():
+    selector = MirrorSelector('test-release', ['a', 'b'], failure_threshold=1,
+                              cooldown_seconds=0.05, hedge_enabled=False)
+    trip(selector, 0)
+    time.sleep(0.1)
+    # b is healthy and fast, so it is tried first and a's claimed slot goes unused
+    for _ in range(5):
+        selector._record(selector._mirrors[1], True, 0.01)
+
+    assert selector.execute(lambda url: url) == 'b'
+    assert selector._mirrors[0].trial_in_flight is False
+    assert selector.urls()[-1] == 'a'
@@ -0,0 +1,73 @@
+"""
+Tests for OpenStreetMap opening_hours evaluation
+Run with: python -m pytest test_opening_hours.py
+"""
+from datetime import datetime
+
+import pytest
+
+from app.services.opening_hours import compile_opening_hours, is_open_at
+
+# 2024-01-01 is a Monday
+MO, TU, WE, TH, FR, SA, SU = range(1, 8)
+
+
+def at(day, hour, minute=0):
+    return datetime(2024, 1, day, hour, minute)
+
+
+@pytest.mark.parametrize('expression, when, expected', [
+    # Day ranges
+    ('Mo-Fr 09:00-17:00', at(MO, 10), True),
+    ('Mo-Fr 09:00-17:00', at(FR, 16, 59), True),
+    ('Mo-Fr 09:00-17:00', at(FR, 17), False),
+    ('Mo-Fr 09:00-17:00', at(SA, 10), False),
+    ('Fr-Mo 12:00-14:00', at(SU, 13), True),
+    ('Fr-Mo 12:00-14:00', at(MO, 13), True),
+    ('Fr-Mo 12:00-14:00', at(TU, 13), False),
+    ('Sa,Su 10:00-16:00', at(SU, 11), True),
+    ('Sa,Su 10:00-16:00', at(FR, 11), False),
+
+    # off / closed override earlier rules
+    ('Mo-Su 10:00-22:00; We off', at(WE, 12), False),
+    ('Mo-Su 10:00-22:00; We off', at(TH, 12), True),
+    ('Mo-Sa 10:00-22:00; Sa closed', at(SA, 12), False),
+    ('PH off; Mo-Fr 09:00-17:00', at(TU, 10), True),
+
+    # Comma-separated intervals and additional day groups
+    ('Mo-Fr 11:00-14:00,17:00-22:00', at(MO, 12), True),
+    ('Mo-Fr 11:00-14:00,17:00-22:00', at(MO, 15), False),
+    ('Mo-Fr 11:00-14:00,17:00-22:00', at(MO, 18), True),
+    ('Mo-Fr 08:00-12:00, Sa 10:00-14:00', at(SA, 11), True),
+    ('Mo-Fr 08:00-12:00, Sa 10:00-14:00', at(SA, 9), False),
+    ('Mo-Fr 08:00-12:00, Sa 10:00-14:00', at(MO, 9), True),
+
+    # Intervals past midnight
+    ('Fr-Sa 18:00-02:00', at(SA, 1), True),
+    ('Fr-Sa 18:00-02:00', at(SU, 1), True),
+    ('Fr-Sa 18:00-02:00', at(SU, 3), False),
+    ('Fr-Sa 18:00-02:00', at(FR, 1), False),
+    ('Su 20:00-02:00', at(MO, 1), True),
+    ('Su 20:00-02:00', at(MO, 2), False),
+
+    # Open ends and always open
+    ('Mo-Fr 17:00+', at(WE, 23), True),
+    ('Mo-Fr 17:00+', at(WE, 16), False),
+    ('24/7', at(MO, 0), True),
+    ('24/7', at(SU, 23, 59), True),
+
+    # Unsupported syntax is unknown
+    ('Jan-Mar Mo-Fr 09:00-17:00', at(MO, 10), None),
+    ('sunrise-sunset', at(MO, 10), None),
+    ('week 1-53 Mo 10:00-12:00', at(MO, 11), None),
+    ('Mo-Fr 09:00-17:00 || "by appointment"', at(MO, 10), None),
+    ('Mo-Fr 09:00', at(MO, 10), None),
+    ('', at(MO, 10), None),
+])
+def test_is_open_at(expression, when, expected):
+    assert is_open_at(expression, when) is expected
+
+
+def test_expressions_are_compiled_once():
+    assert compile_opening_hours('Mo-Fr 09:00-17:00') is compile_opening_hours('Mo-Fr 09:00-17:00')
+    assert compile_opening_hours('24/7').intervals() == [(0, 7 * 24 * 60)]
@@ -0,0 +1,69 @@
+"""
+Tests for the offline SQLite R*Tree restaurant store
+Run with: python -m pytest test_poi_store.py
+"""
+import pytest
+
+from app.services.geo_utils import densify_polyline, haversine_miles
+from app.services.poi_store import PoiStore, import_extract
+
+GRID = 40
+ORIGIN = (40.0, -74.0)
+SPAN_DEGREES = 1.0
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A store with restaurants on a regular grid over a one-degree square"""
+    nodes = []
+    for row in range(GRID):
+        for column in range(GRID):
+            lat = ORIGIN[0] + SPAN_DEGREES * row / (GRID - 1)
+            lon = ORIGIN[1] + SPAN_DEGREES * column / (GRID - 1)
+            tags = '<tag k="amenity" v="restaurant"/><tag k="name" v="R"/>'
+            if (row + column) % 7 == 0:
+                tags += '<tag k="diet:vegan" v="no"/>'
+            nodes.append(f'<node id="{row * GRID + column + 1}" lat="{lat}" lon="{lon}">{tags}</node>')
+
+    osm_path = tmp_path / 'extract.osm'
+    osm_path.write_text(f'<?xml version="1.0"?><osm version="0.6">{"".join(nodes)}</osm>')
+    db_path = str(tmp_path / 'poi.sqlite3')
+    assert import_extract(str(osm_path), db_path) == GRID * GRID
+    return PoiStore(db_path)
+
+
+def near_line(point, line, radius_miles):
+    return min(haversine_miles(point, p) for p in densify_polyline(line, 0.05)) <= radius_miles
+
+
+def test_nearby_matches_brute_force(store):
+    center = (40.5, -73.5)
+    found = store.nearby(center[0], center[1], 5.0)
+    distances = [haversine_miles(center, (r.lat, r.lon)) for r in found]
+    assert distances == sorted(distances)
+    assert all(d <= 5.0 for d in distances)
+    assert len(found) > 0
+
+
+def test_long_diagonal_segment_loads_only_its_corridor(store):
+    # One 85-mile diagonal segment, as simplify_polyline leaves a straight interstate
+    line = [ORIGIN, (ORIGIN[0] + SPAN_DEGREES, ORIGIN[1] + SPAN_DEGREES)]
+    radius = 2.0
+
+    found = store.along_polyline(line, radius)
+    found_ids = {r.osm_id for r in found}
+
+    # Every restaurant within the radius of the route is a candidate
+    everything = store.nearby(40.5, -73.5, 100.0)
+    expected = {r.osm_id for r in everything if near_line((r.lat, r.lon), line, radius)}
+    assert expected <= found_ids
+
+    # ...without materializing the whole bounding square of the segment
+    assert len(found) < len(everything) / 4
+
+
+def test_along_polyline_applies_diet_exclusions(store):
+    line = [ORIGIN, (ORIGIN[0] + 0.3, ORIGIN[1] + 0.3)]
+    found = store.along_polyline(line, 3.0, ['vegan'])
+    assert found
+    assert all(not r.dietary_unavailable for r in found)
@@ -0,0 +1,26 @@
+"""
+Tests for the shared token-bucket rate limiters
+Run with: python -m pytest test_rate_limiter.py
+"""
+import pytest
+
+from app.services.rate_limiter import TokenBucket, get_rate_limiter
+
+
+def test_same_name_and_settings_share_one_limiter():
+    assert get_rate_limiter('test-shared', rate=5) is get_rate_limiter('test-shared', rate=5, capacity=5)
+
+
+def test_same_name_with_different_settings_raises():
+    get_rate_limiter('test-mismatch', rate=5, capacity=10)
+    with pytest.raises(ValueError):
+        get_rate_limiter('test-mismatch', rate=2, capacity=10)
+    with pytest.raises(ValueError):
+        get_rate_limiter('test-mismatch', rate=5, capacity=20)
+
+
+def test_acquire_more_than_capacity_raises():
+    bucket = TokenBucket(rate=10, capacity=2)
+    with pytest.raises(ValueError):
+        bucket.acquire(3)
+    assert bucket.acquire(2, timeout=1)
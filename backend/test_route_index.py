@@ -0,0 +1,65 @@
+"""
+Tests for route linear referencing and the nearest-segment grid
+Run with: python -m pytest test_route_index.py
+"""
+import numpy as np
+import pytest
+
+from app.services.geo_utils import haversine_miles
+from app.services.route_index import RouteIndex, SegmentGrid
+
+
+def random_route(rng, count, step_degrees):
+    """A random walk with a mix of short and long segments"""
+    steps = rng.normal(scale=step_degrees, size=(count - 1, 2))
+    steps *= rng.choice([0.1, 1.0, 5.0], size=(count - 1, 1))
+    start = np.array([rng.uniform(-60, 60), rng.uniform(-170, 170)])
+    return [tuple(p) for p in np.vstack((start, start + np.cumsum(steps, axis=0)))]
+
+
+def query_points(rng, route, count, spread_degrees):
+    """Points scattered around random route vertices"""
+    anchors = np.asarray(route)[rng.integers(len(route), size=count)]
+    return anchors + rng.normal(scale=spread_degrees, size=(count, 2))
+
+
+@pytest.mark.parametrize('seed', range(6))
+@pytest.mark.parametrize('spread_degrees', [0.01, 0.2, 3.0])
+@pytest.mark.parametrize('cell_miles', [None, 0.5])
+def test_grid_matches_brute_force_projection(seed, spread_degrees, cell_miles):
+    rng = np.random.default_rng(seed)
+    vertices = random_route(rng, 60, 0.05)
+    route = RouteIndex(vertices)
+    grid = SegmentGrid(route, cell_miles)
+    points = query_points(rng, vertices, 200, spread_degrees)
+    lats, lons = points[:, 0], points[:, 1]
+
+    distance, position, segment = grid.nearest(lats, lons)
+    expected_distance, expected_position, expected_segment = route.project(lats, lons)
+
+    # Spreads of 0.2 and 3 degrees put most points many cells from the route
+    assert distance == pytest.approx(expected_distance, abs=1e-9)
+    same = segment == expected_segment
+    assert same.mean() > 0.95
+    assert position[same] == pytest.approx(expected_position[same], abs=1e-9)
+
+
+def test_nearest_is_no_farther_than_any_route_point():
+    rng = np.random.default_rng(42)
+    points = random_route(rng, 30, 0.02)
+    route = RouteIndex(points)
+    queries = query_points(rng, points, 50, 0.5)
+
+    distance, position, _ = route.nearest(queries[:, 0], queries[:, 1])
+    samples = route.spaced_points(0.05)
+    for (lat, lon), d, p in zip(queries.tolist(), distance, position):
+        assert d <= min(haversine_miles((lat, lon), s) for s in samples) + 1e-6
+        # The reported position is where that distance is measured to
+        assert haversine_miles((lat, lon), route.point_at(p)) == pytest.approx(d, abs=1e-3)
+
+
+def test_locate_on_a_single_point_route():
+    route = RouteIndex([(40.0, -74.0)])
+    assert route.locate((41.0, -74.0)) == 0.0
+    distance, _, _ = route.nearest(np.array([41.0]), np.array([-74.0]))
+    assert distance[0] == pytest.approx(haversine_miles((40.0, -74.0), (41.0, -74.0)), rel=1e-6)